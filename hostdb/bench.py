@@ -0,0 +1,295 @@
+"""Benchmarks for hostdb on synthetic manifests.
+
+A manifest of configurable size is generated with realistic hostnames,
+addresses, services, hardware labels and networks, then each stage of using it
+is timed: loading with and without the cache, validation, building the ansible
+inventory, and allocating hostnames. Results are returned as a JSON
+serializable dict so runs can be compared across versions.
+"""
+
+import dataclasses
+import functools
+import importlib.metadata
+import importlib.util
+import math
+import pathlib
+import platform
+import random
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+from typing import Any
+
+import yaml
+
+from . import naming
+from .exceptions import HostDbException
+from .hostdb import HostDb
+from .validation import check_manifest
+
+STAGES = ["load", "load_cached", "validate", "inventory", "allocate"]
+
+SERVICE_TYPES = ["kapi", "kube", "sto", "rtr", "wifi", "dns", "mon", "db"]
+
+_DESCRIPTIONS = [
+    "Kubernetes worker",
+    "Kubernetes control plane",
+    "Storage server",
+    "Router",
+    "Access point",
+    None,
+]
+
+# The C dumper is only available when PyYAML was built with libyaml
+_DUMPER = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+_PLUGIN = "from hostdb.inventory import DOCUMENTATION, InventoryModule  # noqa: F401\n"
+
+
+@dataclass
+class SyntheticConfig:
+    """The shape of a generated manifest."""
+
+    machines: int = 1000
+    """Number of machines."""
+
+    services: int = 1
+    """Number of services on each machine."""
+
+    hardware_labels: int = 4
+    """Number of hardware labels defined, each machine has a random subset."""
+
+    networks: int = 4
+    """Number of networks the machines are spread across."""
+
+    includes: int = 0
+    """Number of machines read from their own file with an !include tag."""
+
+    seed: int = 0
+    """Seed for the random choices so that runs are reproducible."""
+
+
+def generate_manifest(directory: pathlib.Path, config: SyntheticConfig) -> pathlib.Path:
+    """Write a synthetic manifest in the directory and return its path."""
+    if config.networks < 1 or config.machines > config.networks * 65_000:
+        raise HostDbException(
+            f"Not enough networks for {config.machines} machines: {config.networks}"
+        )
+    rand = random.Random(config.seed)
+    names = naming.Combination(naming.WordList.default(), naming.WordList.default())
+    hosts = naming.allocate_names(names, (), config.machines, rand)
+    labels = [f"label{i}" for i in range(config.hardware_labels)]
+    serials = dict.fromkeys(SERVICE_TYPES, 0)
+
+    machines = []
+    for index, host in enumerate(hosts):
+        (offset, network) = divmod(index, config.networks)
+        offset += 10
+        services = []
+        for _ in range(config.services):
+            service_type = rand.choice(SERVICE_TYPES)
+            serials[service_type] += 1
+            services.append(f"{service_type}{serials[service_type]:02d}")
+        machine: dict[str, Any] = {
+            "host": host,
+            "ip": f"10.{network}.{offset >> 8}.{offset & 255}",
+            "mac": "02:00:%02x:%02x:%02x:%02x"
+            % (index >> 24 & 255, index >> 16 & 255, index >> 8 & 255, index & 255),
+            "services": services,
+            "hardware_labels": sorted(
+                rand.sample(labels, rand.randint(0, len(labels))), key=labels.index
+            ),
+        }
+        if desc := rand.choice(_DESCRIPTIONS):
+            machine["desc"] = desc
+        machines.append(machine)
+
+    header = {
+        "site": {"domain": "bench.example.com", "env": "bench"},
+        "service_types": SERVICE_TYPES,
+        "hardware_labels": labels,
+        "network": [
+            {
+                "subnet": f"10.{i}.0.0/16",
+                "gateway": f"10.{i}.0.1",
+                "nameserver": [f"10.{i}.0.1"],
+            }
+            for i in range(config.networks)
+        ],
+    }
+    directory.mkdir(parents=True, exist_ok=True)
+    lines = [yaml.dump(header, Dumper=_DUMPER, sort_keys=False), "machines:\n"]
+    if config.includes:
+        (directory / "hosts").mkdir(exist_ok=True)
+    for machine in machines[: config.includes]:
+        include = directory / "hosts" / f"{machine['host']}.yaml"
+        include.write_text(yaml.dump(machine, Dumper=_DUMPER))
+        lines.append(f"- !include hosts/{include.name}\n")
+    if inline := machines[config.includes :]:
+        lines.append(yaml.dump(inline, Dumper=_DUMPER, sort_keys=False))
+    path = directory / "manifest.yaml"
+    path.write_text("".join(lines))
+    return path
+
+
+@dataclass
+class StageResult:
+    """Measurements of one benchmark stage."""
+
+    name: str
+    items: int
+    """Number of machines or names processed by each run."""
+
+    latencies: list[float]
+    """Seconds taken by each run."""
+
+    peak_memory: int
+    """Peak bytes allocated during a run."""
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return a summary of the stage for the JSON results."""
+        latencies = sorted(self.latencies)
+        median = _percentile(latencies, 50)
+        return {
+            "runs": len(latencies),
+            "items": self.items,
+            "latency_ms": {
+                "min": latencies[0] * 1000,
+                "p50": median * 1000,
+                "p95": _percentile(latencies, 95) * 1000,
+                "max": latencies[-1] * 1000,
+            },
+            "throughput_per_s": self.items / median if median else None,
+            "peak_memory_bytes": self.peak_memory,
+        }
+
+
+def _percentile(values: Sequence[float], percent: float) -> float:
+    """Return the nearest rank percentile of sorted values."""
+    rank = math.ceil(len(values) * percent / 100) - 1
+    return values[max(rank, 0)]
+
+
+def _measure(
+    name: str, items: int, func: Callable[[], Any], repeat: int
+) -> StageResult:
+    """Time `repeat` runs of the function then one more to measure memory."""
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        func()
+        (_, peak) = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return StageResult(name, items, latencies, peak)
+
+
+def _inventory_stage(config: pathlib.Path, work_dir: pathlib.Path) -> Callable[[], Any]:
+    """Return a function that parses the manifest with the ansible inventory plugin."""
+    try:
+        from ansible.inventory.data import InventoryData  # noqa: PLC0415
+        from ansible.parsing.dataloader import DataLoader  # noqa: PLC0415
+        from ansible.plugins.loader import (  # noqa: PLC0415
+            init_plugin_loader,
+            inventory_loader,
+        )
+        from ansible.utils.collection_loader import (  # noqa: PLC0415
+            AnsibleCollectionConfig,
+        )
+    except ImportError as err:
+        raise HostDbException(
+            "The inventory stage requires ansible, install hostdb[ansible]"
+        ) from err
+
+    plugin_dir = work_dir / "inventory_plugins"
+    plugin_dir.mkdir(exist_ok=True)
+    (plugin_dir / "hostdb.py").write_text(_PLUGIN)
+    source = work_dir / "inventory.yaml"
+    # Parse the manifest on every run rather than reading the manifest cache
+    source.write_text(
+        f"---\nplugin: hostdb\nmanifest: {config}\nmanifest_cache: false\n"
+    )
+    if AnsibleCollectionConfig.collection_finder is None:
+        init_plugin_loader()
+    inventory_loader.add_directory(str(plugin_dir))
+
+    def parse() -> None:
+        plugin = inventory_loader.get("hostdb")
+        plugin.parse(InventoryData(), DataLoader(), str(source), cache=False)
+
+    return parse
+
+
+def default_stages() -> list[str]:
+    """Return the stages that can run, skipping the inventory without ansible."""
+    if importlib.util.find_spec("ansible") is None:
+        return [stage for stage in STAGES if stage != "inventory"]
+    return list(STAGES)
+
+
+def run_benchmarks(
+    config: pathlib.Path,
+    stages: Sequence[str] | None = None,
+    repeat: int = 5,
+    allocate: int = 100,
+) -> list[StageResult]:
+    """Run the benchmark stages against the manifest.
+
+    Each stage is run `repeat` times, with `allocate` names allocated by the
+    allocate stage. Stages default to `default_stages()`.
+    """
+    if stages is None:
+        stages = default_stages()
+    if unknown := set(stages) - set(STAGES):
+        raise HostDbException(f"Unknown benchmark stages: {sorted(unknown)}")
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = pathlib.Path(tmp)
+        cache_dir = work_dir / "cache"
+        db = HostDb.from_yaml(config)
+        for stage in stages:
+            items = len(db.manifest.machines)
+            func: Callable[[], Any]
+            if stage == "load":
+                func = functools.partial(HostDb.from_yaml, config)
+            elif stage == "load_cached":
+                HostDb.from_yaml(config, cache_dir=cache_dir)
+                func = functools.partial(HostDb.from_yaml, config, cache_dir=cache_dir)
+            elif stage == "validate":
+                func = functools.partial(check_manifest, db.manifest)
+            elif stage == "inventory":
+                func = _inventory_stage(config, work_dir)
+            else:
+                space = naming.Combination(
+                    naming.WordList.default(), naming.WordList.default()
+                )
+                items = allocate
+                func = functools.partial(
+                    naming.allocate_names, space, db.hostnames, allocate
+                )
+            results.append(_measure(stage, items, func, repeat))
+    return results
+
+
+def results_json(
+    results: Sequence[StageResult], synthetic: SyntheticConfig | None = None
+) -> dict[str, Any]:
+    """Return the benchmark results with details of the environment."""
+    try:
+        version = importlib.metadata.version("hostdb")
+    except importlib.metadata.PackageNotFoundError:
+        version = None
+    return {
+        "hostdb_version": version,
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.time(),
+        "synthetic": dataclasses.asdict(synthetic) if synthetic else None,
+        "stages": {result.name: result.as_dict() for result in results},
+    }
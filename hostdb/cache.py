@@ -0,0 +1,240 @@
+"""Binary cache of decoded manifests.
+
+Parsing and decoding a large YAML manifest dominates the runtime of most
+commands. The cache stores a pickled `Manifest` next to a fingerprint of the
+root file and every file pulled in with an `!include` tag so that a warm load
+can skip YAML entirely. An entry is only used when every file in the
+fingerprint is unchanged.
+
+Entries are pickles, and loading a pickle can run arbitrary code, so the
+cache directory must only be writable by the user running hostdb. It is
+created readable only by its owner, and entries owned by another user are
+ignored. Don't point `HOSTDB_CACHE_DIR` at a directory other users control.
+"""
+
+import hashlib
+import logging
+import os
+import pathlib
+import pickle
+import tempfile
+from collections.abc import Iterable
+from dataclasses import dataclass
+
+from .manifest import Manifest
+from .validation import ValidationState
+
+_LOGGER = logging.getLogger(__name__)
+
+# Bump when the pickled format or the manifest dataclasses change shape
+CACHE_VERSION = 3
+
+CACHE_DIR_ENV = "HOSTDB_CACHE_DIR"
+
+
+def default_cache_dir() -> pathlib.Path:
+    """Return the default directory for cached manifests."""
+    if cache_dir := os.environ.get(CACHE_DIR_ENV):
+        return pathlib.Path(cache_dir)
+    if xdg_cache := os.environ.get("XDG_CACHE_HOME"):
+        return pathlib.Path(xdg_cache) / "hostdb"
+    return pathlib.Path.home() / ".cache" / "hostdb"
+
+
+def _digest(path: pathlib.Path) -> str:
+    """Return the content hash of a file."""
+    with path.open("rb") as fd:
+        return hashlib.file_digest(fd, "sha256").hexdigest()
+
+
+@dataclass(frozen=True)
+class FileFingerprint:
+    """The state of a single file that a cached manifest was built from."""
+
+    path: str
+    mtime_ns: int
+    size: int
+    digest: str
+
+    @classmethod
+    def from_path(cls, path: pathlib.Path) -> "FileFingerprint":
+        """Create a fingerprint for the current contents of the file."""
+        stat = path.stat()
+        return FileFingerprint(
+            path=str(path.resolve()),
+            mtime_ns=stat.st_mtime_ns,
+            size=stat.st_size,
+            digest=_digest(path),
+        )
+
+    @classmethod
+    def from_contents(
+        cls, path: pathlib.Path, mtime_ns: int, data: bytes
+    ) -> "FileFingerprint":
+        """Create a fingerprint for the contents read from a file.
+
+        The `mtime_ns` must be from before the contents were read, so that a
+        write made while reading changes the modification time and the file
+        is compared by content.
+        """
+        return FileFingerprint(
+            path=str(path.resolve()),
+            mtime_ns=mtime_ns,
+            size=len(data),
+            digest=hashlib.sha256(data).hexdigest(),
+        )
+
+    def is_current(self) -> bool:
+        """Return True if the file on disk still matches the fingerprint.
+
+        The file stat is checked first and the content hash is only computed
+        when the modification time changed but the size did not, e.g. when the
+        file was touched or rewritten with the same contents.
+        """
+        path = pathlib.Path(self.path)
+        try:
+            stat = path.stat()
+        except OSError:
+            return False
+        if stat.st_size != self.size:
+            return False
+        if stat.st_mtime_ns == self.mtime_ns:
+            return True
+        try:
+            return _digest(path) == self.digest
+        except OSError:
+            return False
+
+
+def fingerprint(paths: Iterable[pathlib.Path]) -> tuple[FileFingerprint, ...]:
+    """Return the fingerprint for a set of files, ignoring duplicates."""
+    result: dict[pathlib.Path, FileFingerprint] = {}
+    for path in paths:
+        resolved = path.resolve()
+        if resolved not in result:
+            result[resolved] = FileFingerprint.from_path(resolved)
+    return tuple(result.values())
+
+
+def is_current(fingerprints: Iterable[FileFingerprint]) -> bool:
+    """Return True if all files are unchanged since they were fingerprinted."""
+    return all(fp.is_current() for fp in fingerprints)
+
+
+@dataclass
+class _CacheEntry:
+    """A cached manifest stored on disk."""
+
+    version: int
+    files: tuple[FileFingerprint, ...]
+    manifest: Manifest
+
+
+def _owned(stat: os.stat_result) -> bool:
+    """Return True if the file is owned by the current user."""
+    if not hasattr(os, "getuid"):
+        return True
+    return stat.st_uid == os.getuid()
+
+
+def _read_entry(entry_path: pathlib.Path) -> object | None:
+    """Return the unpickled contents of a cache file or None if unreadable.
+
+    Files owned by another user are not unpickled, see the module docstring.
+    """
+    try:
+        with entry_path.open("rb") as fd:
+            if not _owned(os.fstat(fd.fileno())):
+                _LOGGER.warning(
+                    "Ignoring cache entry %s not owned by the current user",
+                    entry_path,
+                )
+                return None
+            return pickle.load(fd)
+    except FileNotFoundError:
+        return None
+    except Exception as err:  # noqa: BLE001
+        _LOGGER.debug("Ignoring unreadable cache entry %s: %s", entry_path, err)
+        return None
+
+
+def _write_entry(entry_path: pathlib.Path, entry: object) -> None:
+    """Atomically replace the contents of a cache file.
+
+    The cache directory is created readable and writable only by its owner.
+    """
+    try:
+        entry_path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            dir=entry_path.parent, prefix=".", delete=False
+        ) as fd:
+            tmp_path = pathlib.Path(fd.name)
+            try:
+                pickle.dump(entry, fd, protocol=pickle.HIGHEST_PROTOCOL)
+            except BaseException:
+                tmp_path.unlink(missing_ok=True)
+                raise
+        os.replace(tmp_path, entry_path)
+    except OSError as err:
+        _LOGGER.debug("Unable to write cache entry %s: %s", entry_path, err)
+
+
+class ManifestCache:
+    """A directory of cached manifests keyed by the path of the root file."""
+
+    def __init__(self, cache_dir: pathlib.Path) -> None:
+        """Initialize ManifestCache."""
+        self._cache_dir = cache_dir
+
+    def _entry_path(self, config: pathlib.Path, suffix: str) -> pathlib.Path:
+        """Return the path of a cache entry for the manifest file."""
+        key = hashlib.sha256(str(config.resolve()).encode()).hexdigest()
+        return self._cache_dir / f"{key[:32]}{suffix}"
+
+    def load(
+        self, config: pathlib.Path
+    ) -> tuple[Manifest, tuple[FileFingerprint, ...]] | None:
+        """Return the cached manifest and the fingerprints of the files it was read from.
+
+        Returns None if the entry is missing or out of date.
+        """
+        entry_path = self._entry_path(config, ".manifest")
+        entry = _read_entry(entry_path)
+        if not isinstance(entry, _CacheEntry) or entry.version != CACHE_VERSION:
+            return None
+        if not is_current(entry.files):
+            _LOGGER.debug("Cache entry %s is out of date", entry_path)
+            return None
+        return (entry.manifest, entry.files)
+
+    def store(
+        self,
+        config: pathlib.Path,
+        manifest: Manifest,
+        files: Iterable[FileFingerprint],
+    ) -> None:
+        """Store the manifest decoded from the config file and its includes.
+
+        The `files` are the fingerprints of the config file and its includes
+        taken as they were read, see `hostdb.yaml_loaders.record_reads`, so an
+        edit made while the manifest was parsed invalidates the entry.
+        """
+        entry = _CacheEntry(
+            version=CACHE_VERSION,
+            files=tuple(files),
+            manifest=manifest,
+        )
+        _write_entry(self._entry_path(config, ".manifest"), entry)
+
+    def load_validation_state(self, config: pathlib.Path) -> ValidationState | None:
+        """Return the state of the last successful validation of the manifest."""
+        entry = _read_entry(self._entry_path(config, ".validation"))
+        if not isinstance(entry, ValidationState):
+            return None
+        return entry
+
+    def store_validation_state(
+        self, config: pathlib.Path, state: ValidationState
+    ) -> None:
+        """Store the state of a successful validation of the manifest."""
+        _write_entry(self._entry_path(config, ".validation"), state)
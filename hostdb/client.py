@@ -0,0 +1,59 @@
+"""A client for the hostdb daemon.
+
+This is kept separate from `hostdb.daemon` so that commands can talk to a
+running daemon without importing asyncio or the manifest parser.
+"""
+
+import json
+import os
+import pathlib
+import socket
+from typing import Any
+
+from .exceptions import HostDbDaemonUnavailable, HostDbException
+
+SOCKET_ENV = "HOSTDB_SOCKET"
+
+# Seconds to wait for the daemon before reading the manifest directly
+_TIMEOUT = 30.0
+
+
+def default_socket_path() -> pathlib.Path | None:
+    """Return the socket path of the daemon from the environment, if set."""
+    if socket_path := os.environ.get(SOCKET_ENV):
+        return pathlib.Path(socket_path)
+    return None
+
+
+def request(
+    socket_path: pathlib.Path,
+    config: pathlib.Path,
+    method: str,
+    **params: Any,
+) -> Any:
+    """Send a request to the daemon serving the manifest and return the result.
+
+    Raises HostDbDaemonUnavailable if there is no daemon serving the manifest,
+    or it does not answer in time, so that the caller can fall back to reading
+    it directly.
+    """
+    message = {"manifest": str(config.resolve()), "method": method, "params": params}
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(_TIMEOUT)
+            sock.connect(str(socket_path))
+            sock.sendall(json.dumps(message).encode() + b"\n")
+            with sock.makefile("rb") as stream:
+                line = stream.readline()
+    except OSError as err:
+        raise HostDbDaemonUnavailable(
+            f"Unable to connect to daemon at {socket_path}: {err}"
+        ) from err
+    if not line:
+        raise HostDbDaemonUnavailable(f"Daemon at {socket_path} closed the connection")
+    response = json.loads(line)
+    if "error" in response:
+        if response.get("unavailable"):
+            raise HostDbDaemonUnavailable(response["error"])
+        raise HostDbException(response["error"])
+    return response["result"]
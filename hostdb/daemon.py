@@ -0,0 +1,185 @@
+"""A long running daemon serving manifest lookups over a Unix socket.
+
+The daemon keeps a `HostDb` resident so that commands and inventory lookups
+do not pay for start-up and parsing on every call. It checks the manifest and
+every included file before answering each request, and polls them in between,
+reloading when any of them change. See `hostdb.client` for sending requests.
+
+The protocol is one JSON object per line. A request has a `method`, the
+`manifest` path the client expects to be served, and optional `params`. The
+response has either a `result` or an `error`.
+"""
+
+import asyncio
+import dataclasses
+import json
+import logging
+import pathlib
+import socket
+import stat
+import time
+from typing import Any
+
+from .cache import is_current
+from .exceptions import HostDbDaemonUnavailable, HostDbException
+from .hostdb import HostDb
+from .validation import ValidationState, check_incremental
+
+_LOGGER = logging.getLogger(__name__)
+
+# The maximum size of a single request or response line
+_LIMIT = 64 * 1024 * 1024
+
+
+class ManifestServer:
+    """Serves lookups against a resident HostDb, reloading it on changes."""
+
+    def __init__(
+        self,
+        config: pathlib.Path,
+        cache_dir: pathlib.Path | None = None,
+        interval: float = 1.0,
+    ) -> None:
+        """Initialize ManifestServer."""
+        self._config = config.resolve()
+        self._cache_dir = cache_dir
+        self._interval = interval
+        self._db: HostDb | None = None
+        self._files = ()
+        self._loaded_at: float | None = None
+        self._load_error: str | None = None
+        self._issues: list[str] = []
+        self._validation_state: ValidationState | None = None
+        self._refresh_lock = asyncio.Lock()
+
+    async def reload(self) -> None:
+        """Load the manifest and revalidate the machines that changed.
+
+        The files are fingerprinted as they are read, so an edit made while
+        the manifest is loading is picked up by the next check for changes.
+        """
+        try:
+            db = await asyncio.to_thread(
+                HostDb.from_yaml, self._config, cache_dir=self._cache_dir, compact=True
+            )
+        except (HostDbException, OSError) as err:
+            _LOGGER.warning("Unable to load %s: %s", self._config, err)
+            self._load_error = str(err)
+            return
+        (report, self._validation_state) = await asyncio.to_thread(
+            check_incremental, db.manifest, self._validation_state
+        )
+        self._db = db
+        self._files = db.fingerprints
+        self._issues = [str(issue) for issue in report.issues]
+        self._loaded_at = time.time()
+        self._load_error = None
+        _LOGGER.info("Loaded %s with %d hosts", self._config, len(db.hosts))
+
+    async def refresh(self) -> None:
+        """Reload the manifest if it or one of its includes changed."""
+        async with self._refresh_lock:
+            if self._files and await asyncio.to_thread(is_current, self._files):
+                return
+            await self.reload()
+
+    async def watch(self) -> None:
+        """Reload the manifest whenever it or one of its includes changes."""
+        while True:
+            await asyncio.sleep(self._interval)
+            await self.refresh()
+
+    def handle_request(self, request: dict[str, Any]) -> Any:
+        """Return the result of a request or raise a HostDbException."""
+        manifest = request.get("manifest")
+        if manifest is not None and pathlib.Path(manifest) != self._config:
+            raise HostDbDaemonUnavailable(
+                f"Daemon serves {self._config} not {manifest}"
+            )
+        method = request.get("method")
+        params = request.get("params") or {}
+        if method == "status":
+            return {
+                "manifest": str(self._config),
+                "files": [fp.path for fp in self._files],
+                "loaded_at": self._loaded_at,
+                "error": self._load_error,
+            }
+        if method == "validate" and self._load_error is not None:
+            return {"valid": False, "issues": [self._load_error]}
+        if (db := self._db) is None:
+            raise HostDbException(f"Manifest not loaded: {self._load_error}")
+        if method == "hostnames":
+            return list(db.hostnames)
+        if method == "hosts":
+            return {
+                host: dataclasses.asdict(machine) for host, machine in db.hosts.items()
+            }
+        if method == "services":
+            return db.services
+        if method == "service_groups":
+            return db.service_groups
+        if method == "validate":
+            return {"valid": not self._issues, "issues": self._issues}
+        if method == "query":
+            return db.find_hosts(**params)
+        raise HostDbException(f"Unknown method {method!r}")
+
+    async def _handle_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Answer requests from a client until it disconnects."""
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                    # Answer from the files as they are now rather than as of
+                    # the last poll, e.g. validating right after an edit
+                    await self.refresh()
+                    response: dict[str, Any] = {"result": self.handle_request(request)}
+                except HostDbDaemonUnavailable as err:
+                    response = {"error": str(err), "unavailable": True}
+                except (HostDbException, ValueError, TypeError) as err:
+                    response = {"error": str(err)}
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.LimitOverrunError) as err:
+            _LOGGER.debug("Client connection error: %s", err)
+        finally:
+            writer.close()
+
+    async def serve(self, socket_path: pathlib.Path) -> None:
+        """Load the manifest then serve requests on the socket until cancelled."""
+        await self.reload()
+        _remove_stale_socket(socket_path)
+        server = await asyncio.start_unix_server(
+            self._handle_client, path=socket_path, limit=_LIMIT
+        )
+        watcher = asyncio.create_task(self.watch())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            watcher.cancel()
+            socket_path.unlink(missing_ok=True)
+
+
+def _remove_stale_socket(socket_path: pathlib.Path) -> None:
+    """Remove a socket left behind by a daemon that is no longer running.
+
+    Raises a HostDbException if another daemon is listening on the socket or
+    the path is not a socket.
+    """
+    try:
+        mode = socket_path.stat().st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise HostDbException(f"{socket_path} exists and is not a socket")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(str(socket_path))
+        except ConnectionRefusedError:
+            socket_path.unlink(missing_ok=True)
+            return
+    raise HostDbException(f"A daemon is already serving on {socket_path}")
@@ -0,0 +1,108 @@
+"""Comparison of the machines in two manifests."""
+
+import dataclasses
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from typing import Any
+
+from .manifest import Machine
+
+_MACHINE_FIELDS = [item.name for item in dataclasses.fields(Machine)]
+
+
+@dataclass(frozen=True)
+class MachineDiff:
+    """The machines added, removed, or changed between two manifests."""
+
+    added: list[Machine] = field(default_factory=list)
+    removed: list[Machine] = field(default_factory=list)
+    changed: list[tuple[Machine, Machine]] = field(default_factory=list)
+    """Pairs of the old and new machine with the same host."""
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+
+def diff_machines(
+    old: Mapping[str, Machine], new: Mapping[str, Machine]
+) -> MachineDiff:
+    """Return the differences between two sets of machines keyed by host."""
+    diff = MachineDiff()
+    for host, machine in new.items():
+        if (previous := old.get(host)) is None:
+            diff.added.append(machine)
+        elif previous != machine:
+            diff.changed.append((previous, machine))
+    diff.removed.extend(machine for host, machine in old.items() if host not in new)
+    return diff
+
+
+@dataclass(frozen=True)
+class Reassignment:
+    """A service, IP address or MAC address that moved to a different host."""
+
+    value: str
+    old_host: str
+    new_host: str
+
+
+@dataclass(frozen=True)
+class ManifestDiff:
+    """The machines that changed between two manifests and what moved between them.
+
+    A value that moved is also part of the change to the machines it moved
+    between, and is listed separately so that records keyed by the value, such
+    as a DNS CNAME or DHCP reservation, can be updated directly.
+    """
+
+    machines: MachineDiff = field(default_factory=MachineDiff)
+    service_moves: list[Reassignment] = field(default_factory=list)
+    ip_reassignments: list[Reassignment] = field(default_factory=list)
+    mac_reassignments: list[Reassignment] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.machines)
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the differences as a JSON serializable dict."""
+        return {
+            "added": [dataclasses.asdict(machine) for machine in self.machines.added],
+            "removed": [
+                dataclasses.asdict(machine) for machine in self.machines.removed
+            ],
+            "changed": [
+                {
+                    "host": new.host,
+                    "fields": changed_fields(old, new),
+                    "old": dataclasses.asdict(old),
+                    "new": dataclasses.asdict(new),
+                }
+                for old, new in self.machines.changed
+            ],
+            "service_moves": [dataclasses.asdict(r) for r in self.service_moves],
+            "ip_reassignments": [dataclasses.asdict(r) for r in self.ip_reassignments],
+            "mac_reassignments": [
+                dataclasses.asdict(r) for r in self.mac_reassignments
+            ],
+        }
+
+
+def changed_fields(old: Machine, new: Machine) -> list[str]:
+    """Return the names of the fields that differ between two machines."""
+    return [
+        name for name in _MACHINE_FIELDS if getattr(old, name) != getattr(new, name)
+    ]
+
+
+def diff_assignments(
+    old: Mapping[str, str], new: Mapping[str, str]
+) -> list[Reassignment]:
+    """Return the values assigned to a different host, from maps of value to host.
+
+    Values only present on one side are not reassignments.
+    """
+    return [
+        Reassignment(value, previous, host)
+        for value, host in new.items()
+        if (previous := old.get(value)) is not None and previous != host
+    ]
@@ -7,3 +7,7 @@ class HostDbException(Exception):
 
 class HostDbConfigError(HostDbException):
     """Exception raised for errors in configuration"""
+
+
+class HostDbDaemonUnavailable(HostDbException):
+    """Exception raised when no daemon is serving the requested manifest."""
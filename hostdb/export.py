@@ -0,0 +1,148 @@
+"""Export of a manifest to DNS, DHCP and hosts file formats.
+
+Each format is produced line by line from a single pass over the machines so
+large manifests are never held in memory as text. Files are replaced
+atomically and only when their contents change, so services reading them
+are not reloaded needlessly.
+"""
+
+import hashlib
+import os
+import pathlib
+import tempfile
+from collections.abc import Callable, Iterable, Iterator
+
+from .exceptions import HostDbException
+from .hostdb import HostDb, normalize_mac
+
+_HEADER = "Generated by hostdb, do not edit"
+
+
+def _domain(db: HostDb, domain: str | None) -> str | None:
+    """Return the domain to export names under, defaulting to the site domain."""
+    if domain is None and db.manifest.site is not None:
+        domain = db.manifest.site.domain
+    return domain.rstrip(".") if domain else None
+
+
+def bind_records(db: HostDb, domain: str | None = None) -> Iterator[str]:
+    """Yield BIND zone file lines for the machines and their services.
+
+    Machines with an IP address get an A or AAAA record and each of their
+    services a CNAME to the machine, relative to the site domain. The lines
+    are meant to be pulled into a zone with `$INCLUDE`, which defines the SOA
+    and NS records.
+    """
+    if (origin := _domain(db, domain)) is None:
+        raise HostDbException("A domain is required to export a BIND zone")
+    yield f"; {_HEADER}\n"
+    yield f"$ORIGIN {origin}.\n"
+    for machine in db.manifest.machines:
+        if not machine.ip:
+            continue
+        record = "AAAA" if ":" in machine.ip else "A"
+        yield f"{machine.host}\tIN\t{record}\t{machine.ip}\n"
+        for service in machine.services:
+            yield f"{service}\tIN\tCNAME\t{machine.host}\n"
+
+
+def dnsmasq_hosts(db: HostDb, domain: str | None = None) -> Iterator[str]:
+    """Yield dnsmasq `dhcp-host` lines for machines with a MAC and IP address."""
+    yield f"# {_HEADER}\n"
+    for machine in db.manifest.machines:
+        if machine.mac and machine.ip:
+            yield f"dhcp-host={normalize_mac(machine.mac)},{machine.ip},{machine.host}\n"
+
+
+def dhcpd_hosts(db: HostDb, domain: str | None = None) -> Iterator[str]:
+    """Yield ISC DHCP `host` declarations for machines with a MAC and IP address."""
+    yield f"# {_HEADER}\n"
+    for machine in db.manifest.machines:
+        if machine.mac and machine.ip:
+            yield (
+                f"host {machine.host} {{\n"
+                f"  hardware ethernet {normalize_mac(machine.mac)};\n"
+                f"  fixed-address {machine.ip};\n"
+                "}\n"
+            )
+
+
+def hosts_entries(db: HostDb, domain: str | None = None) -> Iterator[str]:
+    """Yield /etc/hosts lines with the names and service aliases of each machine."""
+    suffix = _domain(db, domain)
+    yield f"# {_HEADER}\n"
+    for machine in db.manifest.machines:
+        if not machine.ip:
+            continue
+        names = []
+        for name in (machine.host, *machine.services):
+            if suffix:
+                names.append(f"{name}.{suffix}")
+            names.append(name)
+        yield f"{machine.ip}\t{' '.join(names)}\n"
+
+
+EXPORTERS: dict[str, Callable[[HostDb, str | None], Iterator[str]]] = {
+    "bind": bind_records,
+    "dnsmasq": dnsmasq_hosts,
+    "dhcpd": dhcpd_hosts,
+    "hosts": hosts_entries,
+}
+
+
+def write_if_changed(path: pathlib.Path, lines: Iterable[str]) -> bool:
+    """Atomically replace the file with the lines, unless the contents are the same.
+
+    The lines are streamed to a temporary file in the same directory while
+    hashing them, and the temporary file is synced to disk before it replaces
+    the file so a crash can't leave an empty or partial file behind. A replaced
+    file keeps its permissions and a new file is readable by everyone, since
+    servers such as dnsmasq read it. Returns True if the file was written.
+    """
+    digest = hashlib.sha256()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        "w", encoding="utf-8", dir=path.parent, prefix=f".{path.name}.", delete=False
+    ) as fd:
+        tmp_path = pathlib.Path(fd.name)
+        try:
+            for line in lines:
+                fd.write(line)
+                digest.update(line.encode())
+            try:
+                with path.open("rb") as existing:
+                    unchanged = hashlib.file_digest(existing, "sha256").digest() == (
+                        digest.digest()
+                    )
+                    mode = os.fstat(existing.fileno()).st_mode & 0o7777
+            except FileNotFoundError:
+                (unchanged, mode) = (False, 0o644)
+            if not unchanged:
+                fd.flush()
+                os.fsync(fd.fileno())
+        except BaseException:
+            fd.close()
+            tmp_path.unlink(missing_ok=True)
+            raise
+    if unchanged:
+        tmp_path.unlink()
+        return False
+    tmp_path.chmod(mode)
+    os.replace(tmp_path, path)
+    return True
+
+
+def export(
+    db: HostDb, file_format: str, path: pathlib.Path, domain: str | None = None
+) -> bool:
+    """Write the manifest to the file in one of the `EXPORTERS` formats.
+
+    The `domain` defaults to the site domain. The manifest is not validated
+    here, callers should check it with `hostdb.validate` before exporting.
+    Returns True if the file changed.
+    """
+    if (exporter := EXPORTERS.get(file_format)) is None:
+        raise HostDbException(
+            f"Unknown export format '{file_format}', expected one of {list(EXPORTERS)}"
+        )
+    return write_if_changed(path, exporter(db, domain))
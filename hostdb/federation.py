@@ -0,0 +1,246 @@
+"""Manifests of several sites loaded and checked together.
+
+Each site has its own manifest, so the same host name or service may be used
+by more than one site. `HostDbSet` keeps a `HostDb` per site and indexes
+across all of them to find machines anywhere and to check the values that
+must be unique everywhere, such as MAC addresses.
+"""
+
+import functools
+import pathlib
+from collections.abc import Iterable, Iterator, Mapping
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+
+from .cache import FileFingerprint, ManifestCache
+from .exceptions import HostDbConfigError, HostDbException
+from .hostdb import HostDb, _normalize_ip, normalize_mac
+from .manifest import Machine, Manifest
+from .validation import IssueType, ValidationIssue, ValidationReport, check_manifest
+
+MANIFEST_SUFFIXES = (".yaml", ".yml")
+
+
+@dataclass(frozen=True)
+class SiteMachine:
+    """A machine along with the site it belongs to."""
+
+    site: str
+    machine: Machine
+
+
+@dataclass
+class _GlobalIndexes:
+    """Machines of every site by IP, MAC and inventory service alias."""
+
+    ips: dict[str, list[SiteMachine]] = field(default_factory=dict)
+    macs: dict[str, list[SiteMachine]] = field(default_factory=dict)
+    aliases: dict[str, list[SiteMachine]] = field(default_factory=dict)
+
+
+def site_key(manifest: Manifest, path: pathlib.Path) -> str:
+    """Return the name of the site of a manifest.
+
+    This is the site domain, then the site env, then the manifest file name.
+    """
+    if site := manifest.site:
+        if site.domain:
+            return site.domain
+        if site.env:
+            return site.env
+    return path.stem
+
+
+def service_alias(service: str, manifest: Manifest) -> str:
+    """Return the inventory host name of a service, qualified by the site env."""
+    if manifest.site and manifest.site.env:
+        return f"{service}.{manifest.site.env}"
+    return service
+
+
+def manifest_paths(directory: pathlib.Path) -> list[pathlib.Path]:
+    """Return the manifest files in a directory, sorted by name.
+
+    Only the top level is searched so files pulled in with `!include` can be
+    kept in subdirectories.
+    """
+    if not directory.is_dir():
+        raise HostDbException(f"Manifest directory '{directory}' does not exist")
+    return sorted(
+        path
+        for path in directory.iterdir()
+        if path.suffix in MANIFEST_SUFFIXES and path.is_file()
+    )
+
+
+def _manifest_path(db: HostDb) -> pathlib.Path:
+    """Return the manifest file a HostDb was loaded from."""
+    return db.files[0] if db.files else pathlib.Path("manifest")
+
+
+def _load(
+    path: pathlib.Path, cache_dir: pathlib.Path | None
+) -> tuple[Manifest, list[pathlib.Path], tuple[FileFingerprint, ...]]:
+    """Load a manifest, returning what is needed to build its HostDb in any process."""
+    db = HostDb.from_yaml(path, cache_dir=cache_dir)
+    return (db.manifest, db.files, db.fingerprints)
+
+
+class HostDbSet(Mapping[str, HostDb]):
+    """A HostDb for each of several sites, keyed by site.
+
+    Sites are ordered as the manifests were given.
+    """
+
+    def __init__(self, dbs: Iterable[HostDb]) -> None:
+        """Initialize HostDbSet, raising HostDbConfigError if a site is repeated."""
+        self._sites: dict[str, HostDb] = {}
+        for db in dbs:
+            key = site_key(db.manifest, _manifest_path(db))
+            if key in self._sites:
+                raise HostDbConfigError(
+                    "Duplicate site '%s' in '%s' and '%s'"
+                    % (key, _manifest_path(self._sites[key]), _manifest_path(db))
+                )
+            self._sites[key] = db
+
+    @classmethod
+    def from_paths(
+        cls,
+        paths: Iterable[pathlib.Path],
+        cache_dir: pathlib.Path | None = None,
+        max_workers: int | None = None,
+    ) -> "HostDbSet":
+        """Load the manifests, parsing them concurrently in a process pool.
+
+        The `cache_dir` is used as in `HostDb.from_yaml`. Manifests that are
+        current in the cache are read in the current process and only the rest
+        are sent to the pool, so the load takes about as long as parsing the
+        slowest changed manifest. A single manifest to parse, or a
+        `max_workers` of 1, is parsed in the current process.
+        """
+        paths = list(paths)
+        loaded: dict[
+            int, tuple[Manifest, list[pathlib.Path], tuple[FileFingerprint, ...]]
+        ] = {}
+        if cache_dir is not None:
+            cache = ManifestCache(cache_dir)
+            for index, path in enumerate(paths):
+                if (entry := cache.load(path)) is not None:
+                    (manifest, files) = entry
+                    loaded[index] = (
+                        manifest,
+                        [pathlib.Path(fp.path) for fp in files],
+                        files,
+                    )
+        missing = [index for index in range(len(paths)) if index not in loaded]
+        if len(missing) <= 1 or max_workers == 1:
+            for index in missing:
+                loaded[index] = _load(paths[index], cache_dir)
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                results = executor.map(
+                    _load,
+                    [paths[index] for index in missing],
+                    [cache_dir] * len(missing),
+                )
+                loaded.update(zip(missing, results, strict=True))
+        return cls(HostDb(*loaded[index]) for index in range(len(paths)))
+
+    @classmethod
+    def from_directory(
+        cls,
+        directory: pathlib.Path,
+        cache_dir: pathlib.Path | None = None,
+        max_workers: int | None = None,
+    ) -> "HostDbSet":
+        """Load every manifest in the directory, see `manifest_paths`."""
+        if not (paths := manifest_paths(directory)):
+            raise HostDbException(f"No manifests found in '{directory}'")
+        return cls.from_paths(paths, cache_dir, max_workers)
+
+    def __getitem__(self, site: str) -> HostDb:
+        return self._sites[site]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._sites)
+
+    def __len__(self) -> int:
+        return len(self._sites)
+
+    @property
+    def files(self) -> list[pathlib.Path]:
+        """Every manifest and included file of every site."""
+        return [path for db in self._sites.values() for path in db.files]
+
+    @functools.cached_property
+    def _indexes(self) -> _GlobalIndexes:
+        """Indexes across every site, built on first use."""
+        indexes = _GlobalIndexes()
+        for site, db in self._sites.items():
+            for machine in db.manifest.machines:
+                entry = SiteMachine(site, machine)
+                if machine.ip:
+                    indexes.ips.setdefault(_normalize_ip(machine.ip), []).append(entry)
+                if machine.mac:
+                    indexes.macs.setdefault(normalize_mac(machine.mac), []).append(
+                        entry
+                    )
+                for service in machine.services:
+                    alias = service_alias(service, db.manifest)
+                    indexes.aliases.setdefault(alias, []).append(entry)
+        return indexes
+
+    def machines_by_ip(self, ip: str) -> list[SiteMachine]:
+        """Return the machines of any site with the IP address."""
+        return self._indexes.ips.get(_normalize_ip(ip), [])
+
+    def machines_by_mac(self, mac: str) -> list[SiteMachine]:
+        """Return the machines of any site with the MAC address."""
+        return self._indexes.macs.get(normalize_mac(mac), [])
+
+    def machines_by_alias(self, alias: str) -> list[SiteMachine]:
+        """Return the machines of any site with the inventory service alias."""
+        return self._indexes.aliases.get(alias, [])
+
+    def check(self) -> ValidationReport:
+        """Validate each site and that addresses and aliases are unique across sites.
+
+        Problems within a site are prefixed with the site name. An IP address,
+        MAC address or inventory service alias used by more than one site is
+        reported once.
+        """
+        issues = [
+            replace(issue, message=f"{site}: {issue.message}")
+            for site, db in self._sites.items()
+            for issue in check_manifest(db.manifest).issues
+        ]
+        for issue_type, label, index in (
+            (IssueType.DUPLICATE_IP, "IP", self._indexes.ips),
+            (IssueType.DUPLICATE_MAC, "MAC", self._indexes.macs),
+            (IssueType.DUPLICATE_SERVICE, "service alias", self._indexes.aliases),
+        ):
+            for value, entries in index.items():
+                sites = dict.fromkeys(entry.site for entry in entries)
+                if len(sites) < 2:
+                    continue
+                issues.append(
+                    ValidationIssue(
+                        issue_type,
+                        "Duplicate %s across sites %s: %s"
+                        % (
+                            label,
+                            ", ".join(
+                                f"'{entry.site}/{entry.machine.host}'"
+                                for entry in entries
+                            ),
+                            value,
+                        ),
+                        entries[-1].machine.host,
+                    )
+                )
+        return ValidationReport(issues=issues)
+
+    def validate(self) -> None:
+        """Validate every site, raising a HostDbConfigError describing the problems."""
+        self.check().raise_for_issues()
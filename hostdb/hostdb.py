@@ -1,65 +1,338 @@
-"""Library for reading the terraform database."""
+"""Library for reading the terraform database.
 
+The YAML parser, decoder and asyncio are imported on first use so that
+commands answered from the manifest cache start quickly.
+"""
+
+import array
+import bisect
+import functools
+import ipaddress
+import logging
+import os
 import pathlib
 import re
+from collections.abc import AsyncIterator, Callable, Generator, Iterator, Mapping
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, replace
+from typing import TYPE_CHECKING
 
-import yaml
-import yaml.parser
-
+from .cache import FileFingerprint, ManifestCache, fingerprint
+from .diff import MachineDiff, ManifestDiff, diff_assignments, diff_machines
 from .exceptions import HostDbException
-from .manifest import SERVICE_MATCH, Machine, Manifest
-from .validation import validate_manifest
-from .yaml_loaders import yaml_decode
+from .manifest import Machine, Manifest, ServiceIndex
+from .profile import StageEvent, add_hook, stage
+from .table import MachineTable
+from .validation import SourceLocation, validate_manifest
+
+if TYPE_CHECKING:
+    from .yaml_loaders import FragmentSet
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@contextmanager
+def load_errors(config: pathlib.Path) -> Generator[None]:
+    """Translate errors from reading a manifest file into a HostDbException.
+
+    This is used for every file read with the loaders in `hostdb.yaml_loaders`,
+    such as the manifest itself or a file of machine edits.
+    """
+    import yaml  # noqa: PLC0415
+
+    try:
+        yield
+    except FileNotFoundError as err:
+        raise HostDbException(f"Could not read {config}: {err}") from err
+    except yaml.YAMLError as err:
+        raise HostDbException(f"Could not parse {config}: {err}") from err
+    except ValueError as err:
+        raise HostDbException(f"Could not parse {config}: {err}") from err
+
+
+_MAC_SEPARATORS = re.compile(r"[:\-.]")
+
+IPNetwork = ipaddress.IPv4Network | ipaddress.IPv6Network
+
+
+def normalize_mac(mac: str) -> str:
+    """Return the MAC address in lower case colon separated form.
+
+    Values that are not a 48-bit MAC address are only lower cased.
+    """
+    digits = _MAC_SEPARATORS.sub("", mac).lower()
+    if len(digits) != 12 or any(c not in "0123456789abcdef" for c in digits):
+        return mac.lower()
+    return ":".join(digits[i : i + 2] for i in range(0, 12, 2))
+
+
+def _normalize_ip(ip: str) -> str:
+    """Return the canonical form of an IP address, e.g. compressed IPv6."""
+    try:
+        return str(ipaddress.ip_address(ip))
+    except ValueError:
+        return ip
+
+
+def _ip_key(ip: str) -> tuple[int, int] | None:
+    """Return a sortable key for an IP address or None if it is not valid."""
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return None
+    return (address.version, int(address))
+
+
+def _stat_files(
+    files: list[pathlib.Path],
+) -> dict[pathlib.Path, tuple[int, int] | None]:
+    """Return the modification time and size of each file, or None if missing."""
+    stats: dict[pathlib.Path, tuple[int, int] | None] = {}
+    for path in files:
+        try:
+            st = os.stat(path)
+        except OSError:
+            stats[path] = None
+        else:
+            stats[path] = (st.st_mtime_ns, st.st_size)
+    return stats
+
+
+async def _wait_for_changes(
+    stats: dict[pathlib.Path, tuple[int, int] | None],
+    interval: float,
+    debounce: float,
+) -> set[pathlib.Path]:
+    """Wait until the files change then stop changing for `debounce` seconds.
+
+    Returns the changed files and updates `stats` in place.
+    """
+    import asyncio  # noqa: PLC0415
+
+    files = list(stats)
+    while True:
+        await asyncio.sleep(interval)
+        current = await asyncio.to_thread(_stat_files, files)
+        if current != stats:
+            break
+    changed: set[pathlib.Path] = set()
+    while True:
+        changed.update(path for path in files if current[path] != stats[path])
+        stats.update(current)
+        await asyncio.sleep(debounce)
+        current = await asyncio.to_thread(_stat_files, files)
+        if current == stats:
+            return changed
 
 
 class HostDb:
     """Library for managing terraform inventory."""
 
-    def __init__(self, manifest: Manifest) -> None:
-        """Initialize HostDb."""
+    def __init__(
+        self,
+        manifest: Manifest,
+        files: list[pathlib.Path] | None = None,
+        fingerprints: tuple[FileFingerprint, ...] | None = None,
+    ) -> None:
+        """Initialize HostDb.
+
+        The `files` are the manifest file and every file it included, when
+        the manifest was read from disk, and `fingerprints` their state as
+        they were read. The machines of the manifest may be a `MachineTable`,
+        in which case `hosts` is a view backed by the table.
+        """
         self._manifest = manifest
+        self._files = files or []
+        self._fingerprints = fingerprints
+        self._locations: list[SourceLocation] | None = None
 
-        all_hosts = {machine.host: machine for machine in manifest.machines}
-        services = {
-            service: machine.host
-            for machine in manifest.machines
-            for service in machine.services
-        }
-        self._hosts = all_hosts
-
-        self._services = services
-        self._service_groups = {}
-        for service, host in services.items():
-            match = re.match(SERVICE_MATCH, service)
-            if not match:
-                continue
-            func = match.group(1)
-            if func not in self._service_groups:
-                self._service_groups[func] = {}
-            self._service_groups[func][service] = host
+        with stage("index"):
+            all_hosts: Mapping[str, Machine]
+            if isinstance(manifest.machines, MachineTable):
+                all_hosts = manifest.machines.by_host()
+            else:
+                all_hosts = {machine.host: machine for machine in manifest.machines}
+            self._hosts = all_hosts
+            self._service_index = ServiceIndex.for_manifest(manifest)
+
+    @staticmethod
+    def add_hook(hook: Callable[[StageEvent], None]) -> Callable[[], None]:
+        """Call the hook with the measurements of each loading and validation stage.
+
+        Stages include parsing and decoding each file, building the indexes
+        and validating. Returns a function that removes the hook. See
+        `hostdb.profile.Profiler` for a hook that collects a summary and trace.
+        """
+        return add_hook(hook)
 
     @classmethod
-    def from_yaml(cls, config: pathlib.Path) -> "HostDb":
-        """Initialize HostDB from a yaml string."""
-        try:
-            manifest = yaml_decode(
-                config.open(),
-                Manifest,
-            )
-        except FileNotFoundError as err:
-            raise HostDbException(f"Could not read {config}: {err}") from err
-        except yaml.parser.ParserError as err:
-            raise HostDbException(f"Could not parse {config}: {err}") from err
-        except ValueError as err:
-            raise HostDbException(f"Could not parse {config}: {err}") from err
-        return HostDb(manifest)
+    def from_yaml(
+        cls,
+        config: pathlib.Path,
+        cache_dir: pathlib.Path | None = None,
+        parallel: bool = False,
+        compact: bool = False,
+        locations: bool = False,
+    ) -> "HostDb":
+        """Initialize HostDB from a yaml string.
+
+        When a `cache_dir` is specified the decoded manifest is stored there and
+        reused by later calls as long as the file and its includes are unchanged.
+        When `parallel` is set, files pulled in with `!include` are parsed
+        concurrently in a process pool. When `compact` is set the machines are
+        stored in a `MachineTable` to reduce memory use. When `locations` is
+        set the manifest is parsed rather than read from the cache, recording
+        the position of each machine for `locations` in the same pass.
+        """
+        with stage("load", config):
+            return cls._load(config, cache_dir, parallel, compact, locations)
+
+    @classmethod
+    def _load(
+        cls,
+        config: pathlib.Path,
+        cache_dir: pathlib.Path | None,
+        parallel: bool,
+        compact: bool,
+        locations: bool = False,
+    ) -> "HostDb":
+        """Load the manifest, see `from_yaml`."""
+        cache = ManifestCache(cache_dir) if cache_dir is not None else None
+        if cache is not None and not locations:
+            with stage("cache_load", config):
+                entry = cache.load(config)
+            if entry is not None:
+                (manifest, files) = entry
+                if compact:
+                    manifest = compact_manifest(manifest)
+                return HostDb(manifest, [pathlib.Path(fp.path) for fp in files], files)
+        from .yaml_loaders import (  # noqa: PLC0415
+            decode_value,
+            record_marks,
+            record_reads,
+            yaml_decode_file,
+            yaml_load_parallel,
+        )
+
+        with (
+            load_errors(config),
+            record_reads() as reads,
+            record_marks(Machine) if locations else nullcontext([]) as marks,
+        ):
+            if parallel:
+                (data, includes) = yaml_load_parallel(config)
+                with stage("decode", config):
+                    manifest = decode_value(data, Manifest)
+            else:
+                (manifest, includes) = yaml_decode_file(config, Manifest)
+        files = tuple(reads.values())
+        if cache is not None:
+            with stage("cache_store", config):
+                cache.store(config, manifest, files)
+        if compact:
+            manifest = compact_manifest(manifest)
+        db = HostDb(manifest, [config, *includes], files)
+        if len(marks) == len(manifest.machines):
+            db._locations = [SourceLocation(mark.name, mark.line + 1) for mark in marks]
+        return db
+
+    @classmethod
+    async def watch(
+        cls,
+        config: pathlib.Path,
+        interval: float = 0.5,
+        debounce: float = 0.1,
+    ) -> AsyncIterator["HostDbUpdate"]:
+        """Yield a new HostDb each time the manifest or one of its includes changes.
+
+        The files are polled every `interval` seconds and a reload waits until
+        they have not changed for `debounce` seconds, so a burst of writes
+        produces one update. Only the changed files are parsed again, in a
+        worker thread so the event loop is not blocked. The first update has
+        every machine as added. A manifest that fails to load is logged and
+        skipped until the next change, except on the first load where the
+        HostDbException is raised.
+        """
+        import asyncio  # noqa: PLC0415
+
+        from .yaml_loaders import FragmentSet  # noqa: PLC0415
+
+        fragments = FragmentSet(config)
+        changed: set[pathlib.Path] = set()
+        stats = await asyncio.to_thread(_stat_files, [config])
+        previous: HostDb | None = None
+        while True:
+            try:
+                db = await asyncio.to_thread(
+                    cls._load_fragments, config, fragments, changed
+                )
+            except HostDbException as err:
+                if previous is None:
+                    raise
+                _LOGGER.warning("Unable to reload %s: %s", config, err)
+            else:
+                # Keep the stats from before parsing so that writes made while
+                # parsing are picked up by the next poll.
+                added = [path for path in db.files if path not in stats]
+                stats = {path: stats[path] for path in db.files if path in stats}
+                stats.update(await asyncio.to_thread(_stat_files, added))
+                yield HostDbUpdate(
+                    db, diff_machines(previous.hosts if previous else {}, db.hosts)
+                )
+                previous = db
+            changed = await _wait_for_changes(stats, interval, debounce)
+
+    @classmethod
+    def _load_fragments(
+        cls,
+        config: pathlib.Path,
+        fragments: "FragmentSet",
+        changed: set[pathlib.Path],
+    ) -> "HostDb":
+        """Load the manifest re-parsing only the changed files."""
+        from .yaml_loaders import decode_value  # noqa: PLC0415
+
+        with load_errors(config):
+            (data, includes) = fragments.load(changed)
+            with stage("decode", config):
+                manifest = decode_value(data, Manifest)
+        return HostDb(manifest, [config, *includes])
 
     @property
     def manifest(self) -> list[Manifest]:
         return self._manifest
 
     @property
-    def hosts(self) -> dict[str, Machine]:
+    def files(self) -> list[pathlib.Path]:
+        """The files the manifest was read from, including any includes."""
+        return self._files
+
+    @property
+    def locations(self) -> list[SourceLocation]:
+        """The source file and line of each machine of the manifest.
+
+        These are recorded while parsing when the HostDb is loaded with
+        `from_yaml(locations=True)`, otherwise the manifest file is streamed
+        again to find them when first used.
+        """
+        if self._locations is None:
+            self._locations = machine_locations(self._files[0]) if self._files else []
+        return self._locations
+
+    @property
+    def fingerprints(self) -> tuple[FileFingerprint, ...]:
+        """The state of the files the manifest was read from.
+
+        These are taken as the files are read by `from_yaml`, so a file edited
+        while it was being parsed is not current. They are taken when first
+        used if the HostDb was created some other way.
+        """
+        if self._fingerprints is None:
+            self._fingerprints = fingerprint(self._files)
+        return self._fingerprints
+
+    @property
+    def hosts(self) -> Mapping[str, Machine]:
         return self._hosts
 
     @property
@@ -67,12 +340,219 @@ class HostDb:
         return self._hosts.keys()
 
     @property
-    def services(self) -> list[str]:
-        return self._services
+    def services(self) -> dict[str, str]:
+        return self._service_index.hosts
 
     @property
     def service_groups(self) -> dict[str, dict[str, str]]:
-        return self._service_groups
+        return self._service_index.groups
+
+    @property
+    def service_index(self) -> ServiceIndex:
+        """The parsed services of the manifest, shared with validation."""
+        return self._service_index
+
+    @functools.cached_property
+    def _ip_index(self) -> dict[str, str]:
+        """Index of hosts by normalized IP address, built on first use.
+
+        The indexes hold host names rather than machines so that they don't
+        keep a `Machine` per host alive when the machines are a `MachineTable`.
+        """
+        return {
+            _normalize_ip(machine.ip): machine.host
+            for machine in self._manifest.machines
+            if machine.ip
+        }
+
+    @functools.cached_property
+    def _mac_index(self) -> dict[str, str]:
+        """Index of hosts by normalized MAC address, built on first use."""
+        return {
+            normalize_mac(machine.mac): machine.host
+            for machine in self._manifest.machines
+            if machine.mac
+        }
+
+    @functools.cached_property
+    def _label_index(self) -> dict[str, list[str]]:
+        """Index of hosts by hardware label, built on first use."""
+        index: dict[str, list[str]] = {}
+        for machine in self._manifest.machines:
+            for label in machine.hardware_labels:
+                index.setdefault(label, []).append(machine.host)
+        return index
+
+    @functools.cached_property
+    def _service_type_index(self) -> dict[str, list[str]]:
+        """Index of hosts by service type, built on first use."""
+        return {
+            func: list(dict.fromkeys(group.values()))
+            for func, group in self.service_groups.items()
+        }
+
+    @functools.cached_property
+    def _sorted_ips(self) -> tuple[list[tuple[int, int]], array.array]:
+        """Rows of the machines sorted by integer IP address for range lookups."""
+        entries = sorted(
+            (key, row)
+            for row, machine in enumerate(self._manifest.machines)
+            if machine.ip and (key := _ip_key(machine.ip)) is not None
+        )
+        return (
+            [key for key, _ in entries],
+            array.array("L", (row for _, row in entries)),
+        )
+
+    def machine_by_ip(self, ip: str) -> Machine | None:
+        """Return the machine with the IP address."""
+        if (host := self._ip_index.get(_normalize_ip(ip))) is None:
+            return None
+        return self._hosts[host]
+
+    def machine_by_mac(self, mac: str) -> Machine | None:
+        """Return the machine with the MAC address, in any common notation."""
+        if (host := self._mac_index.get(normalize_mac(mac))) is None:
+            return None
+        return self._hosts[host]
+
+    def hosts_with_label(self, label: str) -> list[str]:
+        """Return the hosts that have the hardware label."""
+        return list(self._label_index.get(label, ()))
+
+    def hosts_with_service_type(self, service_type: str) -> list[str]:
+        """Return the hosts that run a service of the type, e.g. `kapi`."""
+        return list(self._service_type_index.get(service_type, ()))
+
+    def machines_in_range(self, first: str, last: str) -> list[Machine]:
+        """Return machines with an IP address between `first` and `last` inclusive.
+
+        Machines are returned ordered by IP address.
+        """
+        first_key = _ip_key(first)
+        last_key = _ip_key(last)
+        if first_key is None or last_key is None:
+            raise HostDbException(f"Invalid IP address range {first}-{last}")
+        (keys, rows) = self._sorted_ips
+        start = bisect.bisect_left(keys, first_key)
+        end = bisect.bisect_right(keys, last_key)
+        return [self._manifest.machines[row] for row in rows[start:end]]
+
+    def machines_in_network(self, network: str | IPNetwork) -> list[Machine]:
+        """Return machines with an IP address inside the subnet, e.g. `10.0.0.0/24`.
+
+        Machines are returned ordered by IP address.
+        """
+        try:
+            subnet = ipaddress.ip_network(network, strict=False)
+        except ValueError as err:
+            raise HostDbException(f"Invalid network {network}: {err}") from err
+        return self.machines_in_range(
+            str(subnet.network_address), str(subnet.broadcast_address)
+        )
+
+    def allocate_services(
+        self, service_type: str, count: int = 1, fill_gaps: bool = False
+    ) -> list[str]:
+        """Return `count` new service names of a type defined in the manifest.
+
+        New serials follow the highest in use, or with `fill_gaps` reuse the
+        lowest unused serials, and keep the zero padding of existing services,
+        e.g. `kapi04` after `kapi03`.
+        """
+        if service_type not in self._manifest.service_types:
+            raise HostDbException(
+                "Service type '%s' not defined in service_types: %s"
+                % (service_type, self._manifest.service_types)
+            )
+        try:
+            return self._service_index.next_services(
+                service_type, count, fill_gaps=fill_gaps
+            )
+        except ValueError as err:
+            raise HostDbException(str(err)) from err
+
+    def diff(self, other: "HostDb") -> ManifestDiff:
+        """Return the changes from this HostDb to `other`.
+
+        Machines are matched by host, and services, IP addresses and MAC
+        addresses by value using the indexes of each HostDb, so this takes
+        time linear in the number of machines.
+        """
+        return ManifestDiff(
+            machines=diff_machines(self.hosts, other.hosts),
+            service_moves=diff_assignments(self.services, other.services),
+            ip_reassignments=diff_assignments(self._ip_index, other._ip_index),
+            mac_reassignments=diff_assignments(self._mac_index, other._mac_index),
+        )
+
+    def find_hosts(
+        self,
+        ip: str | None = None,
+        mac: str | None = None,
+        label: str | None = None,
+        service_type: str | None = None,
+        subnet: str | None = None,
+    ) -> list[str]:
+        """Return the hosts matching the first of the specified criteria."""
+        if ip is not None:
+            if (machine := self.machine_by_ip(ip)) is None:
+                raise HostDbException(f"No host with IP address {ip}")
+            return [machine.host]
+        if mac is not None:
+            if (machine := self.machine_by_mac(mac)) is None:
+                raise HostDbException(f"No host with MAC address {mac}")
+            return [machine.host]
+        if label is not None:
+            return self.hosts_with_label(label)
+        if service_type is not None:
+            return self.hosts_with_service_type(service_type)
+        if subnet is not None:
+            return [machine.host for machine in self.machines_in_network(subnet)]
+        raise HostDbException("No query criteria specified")
+
+
+@dataclass(frozen=True)
+class HostDbUpdate:
+    """A new HostDb snapshot and how its machines differ from the previous one."""
+
+    db: HostDb
+    diff: MachineDiff
+
+
+def compact_manifest(manifest: Manifest) -> Manifest:
+    """Return a copy of the manifest with the machines stored in a MachineTable."""
+    if isinstance(manifest.machines, MachineTable):
+        return manifest
+    return replace(
+        manifest,
+        machines=MachineTable(manifest.machines, manifest.hardware_labels),
+    )
+
+
+def iter_machines(config: pathlib.Path) -> Iterator[Machine]:
+    """Yield each machine in a manifest without loading the whole document.
+
+    Machines are decoded one at a time from the `machines` sequence, including
+    a sequence pulled in with an `!include` tag, so that very large manifests
+    can be processed in bounded memory.
+    """
+    from .yaml_loaders import decode_value, yaml_stream_sequence  # noqa: PLC0415
+
+    with load_errors(config):
+        for data, _ in yaml_stream_sequence(config, "machines"):
+            yield decode_value(data, Machine)
+
+
+def machine_locations(config: pathlib.Path) -> list[SourceLocation]:
+    """Return the source file and line of each machine in a manifest."""
+    from .yaml_loaders import yaml_stream_sequence  # noqa: PLC0415
+
+    with load_errors(config):
+        return [
+            SourceLocation(mark.name, mark.line + 1)
+            for _, mark in yaml_stream_sequence(config, "machines")
+        ]
 
 
 def validate(db: HostDb) -> None:
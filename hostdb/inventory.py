@@ -4,34 +4,57 @@ This has some custom helpers for building etcd inventory.
 """
 
 import dataclasses
+import glob
 import logging
 import os
 import pathlib
 
 from ansible.errors import AnsibleParserError
-from ansible.plugins.inventory import BaseInventoryPlugin
+from ansible.plugins.inventory import BaseInventoryPlugin, Cacheable
 
 from . import exceptions, hostdb
+from .cache import FileFingerprint, default_cache_dir, is_current
+from .federation import HostDbSet, manifest_paths, service_alias
+from .manifest import Machine
 
 _LOGGER = logging.getLogger(__name__)
 
+# Bump when the format of the results stored in the inventory cache changes
+_CACHE_VERSION = 4
+
+_MACHINE_FIELDS = [field.name for field in dataclasses.fields(Machine)]
+
 
 DOCUMENTATION = r"""
   name: hostdb
   plugin_type: inventory
   short_description: Generates ansible inventory from hostdb state
+  extends_documentation_fragment:
+    - inventory_cache
   options:
     plugin:
       description: Name of the plugin
       required: true
       choices: ['hostdb']
     manifest:
-      description: Manifest file that contains the hostdb state
+      description:
+        - Manifest file that contains the hostdb state, or a directory or glob
+          pattern with a manifest file for each site.
+        - Multiple manifests are loaded in parallel and IP addresses, MAC
+          addresses and service aliases must be unique across every site.
       required: true
+    manifest_cache:
+      description:
+        - Cache decoded manifests in the hostdb cache directory, which is
+          C(HOSTDB_CACHE_DIR) or C(~/.cache/hostdb), so unchanged manifests
+          are not parsed again.
+        - Set to false to parse every manifest on each run.
+      type: bool
+      default: true
 """
 
 
-class InventoryModule(BaseInventoryPlugin):
+class InventoryModule(BaseInventoryPlugin, Cacheable):
     """Inventory module for host db."""
 
     NAME = "hostdb"
@@ -58,31 +81,144 @@ class InventoryModule(BaseInventoryPlugin):
                 f"Unable to read 'manifest' option from inventory: {e!s}"
             ) from e
 
+        self.load_cache_plugin()
+        cache_key = self.get_cache_key(path)
+        user_cache_setting = self.get_option("cache")
+        attempt_to_read_cache = user_cache_setting and cache
+        cache_needs_update = user_cache_setting and not cache
+
+        results = None
+        self._cached_sites: dict[str, dict] = {}
+        if attempt_to_read_cache:
+            results = self._cache.get(cache_key)
+            if results is not None and results.get("version") != _CACHE_VERSION:
+                results = None
+            if results is not None:
+                self._cached_sites = {
+                    site["manifest"]: site
+                    for site in results["sites"]
+                    if _site_is_current(site)
+                }
+                if list(self._cached_sites) != self._manifest_paths():
+                    self.display.vvv("hostdb manifest changed since it was cached")
+                    results = None
+            if results is None:
+                cache_needs_update = True
+        if results is None:
+            results = self._build_inventory()
+        if cache_needs_update:
+            self._cache[cache_key] = results
+
+        self._populate(results)
+
+    def _build_inventory(self) -> dict:
+        """Load the manifests and compute the groups and host variables.
+
+        The result is serializable so that it can be stored with a cache plugin
+        along with the fingerprint of the files each site was built from. Sites
+        that are unchanged since they were cached are read from the manifest
+        cache and their groups and host variables are reused, so only changed
+        manifests are parsed. Every site is still validated since a change in
+        one site can conflict with another.
+        """
+        paths = self._manifest_paths()
         try:
-            db = hostdb.HostDb.from_yaml(pathlib.Path(self._manifest))
+            if not paths:
+                raise exceptions.HostDbException("No manifests found")
+            dbs = HostDbSet.from_paths(
+                map(pathlib.Path, paths),
+                cache_dir=default_cache_dir()
+                if self.get_option("manifest_cache")
+                else None,
+            )
         except exceptions.HostDbException as e:
             raise AnsibleParserError(
                 f"Unable to read hostdb manifest {self._manifest}: {e!s}"
             ) from e
 
         try:
-            hostdb.validate(db)
+            if len(dbs) == 1:
+                hostdb.validate(next(iter(dbs.values())))
+            else:
+                dbs.validate()
         except exceptions.HostDbException as e:
             raise AnsibleParserError(
                 f"Invalid hostdb manifest {self._manifest}: {e!s}"
             ) from e
 
-        env = db.manifest.env
-        for group, group_config in db.service_groups.items():
-            self.inventory.add_group(group)
-            for srv_host, host in group_config.items():
-                if env:
-                    full_host = "%s.%s" % (srv_host, env)
-                else:
-                    full_host = srv_host
-                self.inventory.add_host(host=full_host, group=group)
-                self.inventory.set_variable(full_host, "manifest_host", host)
-
+        sites = []
+        for path, db in zip(paths, dbs.values(), strict=True):
+            if (site := self._cached_sites.get(path)) is None:
+                site = _site_inventory(db)
+                site["manifest"] = path
+                site["files"] = [dataclasses.asdict(fp) for fp in db.fingerprints]
+            sites.append(site)
+        return {"version": _CACHE_VERSION, "sites": sites}
+
+    def _manifest_paths(self) -> list[str]:
+        """Return the manifest files named by the manifest option, sorted by path.
+
+        Sites are added to the inventory in this order so the result does not
+        depend on the order the manifests finish loading.
+        """
+        path = pathlib.Path(self._manifest)
+        if path.is_dir():
+            return [str(manifest) for manifest in manifest_paths(path)]
+        if any(char in self._manifest for char in "*?["):
+            return sorted(
+                match
+                for match in glob.glob(self._manifest, recursive=True)
+                if os.path.isfile(match)
+            )
+        return [str(path)]
+
+    def _populate(self, results: dict) -> None:
+        """Add the groups and hosts to the inventory.
+
+        Every service alias of a machine has the same host variables, which
+        are computed once per machine. Each alias gets its own copy of the
+        lists so they are not shared with other aliases.
+        """
+        for site in results["sites"]:
+            hostvars = site["hostvars"]
+            for group, members in site["groups"].items():
+                self.inventory.add_group(group)
+                for host, full_hosts in members.items():
+                    for full_host in full_hosts:
+                        self.inventory.add_host(full_host, group=group)
+                        for name, value in _copy_vars(hostvars[host]).items():
+                            self.inventory.set_variable(full_host, name, value)
+
+
+def _copy_vars(host_vars: dict) -> dict:
+    """Return a copy of host variables that does not share their lists."""
+    return {
+        name: list(value) if isinstance(value, list) else value
+        for name, value in host_vars.items()
+    }
+
+
+def _site_is_current(site: dict) -> bool:
+    """Return True if the files of a cached site are unchanged."""
+    return is_current(FileFingerprint(**fp) for fp in site["files"])
+
+
+def _site_inventory(db: hostdb.HostDb) -> dict:
+    """Return the groups and host variables of the machines of one site.
+
+    Host variables are keyed by manifest host, which is only unique within a
+    site.
+    """
+    groups: dict[str, dict[str, list[str]]] = {}
+    hostvars: dict[str, dict] = {}
+    for group, group_config in db.service_groups.items():
+        members = groups.setdefault(group, {})
+        for srv_host, host in group_config.items():
+            members.setdefault(host, []).append(service_alias(srv_host, db.manifest))
+            if host not in hostvars:
                 machine = db.hosts[host]
-                for k, v in dataclasses.asdict(machine).items():
-                    self.inventory.set_variable(full_host, k, v)
+                host_vars = {"manifest_host": host}
+                for name in _MACHINE_FIELDS:
+                    host_vars[name] = getattr(machine, name)
+                hostvars[host] = _copy_vars(host_vars)
+    return {"groups": groups, "hostvars": hostvars}
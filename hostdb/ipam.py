@@ -0,0 +1,204 @@
+"""Allocation of free IP addresses in the networks of a manifest.
+
+The free addresses of a subnet are kept as sorted, disjoint intervals built
+from the machines already in the subnet, so a large subnet such as a /16 is
+never enumerated address by address.
+"""
+
+import bisect
+import ipaddress
+from collections.abc import Iterable
+
+from .exceptions import HostDbException
+from .hostdb import HostDb, IPNetwork
+from .manifest import Network
+
+
+def _parse_network(subnet: str) -> IPNetwork:
+    """Return the network for a subnet, e.g. `10.0.0.0/24`."""
+    try:
+        return ipaddress.ip_network(subnet, strict=False)
+    except ValueError as err:
+        raise HostDbException(f"Invalid network {subnet}: {err}") from err
+
+
+class SubnetPool:
+    """The free addresses of a subnet.
+
+    Addresses are allocated lowest first from the first free interval, an
+    address is reserved with a binary search of the intervals, and finding a
+    contiguous block is linear in the number of intervals rather than
+    addresses.
+
+    Intervals are shrunk in place where possible. Those used up at the front
+    are skipped rather than deleted, and dropped together once they are half
+    of the list, so allocating many addresses one by one does not shift the
+    remaining intervals each time. Only reserving an address in the middle of
+    an interval or taking a whole block from the middle inserts or deletes
+    one.
+    """
+
+    def __init__(self, network: IPNetwork, used: Iterable[int] = ()) -> None:
+        """Initialize SubnetPool with the integer addresses that are not free.
+
+        Used addresses outside the network are ignored.
+        """
+        self._network = network
+        first = int(network.network_address)
+        last = int(network.broadcast_address)
+        self._starts: list[int] = []
+        self._ends: list[int] = []
+        # Intervals before this index are used up
+        self._head = 0
+        start = first
+        for address in sorted(set(used)):
+            if address < first or address > last:
+                continue
+            if address > start:
+                self._starts.append(start)
+                self._ends.append(address - 1)
+            start = address + 1
+        if start <= last:
+            self._starts.append(start)
+            self._ends.append(last)
+        self._free = sum(
+            end - start + 1 for start, end in zip(self._starts, self._ends, strict=True)
+        )
+
+    @property
+    def network(self) -> IPNetwork:
+        """The subnet of the pool."""
+        return self._network
+
+    @property
+    def free(self) -> int:
+        """The number of free addresses."""
+        return self._free
+
+    def reserve(self, address: int) -> None:
+        """Mark an address as no longer free."""
+        index = bisect.bisect_right(self._starts, address, lo=self._head) - 1
+        if index < self._head or address > self._ends[index]:
+            return
+        (start, end) = (self._starts[index], self._ends[index])
+        self._free -= 1
+        if start == end:
+            self._remove(index)
+        elif address == start:
+            self._starts[index] = address + 1
+        elif address == end:
+            self._ends[index] = address - 1
+        else:
+            self._ends[index] = address - 1
+            self._starts.insert(index + 1, address + 1)
+            self._ends.insert(index + 1, end)
+
+    def _remove(self, index: int) -> None:
+        """Remove a used up interval."""
+        if index != self._head:
+            del self._starts[index]
+            del self._ends[index]
+            return
+        self._head += 1
+        if self._head * 2 >= len(self._starts):
+            del self._starts[: self._head]
+            del self._ends[: self._head]
+            self._head = 0
+
+    def _take(self, index: int, count: int) -> list[str]:
+        """Take `count` addresses from the start of the interval."""
+        start = self._starts[index]
+        self._free -= count
+        if start + count > self._ends[index]:
+            self._remove(index)
+        else:
+            self._starts[index] = start + count
+        address_type = type(self._network.network_address)
+        return [str(address_type(address)) for address in range(start, start + count)]
+
+    def allocate(self, count: int, contiguous: bool = False) -> list[str]:
+        """Allocate the `count` lowest free addresses, or the lowest block of them.
+
+        Raises a HostDbException if the count is not positive or there are not
+        enough free addresses.
+        """
+        if count < 1:
+            raise HostDbException(f"Number of addresses must be at least 1: {count}")
+        if contiguous:
+            for index in range(self._head, len(self._starts)):
+                if self._ends[index] - self._starts[index] + 1 >= count:
+                    return self._take(index, count)
+            raise HostDbException(
+                f"Unable to allocate {count} contiguous addresses in {self._network}"
+            )
+        if self._free < count:
+            raise HostDbException(
+                f"Unable to allocate {count} addresses in {self._network}: "
+                f"only {self._free} addresses are free"
+            )
+        result: list[str] = []
+        while len(result) < count:
+            index = self._head
+            size = min(count - len(result), self._ends[index] - self._starts[index] + 1)
+            result.extend(self._take(index, size))
+        return result
+
+
+def _reserved(network: IPNetwork, config: Network | None) -> list[int]:
+    """Return the addresses of the network that are never allocated to machines.
+
+    These are the network address (also the IPv6 subnet router anycast
+    address), the IPv4 broadcast address, and the gateway and nameservers of
+    the network in the manifest. IPv4 point to point networks have no network
+    or broadcast address.
+    """
+    reserved = []
+    if network.version == 6:
+        reserved.append(int(network.network_address))
+    elif network.prefixlen < 31:
+        reserved.extend((int(network.network_address), int(network.broadcast_address)))
+    if config is not None:
+        for value in (config.gateway, *config.nameserver):
+            try:
+                reserved.append(int(ipaddress.ip_address(value)))
+            except ValueError:
+                continue
+    return reserved
+
+
+def subnet_pool(db: HostDb, subnet: str | None = None) -> SubnetPool:
+    """Return the free addresses of a subnet of the manifest.
+
+    The `subnet` may be omitted when the manifest has a single network. A
+    subnet that is not one of the manifest networks can also be used, without
+    a gateway or nameservers to reserve.
+    """
+    networks = {
+        _parse_network(network.subnet): network for network in db.manifest.network
+    }
+    if subnet is None:
+        if len(networks) != 1:
+            raise HostDbException(
+                "A subnet is required when the manifest does not have exactly one "
+                f"network: {[network.subnet for network in db.manifest.network]}"
+            )
+        (network,) = networks
+    else:
+        network = _parse_network(subnet)
+    used = [
+        int(ipaddress.ip_address(machine.ip))
+        for machine in db.machines_in_network(network)
+        if machine.ip
+    ]
+    used.extend(_reserved(network, networks.get(network)))
+    return SubnetPool(network, used)
+
+
+def allocate_ips(
+    db: HostDb, count: int, subnet: str | None = None, contiguous: bool = False
+) -> list[str]:
+    """Allocate `count` free addresses in a subnet of the manifest.
+
+    See `subnet_pool` for the choice of subnet and `SubnetPool.allocate`.
+    """
+    return subnet_pool(db, subnet).allocate(count, contiguous=contiguous)
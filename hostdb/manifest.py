@@ -1,15 +1,25 @@
 """Manifest definitions for the hostdb package.
 
-This file contains all of the dataclass definitions for the hostdb package.
+This file contains all of the dataclass definitions for the hostdb package,
+along with the index of the services of a manifest.
 """
 
+import bisect
+import re
+import weakref
+from collections.abc import Iterable
 from dataclasses import dataclass, field
 
 # "sto01" becomes ("sto", "01")
 SERVICE_MATCH = r"([a-z|_|-]+)(\d+)"
 
+SERVICE_PATTERN = re.compile(SERVICE_MATCH)
 
-@dataclass
+# Serial digits of new services of a type that has none yet, e.g. "sto01"
+DEFAULT_SERIAL_WIDTH = 2
+
+
+@dataclass(slots=True)
 class Network:
     """Network configuration."""
 
@@ -18,7 +28,7 @@ class Network:
     nameserver: list[str] = field(default_factory=list)
 
 
-@dataclass
+@dataclass(slots=True)
 class Machine:
     """Machine configuration."""
 
@@ -30,7 +40,7 @@ class Machine:
     hardware_labels: list[str] | None = field(default_factory=list)
 
 
-@dataclass
+@dataclass(slots=True)
 class Site:
     """Site configuration."""
 
@@ -39,7 +49,7 @@ class Site:
     env: str | None = None
 
 
-@dataclass
+@dataclass(slots=True, weakref_slot=True)
 class Manifest:
     """Manifest configuration."""
 
@@ -48,3 +58,189 @@ class Manifest:
     hardware_labels: list[str] = field(default_factory=list)
     machines: list[Machine] = field(default_factory=list)
     network: list[Network] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class MachineEdits:
+    """A batch of changes to the machines of a manifest."""
+
+    add: list[Machine] = field(default_factory=list)
+    """Machines appended to the manifest."""
+
+    remove: list[str] = field(default_factory=list)
+    """Hosts of the machines removed from the manifest."""
+
+    update: list[Machine] = field(default_factory=list)
+    """Machines replacing the machine with the same host, in place."""
+
+
+@dataclass(frozen=True, slots=True)
+class ServiceName:
+    """A service name split into its type and serial number."""
+
+    service_type: str
+    serial: int
+    width: int
+    """Number of digits of the serial, including zero padding."""
+
+
+def parse_service(service: str) -> ServiceName | None:
+    """Return the parts of a service name, or None if it has no serial number."""
+    if (match := SERVICE_PATTERN.match(service)) is None:
+        return None
+    digits = match.group(2)
+    return ServiceName(match.group(1), int(digits), len(digits))
+
+
+class ServiceIndex:
+    """The services of a set of machines, each service name parsed once.
+
+    Use `for_manifest` to share one index between everything that looks at
+    the services of a manifest. Serial numbers are indexed per service type on
+    first use, so the next free serial is found with a binary search.
+    """
+
+    def __init__(
+        self, machines: Iterable[Machine], previous: "ServiceIndex | None" = None
+    ) -> None:
+        """Initialize ServiceIndex.
+
+        A service on more than one machine belongs to the last of them. Names
+        already parsed by a `previous` index are reused.
+        """
+        self.hosts: dict[str, str] = _service_hosts(machines)
+        """Host of each service."""
+
+        parsed = previous.names if previous is not None else {}
+        self.names: dict[str, ServiceName | None] = {
+            service: parsed[service] if service in parsed else parse_service(service)
+            for service in self.hosts
+        }
+        """Parts of each service name, or None if it has no serial number."""
+
+        self.groups: dict[str, dict[str, str]] = {}
+        """Services and their host for each service type."""
+
+        for service, host in self.hosts.items():
+            if (name := self.names[service]) is not None:
+                self.groups.setdefault(name.service_type, {})[service] = host
+        self._serials: dict[str, list[int]] = {}
+
+    @classmethod
+    def for_manifest(cls, manifest: Manifest) -> "ServiceIndex":
+        """Return the index of the services of the manifest, shared by its users.
+
+        The index is cached per manifest and checked against the services of
+        its machines on each call, so it is rebuilt if the machines were
+        modified since, parsing only the service names that are new.
+        """
+        key = id(manifest)
+        cached = None
+        if (entry := _MANIFEST_SERVICES.get(key)) is not None and entry[
+            0
+        ]() is manifest:
+            cached = entry[1]
+            if cached.hosts == _service_hosts(manifest.machines):
+                return cached
+        index = cls(manifest.machines, previous=cached)
+        ref = weakref.ref(manifest, lambda _: _MANIFEST_SERVICES.pop(key, None))
+        _MANIFEST_SERVICES[key] = (ref, index)
+        return index
+
+    def parse(self, service: str) -> ServiceName | None:
+        """Return the parts of a service name, parsing it only if not indexed."""
+        if service in self.names:
+            return self.names[service]
+        return parse_service(service)
+
+    def serials(self, service_type: str) -> list[int]:
+        """Return the sorted serial numbers used by a service type."""
+        if (serials := self._serials.get(service_type)) is None:
+            serials = sorted(
+                {
+                    name.serial
+                    for service in self.groups.get(service_type, {})
+                    if (name := self.names[service]) is not None
+                }
+            )
+            self._serials[service_type] = serials
+        return serials
+
+    def next_serials(
+        self, service_type: str, count: int = 1, fill_gaps: bool = False, start: int = 1
+    ) -> list[int]:
+        """Return the next `count` unused serial numbers of a service type.
+
+        By default serials follow the highest one in use, or begin at `start`.
+        With `fill_gaps` the lowest unused serials from `start` are returned,
+        found with a binary search for the first gap.
+        """
+        if count < 1:
+            raise ValueError(f"Number of services must be at least 1: {count}")
+        serials = self.serials(service_type)
+        if not fill_gaps:
+            first = max(serials[-1] + 1, start) if serials else start
+            return list(range(first, first + count))
+        offset = bisect.bisect_left(serials, start)
+        # serials[i] == start + i - offset holds for a prefix of the used
+        # serials, so the first gap is found by bisecting on that condition.
+        low = offset
+        high = len(serials)
+        while low < high:
+            mid = (low + high) // 2
+            if serials[mid] == start + mid - offset:
+                low = mid + 1
+            else:
+                high = mid
+        result: list[int] = []
+        candidate = start + low - offset
+        index = low
+        while len(result) < count:
+            if index < len(serials) and serials[index] == candidate:
+                index += 1
+            else:
+                result.append(candidate)
+            candidate += 1
+        return result
+
+    def serial_width(self, service_type: str) -> int:
+        """Return the number of digits used for serials of the service type.
+
+        This is the widest zero padded serial in use, or `DEFAULT_SERIAL_WIDTH`.
+        """
+        return max(
+            (
+                name.width
+                for service in self.groups.get(service_type, {})
+                if (name := self.names[service]) is not None
+            ),
+            default=DEFAULT_SERIAL_WIDTH,
+        )
+
+    def next_services(
+        self, service_type: str, count: int = 1, fill_gaps: bool = False
+    ) -> list[str]:
+        """Return the names of the next `count` unused services of the type.
+
+        Serials are chosen as in `next_serials` and zero padded to the width
+        of the existing services of the type.
+        """
+        if not SERVICE_PATTERN.fullmatch(f"{service_type}0"):
+            raise ValueError(f"Invalid service type '{service_type}'")
+        width = self.serial_width(service_type)
+        return [
+            f"{service_type}{serial:0{width}d}"
+            for serial in self.next_serials(service_type, count, fill_gaps=fill_gaps)
+        ]
+
+
+def _service_hosts(machines: Iterable[Machine]) -> dict[str, str]:
+    """Return the host of each service of the machines."""
+    return {
+        service: machine.host for machine in machines for service in machine.services
+    }
+
+
+# Manifests are not hashable, so indexes are keyed by id and removed when the
+# manifest is garbage collected
+_MANIFEST_SERVICES: dict[int, tuple[weakref.ref[Manifest], ServiceIndex]] = {}
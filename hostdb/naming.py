@@ -1,16 +1,24 @@
 """Functions for generating hostnames."""
 
+import abc
+import bisect
+import functools
+import os
+import pathlib
 import random
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+from collections.abc import Set as AbstractSet
 from importlib.resources import files
 
+from .exceptions import HostDbException
+
 PACKAGE = "hostdb.resources"
 WORDLIST = "wordlist"
 
 
-def _build_hostname_set() -> dict[str, str]:
-    """Return the hostname set from the wordlist."""
-    words: dict[str, str] = {}
-    text = files(PACKAGE).joinpath(WORDLIST).read_text(encoding="utf-8")
+def _parse_words(text: str) -> tuple[str, ...]:
+    """Return the unique words from the contents of a wordlist file."""
+    words: dict[str, None] = {}
     for line in text.split("\n"):
         if line.startswith("#"):
             continue
@@ -18,19 +26,232 @@ def _build_hostname_set() -> dict[str, str]:
             w = w.strip()
             if not w:
                 continue
-            words[w] = ""
-    return words
+            words[w] = None
+    return tuple(words)
+
+
+@functools.cache
+def _wordlist() -> tuple[str, ...]:
+    """Return the words from the wordlist, parsed once per process."""
+    return _parse_words(files(PACKAGE).joinpath(WORDLIST).read_text(encoding="utf-8"))
+
+
+class NameSpace(Sequence[str], abc.ABC):
+    """A space of candidate names addressed by an integer index.
+
+    Names are computed from their index on demand so that large generated
+    spaces do not need to be materialized.
+    """
+
+    @abc.abstractmethod
+    def __getitem__(self, index):  # type: ignore[override]
+        """Return the name at the index."""
+
+    @abc.abstractmethod
+    def __len__(self) -> int:
+        """Return the number of names in the space."""
+
+
+class WordList(NameSpace):
+    """A name space of the words in a wordlist."""
+
+    def __init__(self, words: Sequence[str]) -> None:
+        """Initialize WordList."""
+        self._words = words
+
+    @classmethod
+    def default(cls) -> "WordList":
+        """Return the wordlist bundled with hostdb."""
+        return cls(_wordlist())
+
+    @classmethod
+    def from_file(cls, path: pathlib.Path) -> "WordList":
+        """Return a wordlist read from a file in the same format as the default."""
+        try:
+            text = path.read_text(encoding="utf-8")
+        except OSError as err:
+            raise HostDbException(f"Could not read wordlist {path}: {err}") from err
+        return cls(_parse_words(text))
+
+    def __getitem__(self, index):  # type: ignore[override]
+        return self._words[index]
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+
+class Combination(NameSpace):
+    """A name space of every pair of names from two spaces e.g. `brave-falcon`."""
+
+    def __init__(
+        self, first: NameSpace, second: NameSpace, separator: str = "-"
+    ) -> None:
+        """Initialize Combination."""
+        self._first = first
+        self._second = second
+        self._separator = separator
+
+    def __getitem__(self, index):  # type: ignore[override]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        (i, j) = divmod(index, len(self._second))
+        return f"{self._first[i]}{self._separator}{self._second[j]}"
+
+    def __len__(self) -> int:
+        return len(self._first) * len(self._second)
+
+
+class Chain(NameSpace):
+    """A name space made of several spaces one after the other."""
+
+    def __init__(self, spaces: Sequence[NameSpace]) -> None:
+        """Initialize Chain."""
+        self._spaces = spaces
+        self._offsets = []
+        total = 0
+        for space in spaces:
+            self._offsets.append(total)
+            total += len(space)
+        self._len = total
+
+    def __getitem__(self, index):  # type: ignore[override]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        pos = bisect.bisect_right(self._offsets, index) - 1
+        return self._spaces[pos][index - self._offsets[pos]]
+
+    def __len__(self) -> int:
+        return self._len
+
+
+def _shuffled_indexes(size: int, rand: random.Random) -> Iterator[int]:
+    """Yield every index of a space of the size once, in a random order.
+
+    This is a Fisher-Yates shuffle that only records the positions that were
+    swapped, so taking a few indexes of a large space is cheap.
+    """
+    swapped: dict[int, int] = {}
+    for last in range(size - 1, -1, -1):
+        pick = rand.randrange(last + 1)
+        yield swapped.get(pick, pick)
+        moved = swapped.pop(last, last)
+        if pick != last:
+            swapped[pick] = moved
+
+
+def _sample_names(
+    space: Sequence[str],
+    allocated: Iterable[str],
+    count: int,
+    rand: random.Random,
+) -> list[str]:
+    """Return up to `count` random names from the space that are not allocated.
+
+    Names are picked from distinct random positions in the space, skipping any
+    that are taken, so the cost is proportional to `count` while most of the
+    space is free and names are never materialized for the rest of the space.
+    Raises a HostDbException if the count is not positive.
+    """
+    if count < 1:
+        raise HostDbException(f"Number of names must be at least 1: {count}")
+    if not isinstance(allocated, (AbstractSet, Mapping)):
+        allocated = set(allocated)
+
+    result: list[str] = []
+    chosen: set[str] = set()
+    for index in _shuffled_indexes(len(space), rand):
+        word = space[index]
+        if word in allocated or word in chosen:
+            continue
+        chosen.add(word)
+        result.append(word)
+        if len(result) == count:
+            break
+    return result
 
 
 def allocate_hostnames(
-    allocated: list[str], count: int, rand=random.Random()
+    allocated: Iterable[str], count: int, rand: random.Random = random.Random()
 ) -> list[str]:
-    """Produce the specified number of new hostnames that are not already allocated."""
-    # Attempts to preserve order to facilitate testing with fixed random
-    hostname_set = _build_hostname_set()
-    for host in allocated:
-        if host in hostname_set:
-            del hostname_set[host]
-    hostname_pool = list(hostname_set.keys())
-    random.shuffle(hostname_pool)
-    return hostname_pool[0:count]
+    """Produce the specified number of new hostnames that are not already allocated.
+
+    Fewer names are returned if the wordlist is exhausted.
+    """
+    return _sample_names(_wordlist(), allocated, count, rand)
+
+
+def allocate_names(
+    space: NameSpace,
+    allocated: Iterable[str],
+    count: int,
+    rand: random.Random = random.Random(),
+) -> list[str]:
+    """Allocate `count` names from the space in one pass.
+
+    Raises a HostDbException if the space does not have enough free names.
+    """
+    result = _sample_names(space, allocated, count, rand)
+    if len(result) < count:
+        raise HostDbException(
+            f"Unable to allocate {count} names: only {len(result)} names are free"
+        )
+    return result
+
+
+class ReservationLedger:
+    """A file recording every name handed out by previous allocations.
+
+    The ledger is locked for the duration of an allocation so that concurrent
+    runs never hand out the same name.
+    """
+
+    def __init__(self, path: pathlib.Path) -> None:
+        """Initialize ReservationLedger."""
+        self._path = path
+
+    def reserved(self) -> set[str]:
+        """Return the names reserved so far."""
+        try:
+            text = self._path.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return set()
+        return set(text.split())
+
+    def allocate(
+        self,
+        space: NameSpace,
+        allocated: Iterable[str],
+        count: int,
+        rand: random.Random = random.Random(),
+    ) -> list[str]:
+        """Allocate and reserve `count` names that are neither allocated nor reserved."""
+        try:
+            # File locking is only available on Unix, where ledgers are supported
+            import fcntl  # noqa: PLC0415
+        except ImportError as err:
+            raise HostDbException(
+                "Reservation ledgers are not supported on this platform"
+            ) from err
+        try:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            with self._path.open("a+", encoding="utf-8") as ledger:
+                fcntl.flock(ledger, fcntl.LOCK_EX)
+                try:
+                    ledger.seek(0)
+                    taken = set(ledger.read().split())
+                    taken.update(allocated)
+                    names = allocate_names(space, taken, count, rand)
+                    ledger.write("".join(f"{name}\n" for name in names))
+                    ledger.flush()
+                    os.fsync(ledger.fileno())
+                finally:
+                    fcntl.flock(ledger, fcntl.LOCK_UN)
+        except OSError as err:
+            raise HostDbException(
+                f"Could not update reservation ledger {self._path}: {err}"
+            ) from err
+        return names
@@ -0,0 +1,191 @@
+"""Instrumentation of the stages of loading and validating a manifest.
+
+Stages such as parsing each file, decoding, building indexes and validation
+are wrapped with `stage()`. When no hooks are registered this does nothing
+beyond the check, otherwise each hook is called with a `StageEvent` when the
+stage finishes. `Profiler` is a hook that collects the events into a summary
+table and a Chrome trace (viewable in chrome://tracing or Perfetto).
+
+Hooks are registered per process. The parallel loader records the stages of
+its worker processes with `collect_events()` and sends them back to the
+parent, which passes them to its hooks with `dispatch()`.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections.abc import Callable, Generator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any
+
+_HOOKS: list[Callable[["StageEvent"], None]] = []
+
+# ru_maxrss is in kilobytes on Linux and bytes on macOS
+_RSS_SCALE = 1 if sys.platform == "darwin" else 1024
+
+
+@dataclass(frozen=True)
+class StageEvent:
+    """Measurements of one run of a stage."""
+
+    name: str
+    file: str | None
+    start: float
+    """Start time from `time.perf_counter()`, in seconds."""
+
+    duration: float
+    """Wall time in seconds."""
+
+    allocated_blocks: int
+    """Net change in the number of memory blocks allocated by the interpreter."""
+
+    peak_rss: int
+    """Peak resident set size of the process in bytes when the stage finished.
+
+    This is 0 where the platform does not report it.
+    """
+
+    thread_id: int
+
+    process_id: int
+
+
+def add_hook(hook: Callable[[StageEvent], None]) -> Callable[[], None]:
+    """Call the hook at the end of every stage, returning a function to remove it."""
+    _HOOKS.append(hook)
+
+    def remove() -> None:
+        if hook in _HOOKS:
+            _HOOKS.remove(hook)
+
+    return remove
+
+
+def enabled() -> bool:
+    """Return True if any hooks are registered in this process."""
+    return bool(_HOOKS)
+
+
+def dispatch(event: StageEvent) -> None:
+    """Call the hooks with an event, e.g. one recorded in a worker process."""
+    for hook in _HOOKS.copy():
+        hook(event)
+
+
+@contextmanager
+def collect_events() -> Generator[list[StageEvent]]:
+    """Collect the stages run inside the context instead of calling the hooks.
+
+    This is meant for a worker process, whose events are passed back to the
+    parent to `dispatch`.
+    """
+    events: list[StageEvent] = []
+    saved = _HOOKS.copy()
+    _HOOKS[:] = [events.append]
+    try:
+        yield events
+    finally:
+        _HOOKS[:] = saved
+
+
+def _peak_rss() -> int:
+    """Return the peak resident set size of the process in bytes.
+
+    This is 0 on platforms without the Unix `resource` module.
+    """
+    try:
+        import resource  # noqa: PLC0415
+    except ImportError:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _RSS_SCALE
+
+
+@contextmanager
+def stage(name: str, file: str | os.PathLike | None = None) -> Generator[None]:
+    """Measure the enclosed code as a stage, optionally for a specific file."""
+    if not _HOOKS:
+        yield
+        return
+    blocks = sys.getallocatedblocks()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        event = StageEvent(
+            name=name,
+            file=os.fspath(file) if file is not None else None,
+            start=start,
+            duration=time.perf_counter() - start,
+            allocated_blocks=sys.getallocatedblocks() - blocks,
+            peak_rss=_peak_rss(),
+            thread_id=threading.get_ident(),
+            process_id=os.getpid(),
+        )
+        dispatch(event)
+
+
+class Profiler:
+    """Collects stage events into a summary and a Chrome trace."""
+
+    def __init__(self) -> None:
+        """Initialize Profiler."""
+        self.events: list[StageEvent] = []
+        self._start = time.perf_counter()
+
+    def __call__(self, event: StageEvent) -> None:
+        self.events.append(event)
+
+    @contextmanager
+    def activate(self) -> Generator["Profiler"]:
+        """Record the stages that run inside the context."""
+        remove = add_hook(self)
+        try:
+            yield self
+        finally:
+            remove()
+
+    def summary(self) -> str:
+        """Return a table of the total time and memory of each stage and file."""
+        totals: dict[tuple[str, str], list[float]] = {}
+        for event in self.events:
+            total = totals.setdefault((event.name, event.file or ""), [0, 0.0, 0, 0])
+            total[0] += 1
+            total[1] += event.duration
+            total[2] += event.allocated_blocks
+            total[3] = max(total[3], event.peak_rss)
+        header = (
+            f"{'stage':<16} {'calls':>5} {'total ms':>10} {'blocks':>10} "
+            f"{'peak RSS MiB':>12}  file"
+        )
+        lines = [header]
+        for (name, file), (calls, duration, blocks, rss) in totals.items():
+            lines.append(
+                f"{name:<16} {calls:>5} {duration * 1000:>10.2f} {blocks:>10} "
+                f"{rss / 2**20:>12.1f}  {file}".rstrip()
+            )
+        return "\n".join(lines)
+
+    def chrome_trace(self) -> dict[str, Any]:
+        """Return the events in the Chrome trace event format."""
+        return {
+            "displayTimeUnit": "ms",
+            "traceEvents": [
+                {
+                    "name": event.name,
+                    "cat": "hostdb",
+                    "ph": "X",
+                    "ts": (event.start - self._start) * 1e6,
+                    "dur": event.duration * 1e6,
+                    "pid": event.process_id,
+                    "tid": event.thread_id,
+                    "args": {
+                        "file": event.file,
+                        "allocated_blocks": event.allocated_blocks,
+                        "peak_rss": event.peak_rss,
+                    },
+                }
+                for event in self.events
+            ],
+        }
@@ -0,0 +1,231 @@
+"""A compact columnar representation of the machines in a manifest.
+
+A `Machine` object with its lists costs several hundred bytes per host before
+counting its strings. `MachineTable` stores the same information as parallel
+columns so that large manifests can be kept resident in long running
+processes, and returns equivalent `Machine` objects on access.
+"""
+
+import array
+import dataclasses
+import sys
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+
+from .manifest import Machine
+
+# Marks a missing address in the integer address columns
+_NONE = 2**64 - 1
+
+
+def _encode_ipv4(ip: str) -> int | None:
+    """Return the integer form of an IPv4 address, or None if it won't round trip."""
+    parts = ip.split(".")
+    if len(parts) != 4 or not all(part.isdigit() for part in parts):
+        return None
+    value = 0
+    for part in parts:
+        octet = int(part)
+        if octet > 255 or str(octet) != part:
+            return None
+        value = value << 8 | octet
+    return value
+
+
+def _decode_ipv4(value: int) -> str:
+    """Return the dotted form of an integer IPv4 address."""
+    return f"{value >> 24}.{value >> 16 & 255}.{value >> 8 & 255}.{value & 255}"
+
+
+def _encode_mac(mac: str) -> int | None:
+    """Return the integer form of a MAC address, or None if it won't round trip."""
+    if len(mac) != 17:
+        return None
+    try:
+        value = int(mac.replace(":", ""), 16)
+    except ValueError:
+        return None
+    if _decode_mac(value) != mac:
+        return None
+    return value
+
+
+def _decode_mac(value: int) -> str:
+    """Return the lower case colon separated form of an integer MAC address."""
+    return ":".join(f"{value >> shift & 255:02x}" for shift in range(40, -8, -8))
+
+
+def _copy(machine: Machine) -> Machine:
+    """Return a copy of the machine that does not share its lists."""
+    return dataclasses.replace(
+        machine,
+        services=None if machine.services is None else list(machine.services),
+        hardware_labels=(
+            None if machine.hardware_labels is None else list(machine.hardware_labels)
+        ),
+    )
+
+
+def _intern(value: str | None) -> str | None:
+    """Return the interned string, so repeated values share one object."""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class MachineTable(Sequence[Machine]):
+    """Machines stored as parallel columns instead of one object per machine.
+
+    Descriptions, which are often repeated, are interned, services are tuples,
+    IPv4 and MAC addresses are packed into integer arrays, and hardware labels
+    are a bitset over the label names. A machine that can't be stored exactly
+    this way, such as one with an IPv6 address, is kept as given. Indexing
+    returns a `Machine` equal to the one that was added, so the table can be
+    used as the `machines` of a `Manifest`.
+
+    The table is read only: every access returns a new `Machine`, so changes
+    to it are not stored in the table.
+    """
+
+    def __init__(
+        self, machines: Iterable[Machine], hardware_labels: Sequence[str] = ()
+    ) -> None:
+        """Initialize MachineTable.
+
+        The `hardware_labels` give the order of the label bits, and labels of
+        a machine are stored compactly when they follow this order.
+        """
+        self._hosts: list[str] = []
+        self._descs: list[str | None] = []
+        self._ips = array.array("Q")
+        self._macs = array.array("Q")
+        self._services: list[tuple[str, ...] | None] = []
+        self._label_names: list[str] = []
+        self._label_bits: dict[str, int] = {}
+        self._labels: list[int] = []
+        self._other: dict[int, Machine] = {}
+        for label in hardware_labels:
+            self._label_bit(label)
+        for machine in machines:
+            self._add(machine)
+
+    def _label_bit(self, label: str) -> int:
+        """Return the bit position of the label, assigning one if it is new."""
+        if (bit := self._label_bits.get(label)) is None:
+            bit = len(self._label_names)
+            self._label_names.append(sys.intern(label))
+            self._label_bits[label] = bit
+        return bit
+
+    def _encode_labels(self, labels: list[str]) -> int | None:
+        """Return the label bitset, or None if it would not keep the label order."""
+        bits = 0
+        last = -1
+        for label in labels:
+            bit = self._label_bit(label)
+            if bit <= last:
+                return None
+            bits |= 1 << bit
+            last = bit
+        return bits
+
+    def _add(self, machine: Machine) -> None:
+        """Append a machine to the columns."""
+        row = len(self._hosts)
+        ip = _NONE if machine.ip is None else _encode_ipv4(machine.ip)
+        mac = _NONE if machine.mac is None else _encode_mac(machine.mac)
+        labels = (
+            -1
+            if machine.hardware_labels is None
+            else self._encode_labels(machine.hardware_labels)
+        )
+        self._hosts.append(machine.host)
+        if ip is None or mac is None or labels is None:
+            self._other[row] = _copy(machine)
+            (desc, services, ip, mac, labels) = (None, None, _NONE, _NONE, -1)
+        else:
+            desc = _intern(machine.desc)
+            services = None if machine.services is None else tuple(machine.services)
+        self._descs.append(desc)
+        self._services.append(services)
+        self._ips.append(ip)
+        self._macs.append(mac)
+        self._labels.append(labels)
+
+    def _machine(self, row: int) -> Machine:
+        """Return a Machine for the row."""
+        if (machine := self._other.get(row)) is not None:
+            return _copy(machine)
+        services = self._services[row]
+        labels = self._labels[row]
+        ip = self._ips[row]
+        mac = self._macs[row]
+        return Machine(
+            host=self._hosts[row],
+            desc=self._descs[row],
+            ip=None if ip == _NONE else _decode_ipv4(ip),
+            mac=None if mac == _NONE else _decode_mac(mac),
+            services=None if services is None else list(services),
+            hardware_labels=(
+                None
+                if labels < 0
+                else [
+                    name
+                    for bit, name in enumerate(self._label_names)
+                    if labels >> bit & 1
+                ]
+            ),
+        )
+
+    def __getitem__(self, index):  # type: ignore[override]
+        if isinstance(index, slice):
+            return [self._machine(row) for row in range(len(self))[index]]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self._machine(index)
+
+    def __len__(self) -> int:
+        return len(self._hosts)
+
+    def __iter__(self) -> Iterator[Machine]:
+        return (self._machine(row) for row in range(len(self)))
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, (MachineTable, list)):
+            return NotImplemented
+        return len(self) == len(other) and all(
+            a == b for a, b in zip(self, other, strict=True)
+        )
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def by_host(self) -> "MachinesByHost":
+        """Return a mapping of host to machine backed by the table."""
+        return MachinesByHost(self)
+
+
+class MachinesByHost(Mapping[str, Machine]):
+    """A read only mapping of host to machine for the rows of a MachineTable.
+
+    Like a dict built from the machines, a repeated host maps to the last
+    machine with that host.
+    """
+
+    def __init__(self, table: MachineTable) -> None:
+        """Initialize MachinesByHost."""
+        self._table = table
+        self._rows = {host: row for row, host in enumerate(table._hosts)}
+
+    def __getitem__(self, host: str) -> Machine:
+        return self._table._machine(self._rows[host])
+
+    def __contains__(self, host: object) -> bool:
+        return host in self._rows
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._rows)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def keys(self):  # type: ignore[override]
+        return self._rows.keys()
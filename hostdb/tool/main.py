@@ -10,14 +10,37 @@ import sys
 import traceback
 from argparse import (
     ArgumentParser,
+    Namespace,
 )
 from argparse import (
     _SubParsersAction as SubParsersAction,
 )
 from typing import Any
 
-from hostdb import hostdb, naming
-from hostdb.exceptions import HostDbException
+# Modules that are slow to import, such as the YAML parser and asyncio, are
+# imported by the commands that need them to keep start up fast.
+from hostdb import client
+from hostdb.cache import default_cache_dir
+from hostdb.exceptions import (
+    HostDbConfigError,
+    HostDbDaemonUnavailable,
+    HostDbException,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _from_daemon(
+    socket_path: pathlib.Path | None, path: str, method: str, **params: Any
+) -> Any | None:
+    """Return the result of a request to the daemon if it serves the manifest."""
+    if socket_path is None:
+        return None
+    try:
+        return client.request(socket_path, pathlib.Path(path), method, **params)
+    except HostDbDaemonUnavailable as err:
+        _LOGGER.debug("Reading manifest directly: %s", err)
+        return None
 
 
 class AllocateAction:
@@ -42,21 +65,168 @@ class AllocateAction:
             required=True,
             help="Hostdb inventory configuration file",
         )
+        allocate_cmd.add_argument(
+            "--wordlist",
+            type=pathlib.Path,
+            action="append",
+            help="Wordlist file to pick names from instead of the default (repeatable)",
+        )
+        allocate_cmd.add_argument(
+            "--combine",
+            action="store_true",
+            help="Generate two word names from the wordlists e.g. brave-falcon",
+        )
+        allocate_cmd.add_argument(
+            "--ledger",
+            type=pathlib.Path,
+            help="File of reserved names shared by concurrent allocations",
+        )
         allocate_cmd.set_defaults(cls=AllocateAction)
 
     def run(
         self,
         num: int,
         path: str,
+        cache_dir: pathlib.Path | None,
+        parallel: bool,
+        wordlist: list[pathlib.Path] | None,
+        combine: bool,
+        ledger: pathlib.Path | None,
+        socket: pathlib.Path | None,
         **kwargs: Any,  # pylint: disable=unused-argument
     ) -> None:
         """Run the allocate command."""
-        db = hostdb.HostDb.from_yaml(pathlib.Path(path))
-        new_hosts = naming.allocate_hostnames(db.hostnames, num)
+        from hostdb import hostdb, naming  # noqa: PLC0415
+
+        if (hostnames := _from_daemon(socket, path, "hostnames")) is None:
+            db = hostdb.HostDb.from_yaml(
+                pathlib.Path(path), cache_dir=cache_dir, parallel=parallel
+            )
+            hostnames = db.hostnames
+        if wordlist:
+            space: naming.NameSpace = naming.Chain(
+                [naming.WordList.from_file(p) for p in wordlist]
+            )
+        else:
+            space = naming.WordList.default()
+        if combine:
+            space = naming.Combination(space, space)
+        if ledger is not None:
+            new_hosts = naming.ReservationLedger(ledger).allocate(space, hostnames, num)
+        else:
+            new_hosts = naming.allocate_names(space, hostnames, num)
         for host in new_hosts:
             print(host)
 
 
+class AllocateIpAction:
+    """Allocate IP addresses."""
+
+    @classmethod
+    def register(
+        cls,
+        subparsers: SubParsersAction,  # type: ignore[type-arg]
+    ) -> ArgumentParser:
+        allocate_cmd = subparsers.add_parser(
+            "allocate-ip",
+            help="Allocate IP addresses",
+            description="Allocate unused IP addresses in a network of the manifest",
+        )
+        allocate_cmd.add_argument(
+            "--num", type=int, default=1, help="Number of addresses to allocate"
+        )
+        allocate_cmd.add_argument(
+            "--path",
+            type=str,
+            required=True,
+            help="Hostdb inventory configuration file",
+        )
+        allocate_cmd.add_argument(
+            "--subnet",
+            help="Subnet to allocate from, required unless the manifest has one network",
+        )
+        allocate_cmd.add_argument(
+            "--contiguous",
+            action="store_true",
+            help="Allocate a block of consecutive addresses",
+        )
+        allocate_cmd.set_defaults(cls=AllocateIpAction)
+
+    def run(
+        self,
+        num: int,
+        path: str,
+        cache_dir: pathlib.Path | None,
+        parallel: bool,
+        subnet: str | None,
+        contiguous: bool,
+        **kwargs: Any,
+    ) -> None:
+        """Run the allocate-ip command."""
+        from hostdb import hostdb, ipam  # noqa: PLC0415
+
+        db = hostdb.HostDb.from_yaml(
+            pathlib.Path(path), cache_dir=cache_dir, parallel=parallel
+        )
+        for address in ipam.allocate_ips(db, num, subnet=subnet, contiguous=contiguous):
+            print(address)
+
+
+class AllocateServiceAction:
+    """Allocate service names."""
+
+    @classmethod
+    def register(
+        cls,
+        subparsers: SubParsersAction,  # type: ignore[type-arg]
+    ) -> ArgumentParser:
+        allocate_cmd = subparsers.add_parser(
+            "allocate-service",
+            help="Allocate service names",
+            description=(
+                "Allocate the next unused service names of a type e.g. kapi04, "
+                "keeping the zero padding of the existing services"
+            ),
+        )
+        allocate_cmd.add_argument(
+            "service_type", help="Service type from service_types e.g. kapi"
+        )
+        allocate_cmd.add_argument(
+            "--num", type=int, default=1, help="Number of service names to allocate"
+        )
+        allocate_cmd.add_argument(
+            "--path",
+            type=str,
+            required=True,
+            help="Hostdb inventory configuration file",
+        )
+        allocate_cmd.add_argument(
+            "--fill-gaps",
+            action="store_true",
+            help="Reuse the lowest unused serials instead of following the highest",
+        )
+        allocate_cmd.set_defaults(cls=AllocateServiceAction)
+
+    def run(
+        self,
+        service_type: str,
+        num: int,
+        path: str,
+        cache_dir: pathlib.Path | None,
+        parallel: bool,
+        fill_gaps: bool,
+        **kwargs: Any,
+    ) -> None:
+        """Run the allocate-service command."""
+        from hostdb import hostdb  # noqa: PLC0415
+
+        db = hostdb.HostDb.from_yaml(
+            pathlib.Path(path), cache_dir=cache_dir, parallel=parallel
+        )
+        for service in db.allocate_services(service_type, num, fill_gaps=fill_gaps):
+            print(service)
+
+
 class ValidateAction:
     """Validate a hostdb."""
 
@@ -76,13 +246,537 @@ class ValidateAction:
             required=True,
             help="Hostdb inventory configuration file",
         )
+        validate_cmd.add_argument(
+            "--all",
+            dest="all_issues",
+            action="store_true",
+            help="Report every problem with its location instead of only the first",
+        )
+        validate_cmd.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Only recheck machines changed since the last successful run",
+        )
         validate_cmd.set_defaults(cls=ValidateAction)
 
-    def run(self, path: str, **kwargs: Any) -> None:
+    def run(
+        self,
+        path: str,
+        cache_dir: pathlib.Path | None,
+        parallel: bool,
+        all_issues: bool,
+        incremental: bool,
+        socket: pathlib.Path | None,
+        **kwargs: Any,
+    ) -> None:
         """Run the validate command."""
-        db = hostdb.HostDb.from_yaml(pathlib.Path(path))
+        from hostdb import hostdb  # noqa: PLC0415
+        from hostdb.cache import ManifestCache  # noqa: PLC0415
+        from hostdb.validation import check_incremental, check_manifest  # noqa: PLC0415
+
+        if incremental and cache_dir is None:
+            raise HostDbException(
+                "--incremental persists its state in the cache and cannot be "
+                "used with --no-cache"
+            )
+        if (
+            not all_issues
+            and (result := _from_daemon(socket, path, "validate")) is not None
+        ):
+            if not result["valid"]:
+                raise HostDbConfigError(result["issues"][0])
+            print("Success")
+            return
+        config = pathlib.Path(path)
+        db = hostdb.HostDb.from_yaml(
+            config, cache_dir=cache_dir, parallel=parallel, locations=all_issues
+        )
+        if incremental and cache_dir is not None:
+            cache = ManifestCache(cache_dir)
+            (report, state) = check_incremental(
+                db.manifest, cache.load_validation_state(config)
+            )
+            if state is not None:
+                cache.store_validation_state(config, state)
+        elif all_issues:
+            report = check_manifest(db.manifest, locations=db.locations)
+        else:
+            report = check_manifest(db.manifest, fail_fast=True)
+        if report.valid:
+            print("Success")
+            return
+        if not all_issues:
+            raise HostDbConfigError(report.issues[0].message)
+        if incremental:
+            report = check_manifest(db.manifest, locations=db.locations)
+        for issue in report.issues:
+            print(issue)
+        raise HostDbConfigError(f"Found {len(report.issues)} validation issues")
+
+
+class QueryAction:
+    """Query the machines in a hostdb."""
+
+    @classmethod
+    def register(
+        cls,
+        subparsers: SubParsersAction,  # type: ignore[type-arg]
+    ) -> ArgumentParser:
+        query_cmd = subparsers.add_parser(
+            "query",
+            help="Find hosts in the hostdb",
+            description="Print the hosts matching an IP, MAC, label, service type or subnet",
+        )
+        query_cmd.add_argument(
+            "--path",
+            type=str,
+            required=True,
+            help="Hostdb inventory configuration file",
+        )
+        group = query_cmd.add_mutually_exclusive_group(required=True)
+        group.add_argument("--ip", help="Find the host with the IP address")
+        group.add_argument("--mac", help="Find the host with the MAC address")
+        group.add_argument("--label", help="Find hosts with the hardware label")
+        group.add_argument(
+            "--service-type", help="Find hosts running the service type e.g. kapi"
+        )
+        group.add_argument(
+            "--subnet", help="Find hosts with an IP in the subnet e.g. 10.0.0.0/24"
+        )
+        query_cmd.set_defaults(cls=QueryAction)
+
+    def run(
+        self,
+        path: str,
+        cache_dir: pathlib.Path | None,
+        parallel: bool,
+        ip: str | None,
+        mac: str | None,
+        label: str | None,
+        service_type: str | None,
+        subnet: str | None,
+        socket: pathlib.Path | None,
+        **kwargs: Any,
+    ) -> None:
+        """Run the query command."""
+        from hostdb import hostdb  # noqa: PLC0415
+
+        params = {
+            "ip": ip,
+            "mac": mac,
+            "label": label,
+            "service_type": service_type,
+            "subnet": subnet,
+        }
+        if (hosts := _from_daemon(socket, path, "query", **params)) is None:
+            db = hostdb.HostDb.from_yaml(
+                pathlib.Path(path), cache_dir=cache_dir, parallel=parallel
+            )
+            hosts = db.find_hosts(**params)
+        for host in hosts:
+            print(host)
+
+
+class ExportAction:
+    """Export a hostdb to DNS, DHCP and hosts files."""
+
+    @classmethod
+    def register(
+        cls,
+        subparsers: SubParsersAction,  # type: ignore[type-arg]
+    ) -> ArgumentParser:
+        export_cmd = subparsers.add_parser(
+            "export",
+            help="Export DNS records, DHCP reservations and hosts files",
+            description=(
+                "Write the machines in the manifest in each requested format, "
+                "only replacing files whose contents changed"
+            ),
+        )
+        export_cmd.add_argument(
+            "--path",
+            type=str,
+            required=True,
+            help="Hostdb inventory configuration file",
+        )
+        export_cmd.add_argument(
+            "--domain", help="Domain of the exported names instead of the site domain"
+        )
+        export_cmd.add_argument(
+            "--bind",
+            type=pathlib.Path,
+            help="BIND zone file of A records and service CNAMEs to $INCLUDE",
+        )
+        export_cmd.add_argument(
+            "--dnsmasq", type=pathlib.Path, help="dnsmasq dhcp-host reservations"
+        )
+        export_cmd.add_argument(
+            "--dhcpd", type=pathlib.Path, help="ISC DHCP host reservations"
+        )
+        export_cmd.add_argument(
+            "--hosts", type=pathlib.Path, help="File in the /etc/hosts format"
+        )
+        export_cmd.set_defaults(cls=ExportAction)
+
+    def run(
+        self,
+        path: str,
+        cache_dir: pathlib.Path | None,
+        parallel: bool,
+        domain: str | None,
+        bind: pathlib.Path | None,
+        dnsmasq: pathlib.Path | None,
+        dhcpd: pathlib.Path | None,
+        hosts: pathlib.Path | None,
+        **kwargs: Any,
+    ) -> None:
+        """Run the export command."""
+        from hostdb import export, hostdb  # noqa: PLC0415
+
+        outputs = {
+            "bind": bind,
+            "dnsmasq": dnsmasq,
+            "dhcpd": dhcpd,
+            "hosts": hosts,
+        }
+        if not any(outputs.values()):
+            raise HostDbException(
+                "No outputs specified, use --bind, --dnsmasq, --dhcpd or --hosts"
+            )
+        db = hostdb.HostDb.from_yaml(
+            pathlib.Path(path), cache_dir=cache_dir, parallel=parallel
+        )
+        # Never hand an invalid manifest, such as one with a duplicate IP
+        # address, to the DNS and DHCP servers
         hostdb.validate(db)
-        print("Success")
+        for file_format, output in outputs.items():
+            if output is None:
+                continue
+            changed = export.export(db, file_format, output, domain=domain)
+            print(f"{output}: {'updated' if changed else 'unchanged'}")
+
+
+class FmtAction:
+    """Format a hostdb manifest."""
+
+    @classmethod
+    def register(
+        cls,
+        subparsers: SubParsersAction,  # type: ignore[type-arg]
+    ) -> ArgumentParser:
+        fmt_cmd = subparsers.add_parser(
+            "fmt",
+            help="Format a manifest and apply machine edits",
+            description=(
+                "Rewrite a manifest and the files it includes in a canonical "
+                "layout, optionally adding, removing or updating machines, and "
+                "print the files that changed"
+            ),
+        )
+        fmt_cmd.add_argument(
+            "--path",
+            type=pathlib.Path,
+            required=True,
+            help="Hostdb inventory configuration file",
+        )
+        fmt_cmd.add_argument(
+            "--edits",
+            type=pathlib.Path,
+            help="YAML file with lists of machines to add and update and hosts to remove",
+        )
+        fmt_cmd.add_argument(
+            "--check",
+            action="store_true",
+            help="Print the files that would change and fail instead of writing them",
+        )
+        fmt_cmd.set_defaults(cls=FmtAction)
+
+    def run(
+        self,
+        path: pathlib.Path,
+        edits: pathlib.Path | None,
+        check: bool,
+        **kwargs: Any,
+    ) -> None:
+        """Run the fmt command."""
+        from hostdb.hostdb import load_errors  # noqa: PLC0415
+        from hostdb.manifest import MachineEdits  # noqa: PLC0415
+        from hostdb.writer import ManifestWriter  # noqa: PLC0415
+        from hostdb.yaml_loaders import yaml_decode_file  # noqa: PLC0415
+
+        writer = ManifestWriter(path)
+        machine_edits: MachineEdits | None = None
+        if edits is not None:
+            with load_errors(edits):
+                (machine_edits, _) = yaml_decode_file(edits, MachineEdits)
+        if not check:
+            if machine_edits is None:
+                changed = writer.write(writer.manifest)
+            else:
+                changed = writer.apply(machine_edits)
+            for file in changed:
+                print(file)
+            return
+        manifest = writer.manifest
+        if machine_edits is not None:
+            manifest = writer.edited(machine_edits)
+        unformatted = [
+            file
+            for file, text in writer.render(manifest).items()
+            if file.read_text() != text
+        ]
+        for file in unformatted:
+            print(file)
+        if unformatted:
+            raise HostDbException(f"{len(unformatted)} files would be rewritten")
+
+
+class DiffAction:
+    """Compare two hostdb manifests."""
+
+    @classmethod
+    def register(
+        cls,
+        subparsers: SubParsersAction,  # type: ignore[type-arg]
+    ) -> ArgumentParser:
+        diff_cmd = subparsers.add_parser(
+            "diff",
+            help="Compare two manifests",
+            description=(
+                "Print the machines added, removed or changed between two "
+                "manifests and the services, IPs and MACs that moved between hosts"
+            ),
+        )
+        diff_cmd.add_argument("old", type=pathlib.Path, help="Old manifest file")
+        diff_cmd.add_argument("new", type=pathlib.Path, help="New manifest file")
+        diff_cmd.add_argument(
+            "--json",
+            dest="as_json",
+            action="store_true",
+            help="Print the differences as JSON",
+        )
+        diff_cmd.set_defaults(cls=DiffAction)
+
+    def run(
+        self,
+        old: pathlib.Path,
+        new: pathlib.Path,
+        as_json: bool,
+        cache_dir: pathlib.Path | None,
+        parallel: bool,
+        **kwargs: Any,
+    ) -> None:
+        """Run the diff command."""
+        import json  # noqa: PLC0415
+
+        from hostdb import hostdb  # noqa: PLC0415
+        from hostdb.diff import changed_fields  # noqa: PLC0415
+
+        old_db = hostdb.HostDb.from_yaml(old, cache_dir=cache_dir, parallel=parallel)
+        new_db = hostdb.HostDb.from_yaml(new, cache_dir=cache_dir, parallel=parallel)
+        diff = old_db.diff(new_db)
+        if as_json:
+            print(json.dumps(diff.as_dict(), indent=2))
+            return
+        for machine in diff.machines.added:
+            print(f"+ {machine.host}")
+        for machine in diff.machines.removed:
+            print(f"- {machine.host}")
+        for previous, machine in diff.machines.changed:
+            changes = ", ".join(
+                f"{name} {getattr(previous, name)} -> {getattr(machine, name)}"
+                for name in changed_fields(previous, machine)
+            )
+            print(f"~ {machine.host}: {changes}")
+        for label, moves in (
+            ("service", diff.service_moves),
+            ("ip", diff.ip_reassignments),
+            ("mac", diff.mac_reassignments),
+        ):
+            for move in moves:
+                print(f"{label} {move.value}: {move.old_host} -> {move.new_host}")
+
+
+class ServeAction:
+    """Serve a hostdb over a Unix socket."""
+
+    @classmethod
+    def register(
+        cls,
+        subparsers: SubParsersAction,  # type: ignore[type-arg]
+    ) -> ArgumentParser:
+        serve_cmd = subparsers.add_parser(
+            "serve",
+            help="Serve hostdb lookups from a long running daemon",
+            description=(
+                "Keep the manifest loaded and answer lookups over a Unix socket, "
+                "reloading when the manifest or its includes change"
+            ),
+        )
+        serve_cmd.add_argument(
+            "--path",
+            type=str,
+            required=True,
+            help="Hostdb inventory configuration file",
+        )
+        serve_cmd.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Seconds between checks for changes to the manifest",
+        )
+        serve_cmd.set_defaults(cls=ServeAction)
+
+    def run(
+        self,
+        path: str,
+        cache_dir: pathlib.Path | None,
+        socket: pathlib.Path | None,
+        interval: float,
+        **kwargs: Any,
+    ) -> None:
+        """Run the serve command."""
+        import asyncio  # noqa: PLC0415
+
+        from hostdb import daemon  # noqa: PLC0415
+
+        if socket is None:
+            raise HostDbException(
+                f"A socket path is required with --socket or ${client.SOCKET_ENV}"
+            )
+        server = daemon.ManifestServer(
+            pathlib.Path(path), cache_dir=cache_dir, interval=interval
+        )
+        try:
+            asyncio.run(server.serve(socket))
+        except KeyboardInterrupt:
+            pass
+
+
+class BenchAction:
+    """Benchmark hostdb on a synthetic manifest."""
+
+    @classmethod
+    def register(
+        cls,
+        subparsers: SubParsersAction,  # type: ignore[type-arg]
+    ) -> ArgumentParser:
+        bench_cmd = subparsers.add_parser(
+            "bench",
+            help="Benchmark hostdb",
+            description=(
+                "Generate a synthetic manifest and report the latency, throughput "
+                "and peak memory of loading, validating, building the inventory "
+                "and allocating names"
+            ),
+        )
+        bench_cmd.add_argument(
+            "--path",
+            type=str,
+            help="Benchmark an existing manifest instead of a synthetic one",
+        )
+        bench_cmd.add_argument(
+            "--machines", type=int, default=1000, help="Number of machines"
+        )
+        bench_cmd.add_argument(
+            "--services", type=int, default=1, help="Number of services per machine"
+        )
+        bench_cmd.add_argument(
+            "--labels", type=int, default=4, help="Number of hardware labels"
+        )
+        bench_cmd.add_argument(
+            "--networks", type=int, default=4, help="Number of networks"
+        )
+        bench_cmd.add_argument(
+            "--includes",
+            type=int,
+            default=0,
+            help="Number of machines read from their own file with !include",
+        )
+        bench_cmd.add_argument(
+            "--seed", type=int, default=0, help="Seed for the generated manifest"
+        )
+        bench_cmd.add_argument(
+            "--stage",
+            dest="stages",
+            action="append",
+            help="Stage to run (repeatable), one of: load, load_cached, validate, "
+            "inventory, allocate. Defaults to all stages that can run",
+        )
+        bench_cmd.add_argument(
+            "--repeat", type=int, default=5, help="Number of runs of each stage"
+        )
+        bench_cmd.add_argument(
+            "--output", type=pathlib.Path, help="Write the results as JSON to a file"
+        )
+        bench_cmd.set_defaults(cls=BenchAction)
+
+    def run(
+        self,
+        path: str | None,
+        machines: int,
+        services: int,
+        labels: int,
+        networks: int,
+        includes: int,
+        seed: int,
+        stages: list[str] | None,
+        repeat: int,
+        output: pathlib.Path | None,
+        **kwargs: Any,
+    ) -> None:
+        """Run the bench command."""
+        import json  # noqa: PLC0415
+        import tempfile  # noqa: PLC0415
+
+        from hostdb import bench  # noqa: PLC0415
+
+        with tempfile.TemporaryDirectory() as tmp:
+            synthetic = None
+            if path is not None:
+                config = pathlib.Path(path)
+            else:
+                synthetic = bench.SyntheticConfig(
+                    machines=machines,
+                    services=services,
+                    hardware_labels=labels,
+                    networks=networks,
+                    includes=includes,
+                    seed=seed,
+                )
+                config = bench.generate_manifest(pathlib.Path(tmp), synthetic)
+            results = bench.run_benchmarks(config, stages=stages, repeat=repeat)
+        report = bench.results_json(results, synthetic)
+        print(
+            f"{'stage':<12} {'p50 ms':>10} {'p95 ms':>10} {'items/s':>12} {'peak MiB':>9}"
+        )
+        for name, stage in report["stages"].items():
+            latency = stage["latency_ms"]
+            print(
+                f"{name:<12} {latency['p50']:>10.2f} {latency['p95']:>10.2f} "
+                f"{stage['throughput_per_s'] or 0:>12.0f} "
+                f"{stage['peak_memory_bytes'] / 2**20:>9.1f}"
+            )
+        if output is not None:
+            output.write_text(json.dumps(report, indent=2) + "\n")
+
+
+def _run_profiled(action: Any, args: Namespace) -> None:
+    """Run the action printing a profile of its stages to stderr."""
+    import json  # noqa: PLC0415
+
+    from hostdb.profile import Profiler, stage  # noqa: PLC0415
+
+    # Profile loading the manifest rather than a request to the daemon
+    args.socket = None
+    profiler = Profiler()
+    try:
+        with profiler.activate(), stage(f"hostdb {args.command}"):
+            action.run(**vars(args))
+    finally:
+        print(profiler.summary(), file=sys.stderr)
+        if args.profile_trace is not None:
+            args.profile_trace.write_text(json.dumps(profiler.chrome_trace()))
 
 
 # Define command line arguments
@@ -92,9 +786,51 @@ def _make_parser() -> ArgumentParser:
     parser.add_argument(
         "--log-level", choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
     )
+    parser.add_argument(
+        "--cache-dir",
+        type=pathlib.Path,
+        default=default_cache_dir(),
+        help="Directory used to cache decoded manifests",
+    )
+    parser.add_argument(
+        "--no-cache",
+        dest="cache_dir",
+        action="store_const",
+        const=None,
+        help="Always parse the manifest instead of using the cache",
+    )
+    parser.add_argument(
+        "--parallel",
+        action="store_true",
+        help="Parse files pulled in with !include concurrently",
+    )
+    parser.add_argument(
+        "--socket",
+        type=pathlib.Path,
+        default=client.default_socket_path(),
+        help=f"Unix socket of the hostdb daemon (default ${client.SOCKET_ENV})",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print the time and memory used by each stage of loading the manifest",
+    )
+    parser.add_argument(
+        "--profile-trace",
+        type=pathlib.Path,
+        help="Write the profile to a Chrome trace file, implies --profile",
+    )
     subparsers = parser.add_subparsers(dest="command", help="Command", required=True)
     AllocateAction.register(subparsers)
+    AllocateIpAction.register(subparsers)
+    AllocateServiceAction.register(subparsers)
     ValidateAction.register(subparsers)
+    QueryAction.register(subparsers)
+    ExportAction.register(subparsers)
+    FmtAction.register(subparsers)
+    DiffAction.register(subparsers)
+    ServeAction.register(subparsers)
+    BenchAction.register(subparsers)
 
     return parser
 
@@ -108,7 +844,10 @@ def main():
 
     action = args.cls()
     try:
-        action.run(**vars(args))
+        if args.profile or args.profile_trace:
+            _run_profiled(action, args)
+        else:
+            action.run(**vars(args))
     except HostDbException as err:
         if args.log_level == "DEBUG":
             traceback.print_exc(file=sys.stderr)
@@ -1,68 +1,336 @@
 """Validation of hostdb manifests."""
 
-import re
+import enum
+from collections.abc import Iterator, Sequence
+from dataclasses import dataclass, field
+from itertools import islice
 
 from .exceptions import HostDbConfigError
-from .manifest import SERVICE_MATCH, Manifest
+from .manifest import Machine, Manifest, ServiceIndex
+from .profile import stage
 
+# Bump when the persisted validation state changes shape
+STATE_VERSION = 4
 
-def validate_manifest(manifest: Manifest) -> None:
-    hosts = {}
-    ips = {}
-    macs = {}
-    services = {}
 
-    service_types = set(manifest.service_types)
-    if len(service_types) != len(manifest.service_types):
-        raise HostDbConfigError("Duplicate service types: %s" % manifest.service_types)
+class IssueType(enum.StrEnum):
+    """The kind of problem found in a manifest."""
+
+    DUPLICATE_SERVICE_TYPE = "duplicate_service_type"
+    DUPLICATE_HARDWARE_LABEL = "duplicate_hardware_label"
+    DUPLICATE_HOST = "duplicate_host"
+    DUPLICATE_IP = "duplicate_ip"
+    DUPLICATE_MAC = "duplicate_mac"
+    DUPLICATE_SERVICE = "duplicate_service"
+    UNDEFINED_SERVICE_TYPE = "undefined_service_type"
+    UNDEFINED_HARDWARE_LABEL = "undefined_hardware_label"
+
+
+@dataclass(frozen=True)
+class SourceLocation:
+    """The position of a manifest entry in its source file."""
+
+    file: str
+    line: int
+
+    def __str__(self) -> str:
+        return f"{self.file}:{self.line}"
+
+
+@dataclass(frozen=True)
+class ValidationIssue:
+    """A single problem found in a manifest."""
+
+    issue_type: IssueType
+    message: str
+    host: str | None = None
+    location: SourceLocation | None = None
+
+    def __str__(self) -> str:
+        if self.location:
+            return f"{self.location}: {self.message}"
+        return self.message
+
+
+@dataclass
+class ValidationReport:
+    """The result of validating a manifest."""
+
+    issues: list[ValidationIssue] = field(default_factory=list)
+    checked: int = 0
+    """The number of machines that were checked.
 
-    hardware_labels = set(manifest.hardware_labels)
-    if len(hardware_labels) != len(manifest.hardware_labels):
+    This is every machine for a full check, fewer when `fail_fast` stops at
+    a problem, and only the changed machines for `check_incremental`.
+    """
+
+    @property
+    def valid(self) -> bool:
+        """Return True if no problems were found."""
+        return not self.issues
+
+    def raise_for_issues(self) -> None:
+        """Raise a HostDbConfigError describing the problems, if any."""
+        if not self.issues:
+            return
+        if len(self.issues) == 1:
+            raise HostDbConfigError(self.issues[0].message)
         raise HostDbConfigError(
-            "Duplicate hardware labels: %s" % manifest.hardware_labels
+            "%d validation issues:\n%s"
+            % (len(self.issues), "\n".join(str(issue) for issue in self.issues))
+        )
+
+
+@dataclass
+class _Indexes:
+    """Uniqueness indexes of the machines seen so far."""
+
+    service_types: set[str]
+    hardware_labels: set[str]
+    hosts: dict[str, str] = field(default_factory=dict)
+    ips: dict[str, str] = field(default_factory=dict)
+    macs: dict[str, str] = field(default_factory=dict)
+    services: dict[str, str] = field(default_factory=dict)
+    checked: int = 0
+
+    def copy(self) -> "_Indexes":
+        """Return a copy that can be updated without changing these indexes."""
+        return _Indexes(
+            service_types=self.service_types,
+            hardware_labels=self.hardware_labels,
+            hosts=self.hosts.copy(),
+            ips=self.ips.copy(),
+            macs=self.macs.copy(),
+            services=self.services.copy(),
         )
 
-    for machine in manifest.machines:
+    def add(
+        self,
+        machine: Machine,
+        manifest: Manifest,
+        service_index: ServiceIndex,
+        location: SourceLocation | None,
+    ) -> Iterator[ValidationIssue]:
+        """Add the machine to the indexes, yielding any problems found.
+
+        The `service_index` is the index of the services of the manifest.
+        """
+        self.checked += 1
         if host := machine.host:
-            if host in hosts:
-                raise HostDbConfigError(
+            if host in self.hosts:
+                yield ValidationIssue(
+                    IssueType.DUPLICATE_HOST,
                     "Duplicate host '%s' for '%s' and '%s'"
-                    % (host, hosts[host], machine)
+                    % (host, self.hosts[host], machine),
+                    host,
+                    location,
                 )
-            hosts[host] = machine
+            else:
+                self.hosts[host] = str(machine)
         if ip := machine.ip:
-            if ip in ips:
-                raise HostDbConfigError(
-                    "Duplicate IP for '%s' and '%s': %s" % (ips[ip], machine.host, ip)
+            if ip in self.ips:
+                yield ValidationIssue(
+                    IssueType.DUPLICATE_IP,
+                    "Duplicate IP for '%s' and '%s': %s"
+                    % (self.ips[ip], machine.host, ip),
+                    machine.host,
+                    location,
                 )
-            ips[ip] = machine.host
+            else:
+                self.ips[ip] = machine.host
         if mac := machine.mac:
-            if mac in macs:
-                raise HostDbConfigError(
+            if mac in self.macs:
+                yield ValidationIssue(
+                    IssueType.DUPLICATE_MAC,
                     "Duplicate MAC for '%s' and '%s': %s"
-                    % (macs[mac], machine.host, mac)
+                    % (self.macs[mac], machine.host, mac),
+                    machine.host,
+                    location,
                 )
-            macs[mac] = machine.host
+            else:
+                self.macs[mac] = machine.host
         for service in machine.services:
-            if service in services:
-                raise HostDbConfigError(
+            if service in self.services:
+                yield ValidationIssue(
+                    IssueType.DUPLICATE_SERVICE,
                     "Duplicate service '%s' for '%s' and '%s'"
-                    % (service, services[service], machine.host)
+                    % (service, self.services[service], machine.host),
+                    machine.host,
+                    location,
                 )
-            services[service] = machine.host
+            else:
+                self.services[service] = machine.host
 
-            match = re.match(SERVICE_MATCH, service)
-            if not match:
+            if (name := service_index.parse(service)) is None:
                 continue
-            func = match.group(1)
-            if func not in service_types:
-                raise HostDbConfigError(
+            func = name.service_type
+            if func not in self.service_types:
+                yield ValidationIssue(
+                    IssueType.UNDEFINED_SERVICE_TYPE,
                     "Service type '%s' for '%s' not defined in service_types: %s"
-                    % (func, machine.host, manifest.service_types)
+                    % (func, machine.host, manifest.service_types),
+                    machine.host,
+                    location,
                 )
         for label in machine.hardware_labels:
-            if label not in hardware_labels:
-                raise HostDbConfigError(
+            if label not in self.hardware_labels:
+                yield ValidationIssue(
+                    IssueType.UNDEFINED_HARDWARE_LABEL,
                     "Hardware label '%s' for '%s' not defined in hardware_labels: %s"
-                    % (label, machine.host, manifest.hardware_labels)
+                    % (label, machine.host, manifest.hardware_labels),
+                    machine.host,
+                    location,
                 )
+
+    def remove(self, key: tuple) -> None:
+        """Remove a machine previously added without problems."""
+        (host, _, ip, mac, services, _) = key
+        self.hosts.pop(host, None)
+        if ip and self.ips.get(ip) == host:
+            del self.ips[ip]
+        if mac and self.macs.get(mac) == host:
+            del self.macs[mac]
+        for service in services:
+            if self.services.get(service) == host:
+                del self.services[service]
+
+
+def _machine_key(machine: Machine) -> tuple:
+    """Return a hashable value that changes whenever any machine field changes."""
+    return (
+        machine.host,
+        machine.desc,
+        machine.ip,
+        machine.mac,
+        tuple(machine.services),
+        tuple(machine.hardware_labels),
+    )
+
+
+def _iter_manifest_issues(manifest: Manifest) -> Iterator[ValidationIssue]:
+    """Yield problems with the manifest level definitions."""
+    if len(set(manifest.service_types)) != len(manifest.service_types):
+        yield ValidationIssue(
+            IssueType.DUPLICATE_SERVICE_TYPE,
+            "Duplicate service types: %s" % manifest.service_types,
+        )
+    if len(set(manifest.hardware_labels)) != len(manifest.hardware_labels):
+        yield ValidationIssue(
+            IssueType.DUPLICATE_HARDWARE_LABEL,
+            "Duplicate hardware labels: %s" % manifest.hardware_labels,
+        )
+
+
+def _iter_issues(
+    manifest: Manifest,
+    indexes: _Indexes,
+    locations: Sequence[SourceLocation] | None,
+) -> Iterator[ValidationIssue]:
+    """Yield every problem in the manifest in a single pass over the machines."""
+    yield from _iter_manifest_issues(manifest)
+
+    if locations is not None and len(locations) != len(manifest.machines):
+        locations = None
+
+    service_index = ServiceIndex.for_manifest(manifest)
+    for index, machine in enumerate(manifest.machines):
+        location = locations[index] if locations is not None else None
+        yield from indexes.add(machine, manifest, service_index, location)
+
+
+def _new_indexes(manifest: Manifest) -> _Indexes:
+    """Return empty indexes for validating the manifest."""
+    return _Indexes(
+        service_types=set(manifest.service_types),
+        hardware_labels=set(manifest.hardware_labels),
+    )
+
+
+def check_manifest(
+    manifest: Manifest,
+    fail_fast: bool = False,
+    locations: Sequence[SourceLocation] | None = None,
+) -> ValidationReport:
+    """Validate the manifest and return a report of the problems found.
+
+    By default every problem is collected; with `fail_fast` the check stops at
+    the first one. The optional `locations` give the source position of each
+    entry in `manifest.machines` and are attached to the issues.
+    """
+    with stage("validate"):
+        indexes = _new_indexes(manifest)
+        issues = _iter_issues(manifest, indexes, locations)
+        if fail_fast:
+            return ValidationReport(list(islice(issues, 1)), indexes.checked)
+        return ValidationReport(list(issues), indexes.checked)
+
+
+def validate_manifest(manifest: Manifest) -> None:
+    """Validate the manifest, raising a HostDbConfigError on the first problem."""
+    check_manifest(manifest, fail_fast=True).raise_for_issues()
+
+
+@dataclass
+class ValidationState:
+    """The result of a successful validation, persisted for incremental runs.
+
+    This holds the uniqueness indexes along with the contents of every machine
+    that was checked.
+    """
+
+    version: int
+    definitions: tuple
+    machines: set[tuple]
+    indexes: _Indexes
+
+
+def check_incremental(
+    manifest: Manifest, state: ValidationState | None
+) -> tuple[ValidationReport, ValidationState | None]:
+    """Validate the manifest, only rechecking machines changed since `state`.
+
+    A copy of the indexes of the previous successful run is updated by
+    removing machines that no longer exist with the same contents and checking
+    the new ones against it, so `state` itself is left unchanged and can be
+    reused. A full validation is performed when there is no previous state or
+    the service types or hardware labels changed. Returns the report and the
+    state to persist for the next run, or None if the manifest is not valid.
+
+    Only the index updates scale with the number of changed machines. Finding
+    them still builds and hashes a key for every machine, so each run remains
+    linear in the size of the manifest, though much cheaper than a full check.
+    """
+    with stage("validate"):
+        keys = [_machine_key(machine) for machine in manifest.machines]
+        current = set(keys)
+        definitions = (tuple(manifest.service_types), tuple(manifest.hardware_labels))
+        if (
+            state is None
+            or state.version != STATE_VERSION
+            or state.definitions != definitions
+            or len(current) != len(keys)
+        ):
+            indexes = _new_indexes(manifest)
+            issues = list(_iter_issues(manifest, indexes, None))
+        else:
+            indexes = state.indexes.copy()
+            for key in state.machines - current:
+                indexes.remove(key)
+            issues = []
+            service_index = ServiceIndex.for_manifest(manifest)
+            for key, machine in zip(keys, manifest.machines, strict=True):
+                if key not in state.machines:
+                    issues.extend(indexes.add(machine, manifest, service_index, None))
+        report = ValidationReport(issues=issues, checked=indexes.checked)
+        indexes.checked = 0
+        if not report.valid:
+            return (report, None)
+        return (
+            report,
+            ValidationState(
+                version=STATE_VERSION,
+                definitions=definitions,
+                machines=current,
+                indexes=indexes,
+            ),
+        )
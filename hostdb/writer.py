@@ -0,0 +1,230 @@
+"""Writing a manifest back to the YAML files it was loaded from.
+
+The manifest is serialized with the C emitter in a canonical layout: fields
+in the order of the dataclasses, values left at their default omitted, and
+machines in the order of the manifest. Values loaded with an `!include` tag
+are written back to the included file, so a manifest split across files
+keeps that layout, and only files whose contents changed are replaced.
+Comments and blank lines are not preserved.
+"""
+
+import dataclasses
+import pathlib
+from collections.abc import Iterator
+from typing import Any
+
+from .exceptions import HostDbException
+from .export import write_if_changed
+from .hostdb import load_errors
+from .manifest import Machine, MachineEdits, Manifest
+from .profile import stage
+from .validation import validate_manifest
+from .yaml_loaders import FragmentSet, Include, decode_value, yaml_dump
+
+
+def apply_edits(manifest: Manifest, edits: MachineEdits) -> Manifest:
+    """Return a copy of the manifest with a batch of machine edits applied.
+
+    The machines are rewritten in a single pass: removed and updated machines
+    keep the position of the other machines stable and added machines are
+    appended. A host that is removed or updated but not in the manifest, or
+    added but already in it, raises a HostDbException and nothing is changed.
+    """
+    hosts = {machine.host for machine in manifest.machines}
+    removed = set(edits.remove)
+    updated = {machine.host: machine for machine in edits.update}
+    if missing := sorted((removed | updated.keys()) - hosts):
+        raise HostDbException(f"Hosts not found in manifest: {missing}")
+    if existing := sorted(
+        machine.host
+        for machine in edits.add
+        if machine.host in hosts and machine.host not in removed
+    ):
+        raise HostDbException(f"Hosts already in manifest: {existing}")
+    machines: list[Machine] = [
+        updated.get(machine.host, machine)
+        for machine in manifest.machines
+        if machine.host not in removed
+    ]
+    machines.extend(edits.add)
+    return dataclasses.replace(manifest, machines=machines)
+
+
+def _resolve(value: Any, layout: dict[pathlib.Path, Any]) -> Any:
+    """Return the data of an included file in place of its placeholder."""
+    while isinstance(value, Include):
+        value = layout[value.path]
+    return value
+
+
+def _placeholders(value: Any) -> Iterator[Include]:
+    """Yield the include placeholders in the data of a file."""
+    if isinstance(value, Include):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _placeholders(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _placeholders(item)
+
+
+class _Placement:
+    """Splits a manifest between the files of an include layout."""
+
+    def __init__(self, layout: dict[pathlib.Path, Any]) -> None:
+        """Initialize _Placement with the data of each file of the layout."""
+        self._layout = layout
+        self.files: dict[pathlib.Path, Any] = {}
+        """The data to write to each file."""
+
+    def place(self, value: Any, old: Any) -> Any:
+        """Return the data for a value in place of the previously loaded data.
+
+        A value previously loaded from an included file is written to that
+        file and the include placeholder is kept. Keys of the previous data
+        that are not fields of the dataclass are carried over.
+        """
+        if isinstance(old, Include):
+            data = self.place(value, self._layout[old.path])
+            if self.files.setdefault(old.path, data) != data:
+                raise HostDbException(
+                    f"File '{old.path}' is included more than once with different "
+                    "contents"
+                )
+            return old
+        if dataclasses.is_dataclass(value):
+            previous = old if isinstance(old, dict) else {}
+            data = {}
+            for field in dataclasses.fields(value):
+                item = getattr(value, field.name)
+                if (item is None or item == []) and not isinstance(
+                    previous.get(field.name), Include
+                ):
+                    continue
+                data[field.name] = self.place(item, previous.get(field.name))
+            fields = {field.name for field in dataclasses.fields(value)}
+            data.update(
+                (key, item) for key, item in previous.items() if key not in fields
+            )
+            return data
+        if isinstance(value, list):
+            return self._place_list(value, old if isinstance(old, list) else [])
+        return value
+
+    def _place_list(self, values: list[Any], old: list[Any]) -> list[Any]:
+        """Return the data for a list, matching items to the previous items.
+
+        Dataclass items are matched by their first field, such as the host of
+        a machine, and other items by value, so that items loaded from an
+        included file stay in that file when the list is reordered or edited.
+        """
+        if not old:
+            return [self.place(value, None) for value in values]
+        name = None
+        if values and dataclasses.is_dataclass(values[0]):
+            name = dataclasses.fields(values[0])[0].name
+        previous: dict[Any, Any] = {}
+        for item in old:
+            data = _resolve(item, self._layout)
+            key = data.get(name) if name and isinstance(data, dict) else data
+            if isinstance(key, str):
+                previous.setdefault(key, item)
+        return [
+            self.place(
+                value, previous.pop(getattr(value, name) if name else value, None)
+            )
+            for value in values
+        ]
+
+
+class ManifestWriter:
+    """Writes manifests to the files of the include layout of a manifest file.
+
+    The layout is read when the writer is created, and the manifest decoded
+    from the same parse is available as `manifest`.
+    """
+
+    def __init__(self, path: pathlib.Path) -> None:
+        """Initialize ManifestWriter by loading the manifest file and its includes."""
+        self._root = path.resolve()
+        fragments = FragmentSet(path)
+        with load_errors(path), stage("load", path):
+            (data, _) = fragments.load()
+            self._manifest: Manifest = decode_value(data, Manifest)
+        self._layout = {file: fragments.data(file) for file in fragments.files}
+
+    @property
+    def manifest(self) -> Manifest:
+        """The manifest as it was loaded, or last written."""
+        return self._manifest
+
+    @property
+    def files(self) -> list[pathlib.Path]:
+        """The manifest file followed by every file it includes."""
+        return list(self._layout)
+
+    def _place(self, manifest: Manifest) -> dict[pathlib.Path, Any]:
+        """Return the data to write to each file of the layout for the manifest."""
+        placement = _Placement(self._layout)
+        placement.files[self._root] = placement.place(
+            manifest, self._layout[self._root]
+        )
+        return placement.files
+
+    def _dump(self, files: dict[pathlib.Path, Any]) -> dict[pathlib.Path, str]:
+        """Return the YAML contents of the data of each file."""
+        contents = {}
+        for path, data in files.items():
+            with stage("dump", path):
+                contents[path] = yaml_dump(data, path.parent)
+        return contents
+
+    def render(self, manifest: Manifest) -> dict[pathlib.Path, str]:
+        """Return the YAML contents of each file of the layout for the manifest.
+
+        Included files that the manifest no longer refers to, such as a file
+        holding a single machine that was removed, are left out.
+        """
+        return self._dump(self._place(manifest))
+
+    def write(self, manifest: Manifest) -> list[pathlib.Path]:
+        """Write the manifest to its files, returning the files that changed.
+
+        Each file is replaced atomically and only when its contents differ.
+        Included files are written before the files that include them.
+        """
+        files = self._place(manifest)
+        changed = [
+            path
+            for path, text in self._dump(files).items()
+            if write_if_changed(path, [text])
+        ]
+        layout = {**self._layout, **files}
+        self._layout = {}
+        pending = [self._root]
+        while pending:
+            if (path := pending.pop()) not in self._layout:
+                self._layout[path] = layout[path]
+                pending.extend(include.path for include in _placeholders(layout[path]))
+        self._manifest = manifest
+        return changed
+
+    def edited(self, edits: MachineEdits) -> Manifest:
+        """Return the manifest with a batch of machine edits applied.
+
+        See `apply_edits`. The edited manifest is validated, so a
+        HostDbConfigError is raised if, for example, an added machine reuses
+        an IP address. Nothing is written.
+        """
+        manifest = apply_edits(self._manifest, edits)
+        validate_manifest(manifest)
+        return manifest
+
+    def apply(self, edits: MachineEdits) -> list[pathlib.Path]:
+        """Apply a batch of machine edits and write the manifest once.
+
+        The edited manifest is validated first, see `edited`, and nothing is
+        written if it is not valid. Returns the files that changed.
+        """
+        return self.write(self.edited(edits))
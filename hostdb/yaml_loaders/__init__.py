@@ -1,14 +1,96 @@
 """Initialize the yaml_loaders extensions."""
 
+import contextvars
+import dataclasses
+import functools
+import gc
+import io
+import os
+import threading
+import types
+import typing
+from collections import ChainMap
+from collections.abc import Callable, Generator, Iterable, Iterator
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Any, TypeVar
 
 import yaml
-from mashumaro.codecs.yaml import YAMLDecoder
+from yaml.composer import Composer, ComposerError
+from mashumaro.codecs.basic import BasicDecoder
+
+from ..cache import FileFingerprint
+from ..profile import StageEvent, collect_events, dispatch, enabled, stage
 
 T = TypeVar("T")
 
 _DEFAULT_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+_DEFAULT_DUMPER = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+# Long strings are never folded onto several lines
+_DUMP_WIDTH = 1 << 16
+
+# The files read by the current load, see `record_reads`
+_READS: contextvars.ContextVar[dict[Path, FileFingerprint] | None] = (
+    contextvars.ContextVar("_READS", default=None)
+)
+
+
+@contextmanager
+def record_reads() -> Generator[dict[Path, FileFingerprint]]:
+    """Record the fingerprint of every file parsed within the context.
+
+    Each fingerprint is taken from the bytes that were parsed and the file
+    stat from before they were read, so a file written while the document is
+    being loaded does not match the fingerprint and is loaded again. Files
+    are keyed by resolved path, in the order they were read.
+    """
+    reads: dict[Path, FileFingerprint] = {}
+    token = _READS.set(reads)
+    try:
+        yield reads
+    finally:
+        _READS.reset(token)
+
+
+# The shape type whose source positions are recorded, see `record_marks`
+_MARKS: contextvars.ContextVar[tuple[Any, list[yaml.Mark]] | None] = (
+    contextvars.ContextVar("_MARKS", default=None)
+)
+
+
+@contextmanager
+def record_marks(shape_type: Any) -> Generator[list[yaml.Mark]]:
+    """Record where each value of a dataclass type starts while it is decoded.
+
+    The marks are collected by `yaml_decode_file` as the values are built
+    from the parsed nodes, in the order they are decoded, e.g. the position
+    of each machine of a manifest. Nothing is recorded when the document
+    can't be decoded directly from its nodes.
+    """
+    marks: list[yaml.Mark] = []
+    token = _MARKS.set((shape_type, marks))
+    try:
+        yield marks
+    finally:
+        _MARKS.reset(token)
+
+
+def _open(path: Path) -> Any:
+    """Open a file to parse, recording its fingerprint when reads are recorded."""
+    if (reads := _READS.get()) is None:
+        return path.open()
+    resolved = path.resolve()
+    with path.open("rb") as fd:
+        mtime_ns = os.fstat(fd.fileno()).st_mtime_ns
+        data = fd.read()
+    reads[resolved] = FileFingerprint.from_contents(resolved, mtime_ns, data)
+    stream = io.BytesIO(data)
+    # Named like a file object so that includes are resolved relative to it
+    stream.name = str(path)
+    return stream
 
 
 class FastSafeLoader(_DEFAULT_LOADER):
@@ -30,12 +112,129 @@ class FastSafeLoader(_DEFAULT_LOADER):
         else:
             self.name = getattr(stream, "name", "<file>")
 
+        # Every file pulled in by an !include tag, including nested includes
+        self.includes: list[Path] = []
+        # Files currently being loaded, used to detect include cycles
+        self.ancestors: tuple[Path, ...] = ()
+        if isinstance(self.name, str) and not self.name.startswith("<"):
+            self.ancestors = (Path(self.name).resolve(),)
+
+        super().__init__(stream)
+
+
+@dataclass(frozen=True)
+class Include:
+    """Placeholder for an !include tag that is resolved after loading.
+
+    `FragmentSet.data` returns the data of a file with these in place of the
+    values it includes, and `yaml_dump` writes them back as `!include` tags.
+    """
+
+    path: Path
+    mark: str
+
+
+class _FragmentLoader(FastSafeLoader):
+    """A loader that records !include tags as placeholders.
+
+    This is used to load each file in the include graph independently so that
+    fragments can be parsed concurrently then stitched together.
+    """
+
+    def __init__(self, stream: Any) -> None:
+        """Initialize _FragmentLoader."""
         super().__init__(stream)
+        self.placeholders: list[Include] = []
+
+
+class _StreamingLoader(FastSafeLoader, Composer):
+    """A loader that composes one node at a time from the event stream.
 
+    The C parser only exposes whole documents as nodes, so this borrows the
+    pure python composer to build nodes for part of a document on top of the
+    C parser events.
+    """
+
+    def __init__(self, stream: Any) -> None:
+        """Initialize _StreamingLoader."""
+        super().__init__(stream)
+        # Anchors defined outside of the streamed sequence, kept for the
+        # whole document so that items can refer to them
+        self.document_anchors: dict[str, yaml.Node] = {}
+        self.anchors: typing.MutableMapping[str, yaml.Node] = self.document_anchors
 
-def _default_decoder(stream: Any) -> Any:
-    """Decode a YAML document using the custom tag constructors."""
-    return yaml.load(stream, Loader=FastSafeLoader)
+    def reset_anchors(self) -> None:
+        """Forget the anchors of the previous item so memory stays bounded."""
+        self.anchors = ChainMap({}, self.document_anchors)
+
+    def compose_node(self, parent: yaml.Node | None, index: Any) -> yaml.Node:
+        """Compose a node, rejecting aliases to anchors that are not kept."""
+        if self.check_event(yaml.AliasEvent):
+            event = self.peek_event()
+            if event.anchor not in self.anchors:
+                raise ComposerError(
+                    None,
+                    None,
+                    f"found undefined alias {event.anchor!r}; items of a streamed "
+                    "sequence can't refer to anchors in other items",
+                    event.start_mark,
+                )
+        return super().compose_node(parent, index)
+
+
+class _GcPause:
+    """Process wide pauses of the cyclic garbage collector, counted across threads."""
+
+    def __init__(self) -> None:
+        """Initialize _GcPause."""
+        self._lock = threading.Lock()
+        self._count = 0
+        self._enabled = False
+
+    @contextmanager
+    def paused(self) -> Generator[None]:
+        """Pause the collector until every overlapping pause has ended."""
+        with self._lock:
+            if self._count == 0:
+                self._enabled = gc.isenabled()
+                gc.disable()
+            self._count += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._count -= 1
+                if self._count == 0 and self._enabled:
+                    gc.enable()
+
+
+_GC_PAUSE = _GcPause()
+
+
+def _gc_paused() -> AbstractContextManager[None]:
+    """Pause the cyclic garbage collector while building a large document.
+
+    Loading allocates millions of objects that all stay alive, so collections
+    triggered along the way only re-scan them and can take most of the time.
+
+    The collector is process wide, so loads may also run in other threads,
+    such as reloads of the daemon or `HostDb.watch`. Overlapping pauses are
+    counted and the collector is restored to its previous state when the last
+    one ends, rather than by whichever ends first. Pausing is safe for other
+    threads: their objects are still freed by reference counting and only
+    reclaiming reference cycles is deferred until the load finishes.
+    """
+    return _GC_PAUSE.paused()
+
+
+def yaml_load(stream: Any) -> tuple[Any, list[Path]]:
+    """Load a YAML document returning the data and the list of included files."""
+    loader = FastSafeLoader(stream)
+    try:
+        with _gc_paused():
+            return (loader.get_single_data(), loader.includes)
+    finally:
+        loader.dispose()
 
 
 def yaml_decode(stream: Any, shape_type: type[T] | Any) -> T:
@@ -45,13 +244,434 @@ def yaml_decode(stream: Any, shape_type: type[T] | Any) -> T:
     but accepts a stream rather than content string in order to implement
     custom tags based on the current filename.
     """
-    return YAMLDecoder(shape_type, pre_decoder_func=_default_decoder).decode(stream)
+    (data, _) = yaml_load(stream)
+    return decode_value(data, shape_type)
 
 
-def _include_tag_constructor(
-    loader: yaml.SafeLoader, node: yaml.nodes.ScalarNode
+@functools.cache
+def _decoder(shape_type: type[T] | Any) -> BasicDecoder[T]:
+    """Return the decoder for the shape type, generating it only once."""
+    return BasicDecoder(shape_type)
+
+
+def decode_value(data: Any, shape_type: type[T] | Any) -> T:
+    """Decode already loaded YAML data into the shape type."""
+    return _decoder(shape_type).decode(data)
+
+
+class _Unsupported(Exception):
+    """Raised when a document can't be decoded directly from its nodes."""
+
+
+_STR_TAG = "tag:yaml.org,2002:str"
+_NULL_TAG = "tag:yaml.org,2002:null"
+
+_NodeDecoder = Callable[[yaml.Node, FastSafeLoader], Any]
+
+
+def _decode_include(
+    node: yaml.Node, loader: FastSafeLoader, decode: _NodeDecoder
 ) -> Any:
-    """Load a file from the filesystem."""
+    """Decode the root node of the file referenced by an !include tag."""
+    path = _include_path(loader, node)
+    loader.includes.append(path)
+    with stage("include", path), _open(path) as include_file:
+        include_loader = FastSafeLoader(include_file)
+        include_loader.ancestors = (*loader.ancestors, path)
+        include_loader.includes = loader.includes
+        try:
+            with stage("parse", path):
+                root = include_loader.get_single_node()
+            if root is None:
+                raise _Unsupported
+            return decode(root, include_loader)
+        finally:
+            include_loader.dispose()
+
+
+def _str_node_decoder(node: yaml.Node, loader: FastSafeLoader) -> str:
+    """Return the value of a string scalar node."""
+    if node.tag != _STR_TAG:
+        raise _Unsupported
+    return node.value
+
+
+@functools.cache
+def _node_decoder(shape_type: Any) -> _NodeDecoder:
+    """Return a function that decodes a node of the shape type, built only once.
+
+    Only the types used by the manifest schema are supported: strings,
+    optional values, lists and dataclasses. Values the decoder does not
+    handle, such as a number where a string is expected, raise _Unsupported.
+    """
+    if shape_type is str:
+        decode = _str_node_decoder
+    elif (origin := typing.get_origin(shape_type)) in (types.UnionType, typing.Union):
+        args = [arg for arg in typing.get_args(shape_type) if arg is not type(None)]
+        if len(args) != 1:
+            raise TypeError(f"Unsupported type {shape_type}")
+        inner = _node_decoder(args[0])
+
+        def decode(node: yaml.Node, loader: FastSafeLoader) -> Any:
+            if node.tag == _NULL_TAG:
+                return None
+            return inner(node, loader)
+
+    elif origin is list:
+        item = _node_decoder(typing.get_args(shape_type)[0])
+
+        def decode(node: yaml.Node, loader: FastSafeLoader) -> Any:
+            if not isinstance(node, yaml.SequenceNode):
+                raise _Unsupported
+            return [item(value, loader) for value in node.value]
+
+    elif dataclasses.is_dataclass(shape_type):
+        hints = typing.get_type_hints(shape_type)
+        fields = {
+            f.name: _node_decoder(hints[f.name]) for f in dataclasses.fields(shape_type)
+        }
+        required = {
+            f.name
+            for f in dataclasses.fields(shape_type)
+            if f.default is dataclasses.MISSING
+            and f.default_factory is dataclasses.MISSING
+        }
+
+        def decode(node: yaml.Node, loader: FastSafeLoader) -> Any:
+            if not isinstance(node, yaml.MappingNode):
+                raise _Unsupported
+            kwargs = {}
+            for key, value in node.value:
+                if key.tag != _STR_TAG:
+                    raise _Unsupported
+                if (field_decoder := fields.get(key.value)) is not None:
+                    kwargs[key.value] = field_decoder(value, loader)
+            if not required.issubset(kwargs):
+                raise _Unsupported
+            if (marks := _MARKS.get()) is not None and marks[0] is shape_type:
+                marks[1].append(node.start_mark)
+            return shape_type(**kwargs)
+
+    else:
+        raise TypeError(f"Unsupported type {shape_type}")
+
+    def decode_or_include(node: yaml.Node, loader: FastSafeLoader) -> Any:
+        if node.tag == "!include":
+            return _decode_include(node, loader, decode)
+        return decode(node, loader)
+
+    return decode_or_include
+
+
+def yaml_decode_file(path: Path, shape_type: type[T] | Any) -> tuple[T, list[Path]]:
+    """Decode a YAML file into the shape type, returning the list of included files.
+
+    When possible the dataclasses are built directly from the parsed YAML nodes
+    in a single pass, skipping the intermediate python objects. Documents using
+    anything the fast path does not handle, such as values that need type
+    conversion, are decoded with `yaml_load` and `decode_value` instead so the
+    result and any errors are the same.
+    """
+    try:
+        decode = _node_decoder(shape_type)
+    except TypeError:
+        decode = None
+    if decode is not None:
+        with _open(path) as stream, _gc_paused():
+            loader = FastSafeLoader(stream)
+            try:
+                with stage("parse", path):
+                    root = loader.get_single_node()
+                if root is not None:
+                    with stage("decode", path):
+                        return (decode(root, loader), loader.includes)
+            except _Unsupported:
+                if (marks := _MARKS.get()) is not None:
+                    marks[1].clear()
+            finally:
+                loader.dispose()
+    with stage("parse", path), _open(path) as stream:
+        (data, includes) = yaml_load(stream)
+    with stage("decode", path), _gc_paused():
+        return (decode_value(data, shape_type), includes)
+
+
+def _load_fragment(path: Path) -> tuple[Any, list[Include]]:
+    """Load a single file without following its includes."""
+    with stage("parse", path), _open(path) as stream, _gc_paused():
+        loader = _FragmentLoader(stream)
+        try:
+            return (loader.get_single_data(), loader.placeholders)
+        finally:
+            loader.dispose()
+
+
+def _load_fragment_recorded(
+    path: Path, record: bool, profile: bool
+) -> tuple[tuple[Any, list[Include]], FileFingerprint | None, list[StageEvent]]:
+    """Load a single file in a worker process, along with its fingerprint.
+
+    With `profile` the stage events of the worker are returned for the parent
+    to dispatch, since the hooks are not shared with the worker.
+    """
+    with (
+        record_reads() if record else nullcontext({}) as reads,
+        collect_events() if profile else nullcontext([]) as events,
+    ):
+        fragment = _load_fragment(path)
+    return (fragment, reads.get(path.resolve()), events)
+
+
+def _stitch(
+    value: Any,
+    fragments: dict[Path, tuple[Any, list[Include]]],
+    ancestors: tuple[Path, ...],
+) -> Any:
+    """Replace include placeholders with the contents of the loaded fragment."""
+    if isinstance(value, Include):
+        if value.path in ancestors:
+            raise ValueError(f"File '{value.path}' includes itself {value.mark}")
+        (data, placeholders) = fragments[value.path]
+        if not placeholders:
+            return data
+        return _stitch(data, fragments, (*ancestors, value.path))
+    if isinstance(value, dict):
+        return {k: _stitch(v, fragments, ancestors) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_stitch(v, fragments, ancestors) for v in value]
+    return value
+
+
+def yaml_load_parallel(
+    path: Path, max_workers: int | None = None
+) -> tuple[Any, list[Path]]:
+    """Load a YAML document parsing included files concurrently.
+
+    The include graph is discovered as each file is parsed, and every newly
+    referenced file is parsed in a process pool as soon as it is found. The
+    results are then stitched into the parent documents. This returns the same
+    result as `yaml_load`.
+    """
+    root = path.resolve()
+    reads = _READS.get()
+    fragments: dict[Path, tuple[Any, list[Include]]] = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        record = reads is not None
+        profile = enabled()
+        pending: dict[Future, Path] = {
+            executor.submit(_load_fragment_recorded, path, record, profile): root
+        }
+        submitted = {root}
+        while pending:
+            (done, _) = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                fragment_path = pending.pop(future)
+                (fragments[fragment_path], read, events) = future.result()
+                if reads is not None and read is not None:
+                    reads[fragment_path] = read
+                for event in events:
+                    dispatch(event)
+                for include in fragments[fragment_path][1]:
+                    if include.path in submitted:
+                        continue
+                    submitted.add(include.path)
+                    pending[
+                        executor.submit(
+                            _load_fragment_recorded, include.path, record, profile
+                        )
+                    ] = include.path
+    data = _stitch(fragments[root][0], fragments, (root,))
+    return (data, [p for p in fragments if p != root])
+
+
+class FragmentSet:
+    """The files of an include graph, each parsed on its own.
+
+    The parsed fragments are kept between loads so that reloading the document
+    after an edit only parses the files that changed.
+    """
+
+    def __init__(self, path: Path) -> None:
+        """Initialize FragmentSet."""
+        self._root = path.resolve()
+        self._fragments: dict[Path, tuple[Any, list[Include]]] = {}
+
+    @property
+    def files(self) -> list[Path]:
+        """The root file followed by every file it includes, once loaded."""
+        return list(self._fragments)
+
+    def data(self, path: Path) -> Any:
+        """Return the data of a loaded file with its `!include` tags unresolved.
+
+        Each tag is left as a placeholder holding the resolved path, which
+        `yaml_dump` writes back as an `!include` tag.
+        """
+        return self._fragments[path.resolve()][0]
+
+    def load(self, changed: Iterable[Path] = ()) -> tuple[Any, list[Path]]:
+        """Load the document, re-parsing the `changed` files and any new includes.
+
+        Returns the same result as `yaml_load`. Fragments that are no longer
+        included are dropped.
+        """
+        for path in changed:
+            self._fragments.pop(path.resolve(), None)
+        fragments: dict[Path, tuple[Any, list[Include]]] = {}
+        pending = [self._root]
+        while pending:
+            path = pending.pop()
+            if path in fragments:
+                continue
+            if (fragment := self._fragments.get(path)) is None:
+                fragment = _load_fragment(path)
+            fragments[path] = fragment
+            pending.extend(include.path for include in fragment[1])
+        self._fragments = fragments
+        data = _stitch(fragments[self._root][0], fragments, (self._root,))
+        return (data, [p for p in fragments if p != self._root])
+
+
+class _IncludeDumper(_DEFAULT_DUMPER):
+    """The fastest available safe dumper that writes placeholders as !include tags.
+
+    Included paths are written relative to `directory`, the directory of the
+    file being written.
+    """
+
+    directory: Path
+
+    def ignore_aliases(self, data: Any) -> bool:
+        """Write shared values in full rather than as anchors and aliases."""
+        return True
+
+
+def _include_representer(dumper: _IncludeDumper, include: Include) -> yaml.Node:
+    """Represent an include placeholder as an !include tag."""
+    return dumper.represent_scalar(
+        "!include", os.path.relpath(include.path, dumper.directory)
+    )
+
+
+def yaml_dump(data: Any, directory: Path) -> str:
+    """Return a YAML document for data loaded from a file in `directory`.
+
+    The output is in a canonical block style: keys keep their order, sequences
+    in mappings are not indented and the document starts with `---`. Include
+    placeholders from `FragmentSet.data` are written as `!include` tags.
+    """
+    stream = io.StringIO()
+    dumper = _IncludeDumper(
+        stream,
+        default_flow_style=False,
+        width=_DUMP_WIDTH,
+        allow_unicode=True,
+        explicit_start=True,
+        sort_keys=False,
+    )
+    dumper.directory = directory
+    try:
+        with _gc_paused():
+            dumper.open()
+            dumper.represent(data)
+            dumper.close()
+    finally:
+        dumper.dispose()
+    return stream.getvalue()
+
+
+def _skip_node(loader: _StreamingLoader) -> None:
+    """Consume the events for the next node without building it.
+
+    Nodes with an anchor are composed and kept, so that the streamed items
+    can refer to them with an alias.
+    """
+    loader.anchors = loader.document_anchors
+    depth = 0
+    while True:
+        event = loader.peek_event()
+        if getattr(event, "anchor", None) is not None and not isinstance(
+            event, yaml.AliasEvent
+        ):
+            loader.compose_node(None, None)
+            if depth == 0:
+                return
+            continue
+        loader.get_event()
+        if isinstance(event, (yaml.SequenceStartEvent, yaml.MappingStartEvent)):
+            depth += 1
+        elif isinstance(event, (yaml.SequenceEndEvent, yaml.MappingEndEvent)):
+            depth -= 1
+        if depth == 0:
+            return
+
+
+def _stream_items(loader: _StreamingLoader) -> Iterator[tuple[Any, yaml.Mark]]:
+    """Yield each item of the sequence node at the current position."""
+    if not loader.check_event(yaml.SequenceStartEvent):
+        loader.reset_anchors()
+        node = loader.compose_node(None, None)
+        if isinstance(node, yaml.ScalarNode) and node.tag == "!include":
+            yield from _stream_file(_include_path(loader, node), None, loader.ancestors)
+            return
+        data = loader.construct_document(node)
+        if data is None:
+            return
+        if not isinstance(data, list):
+            raise ValueError(f"Expected a sequence {node.start_mark!s}")
+        for item in data:
+            yield (item, node.start_mark)
+        return
+    loader.get_event()
+    while not loader.check_event(yaml.SequenceEndEvent):
+        loader.reset_anchors()
+        node = loader.compose_node(None, None)
+        yield (loader.construct_document(node), node.start_mark)
+    loader.get_event()
+
+
+def _stream_file(
+    path: Path, key: str | None, ancestors: tuple[Path, ...]
+) -> Iterator[tuple[Any, yaml.Mark]]:
+    """Yield items from the sequence in `key` of a file, or the whole file."""
+    with path.open() as stream:
+        loader = _StreamingLoader(stream)
+        loader.ancestors = (*ancestors, path.resolve())
+        try:
+            loader.get_event()
+            if loader.check_event(yaml.StreamEndEvent):
+                return
+            loader.get_event()
+            if key is None:
+                yield from _stream_items(loader)
+                return
+            if not loader.check_event(yaml.MappingStartEvent):
+                return
+            loader.get_event()
+            while not loader.check_event(yaml.MappingEndEvent):
+                key_node = loader.compose_node(None, None)
+                if isinstance(key_node, yaml.ScalarNode) and key_node.value == key:
+                    yield from _stream_items(loader)
+                else:
+                    _skip_node(loader)
+        finally:
+            loader.dispose()
+
+
+def yaml_stream_sequence(path: Path, key: str) -> Iterator[tuple[Any, yaml.Mark]]:
+    """Yield the items of a top-level sequence one at a time.
+
+    This is used to process very large documents in bounded memory: only the
+    current item of the sequence stored in `key` of the root mapping is built,
+    and the rest of the document is skipped at the event level. A sequence
+    pulled in with an `!include` tag is streamed from the included file. Each
+    item is returned with the mark of where it starts.
+    """
+    return _stream_file(path, key, ())
+
+
+def _include_path(loader: FastSafeLoader, node: yaml.nodes.ScalarNode) -> Path:
+    """Return the path of the file referenced by an !include tag."""
     path = Path(node.value)
     if not path.is_absolute():
         loader_path = Path(loader.name)
@@ -67,9 +687,39 @@ def _include_tag_constructor(
     if not path.is_file():
         raise FileNotFoundError(f"File '{path}' is not a file {node.start_mark!s}")
 
-    with path.open() as include_file:
-        return yaml.load(include_file, Loader=FastSafeLoader)
+    path = path.resolve()
+    if path in loader.ancestors:
+        raise ValueError(f"File '{path}' includes itself {node.start_mark!s}")
+    return path
+
+
+def _include_tag_constructor(
+    loader: FastSafeLoader, node: yaml.nodes.ScalarNode
+) -> Any:
+    """Load a file from the filesystem."""
+    path = _include_path(loader, node)
+    with stage("include", path), _open(path) as include_file:
+        include_loader = type(loader)(include_file)
+        include_loader.ancestors = (*loader.ancestors, path)
+        try:
+            data = include_loader.get_single_data()
+        finally:
+            include_loader.dispose()
+    loader.includes.append(path)
+    loader.includes.extend(include_loader.includes)
+    return data
+
+
+def _include_placeholder_constructor(
+    loader: _FragmentLoader, node: yaml.nodes.ScalarNode
+) -> Include:
+    """Record an included file to be loaded separately."""
+    placeholder = Include(_include_path(loader, node), str(node.start_mark))
+    loader.placeholders.append(placeholder)
+    return placeholder
 
 
 # Register the custom tag constructors.
 FastSafeLoader.add_constructor("!include", _include_tag_constructor)
+_FragmentLoader.add_constructor("!include", _include_placeholder_constructor)
+_IncludeDumper.add_representer(Include, _include_representer)
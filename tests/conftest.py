@@ -9,3 +9,9 @@ import pytest
 def fixed_seed() -> None:
     """Fixture to apply a fixed seed."""
     random.seed(0)
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path_factory: pytest.TempPathFactory, monkeypatch) -> None:
+    """Fixture to keep the default manifest cache out of the home directory."""
+    monkeypatch.setenv("HOSTDB_CACHE_DIR", str(tmp_path_factory.mktemp("cache")))
@@ -0,0 +1,78 @@
+"""Tests for the synthetic manifest benchmarks."""
+
+import dataclasses
+import json
+import os
+import pathlib
+
+import pytest
+
+from hostdb.bench import (
+    STAGES,
+    SyntheticConfig,
+    generate_manifest,
+    results_json,
+    run_benchmarks,
+)
+from hostdb.exceptions import HostDbException
+from hostdb.hostdb import HostDb, iter_machines
+from hostdb.manifest import Site
+from hostdb.validation import check_manifest
+from hostdb.yaml_loaders import yaml_load
+
+
+def test_generate_manifest(tmp_path: pathlib.Path) -> None:
+    """Test the generated manifest has the requested shape and is valid."""
+    config = SyntheticConfig(
+        machines=200, services=3, hardware_labels=5, networks=3, includes=10
+    )
+    path = generate_manifest(tmp_path, config)
+    db = HostDb.from_yaml(path)
+    assert check_manifest(db.manifest).valid
+    assert len(db.hosts) == 200
+    assert len(db.services) == 600
+    assert len(db.manifest.hardware_labels) == 5
+    assert len(db.manifest.network) == 3
+    assert len(db.files) == 11
+    assert len(db.machines_in_network("10.2.0.0/16")) == 66
+    assert [m.host for m in iter_machines(path)] == list(db.hostnames)
+    assert db.manifest.site == Site(domain="bench.example.com", env="bench")
+    with path.open() as stream:
+        (data, _) = yaml_load(stream)
+    assert set(data["site"]) <= {field.name for field in dataclasses.fields(Site)}
+
+    # The same seed generates the same manifest
+    assert generate_manifest(tmp_path / "again", config).read_text() == path.read_text()
+
+
+def test_generate_too_many_machines(tmp_path: pathlib.Path) -> None:
+    """Test that machines must fit in the networks."""
+    with pytest.raises(HostDbException, match="Not enough networks"):
+        generate_manifest(tmp_path, SyntheticConfig(machines=70_000, networks=1))
+
+
+def test_run_benchmarks(tmp_path: pathlib.Path) -> None:
+    """Test running every stage and serializing the results."""
+    path = generate_manifest(tmp_path, SyntheticConfig(machines=100, includes=2))
+    results = run_benchmarks(path, stages=STAGES, repeat=2, allocate=10)
+    report = json.loads(json.dumps(results_json(results, SyntheticConfig())))
+
+    assert list(report["stages"]) == STAGES
+    assert report["synthetic"]["machines"] == 1000
+    load = report["stages"]["load"]
+    assert load["runs"] == 2
+    assert load["items"] == 100
+    assert 0 < load["latency_ms"]["min"] <= load["latency_ms"]["p50"]
+    assert load["latency_ms"]["p95"] <= load["latency_ms"]["max"]
+    assert load["throughput_per_s"] > 0
+    assert load["peak_memory_bytes"] > 0
+    assert report["stages"]["allocate"]["items"] == 10
+    # Every inventory run parses the manifest instead of using the cache
+    assert not any(pathlib.Path(os.environ["HOSTDB_CACHE_DIR"]).iterdir())
+
+
+def test_unknown_stage(tmp_path: pathlib.Path) -> None:
+    """Test that stages are checked before running."""
+    path = generate_manifest(tmp_path, SyntheticConfig(machines=10))
+    with pytest.raises(HostDbException, match="Unknown benchmark stages"):
+        run_benchmarks(path, stages=["load", "render"])
@@ -0,0 +1,151 @@
+"""Tests for the manifest cache."""
+
+import os
+import pathlib
+import shutil
+
+import pytest
+
+from hostdb import hostdb, yaml_loaders
+from hostdb.cache import FileFingerprint, ManifestCache
+from hostdb.hostdb import HostDb
+from hostdb.manifest import Manifest
+from hostdb.profile import StageEvent
+from hostdb.validation import check_incremental
+
+TESTDATA = pathlib.Path.cwd() / pathlib.Path("tests/testdata")
+INCLUDES_DIR = TESTDATA / "includes"
+
+
+@pytest.fixture(name="config")
+def config_fixture(tmp_path: pathlib.Path) -> pathlib.Path:
+    """Fixture that returns a writable copy of a manifest with includes."""
+    shutil.copytree(INCLUDES_DIR, tmp_path / "includes")
+    return tmp_path / "includes" / "manifest.yaml"
+
+
+@pytest.fixture(name="cache_dir")
+def cache_dir_fixture(tmp_path: pathlib.Path) -> pathlib.Path:
+    """Fixture that returns the cache directory."""
+    return tmp_path / "cache"
+
+
+def test_cache_hit(
+    config: pathlib.Path, cache_dir: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that a warm load does not parse the yaml again."""
+    db = HostDb.from_yaml(config, cache_dir=cache_dir)
+    assert list(db.hostnames) == ["friend", "lagoon", "latin"]
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Manifest should be loaded from the cache")
+
+    monkeypatch.setattr(yaml_loaders, "yaml_load", fail)
+    monkeypatch.setattr(yaml_loaders, "yaml_decode_file", fail)
+    db = HostDb.from_yaml(config, cache_dir=cache_dir)
+    assert list(db.hostnames) == ["friend", "lagoon", "latin"]
+    assert db.services == {"rtr01": "friend", "sto01": "lagoon"}
+
+
+def test_include_changed(config: pathlib.Path, cache_dir: pathlib.Path) -> None:
+    """Test that editing an included file invalidates the cache."""
+    HostDb.from_yaml(config, cache_dir=cache_dir)
+
+    machines = config.parent / "machines.yaml"
+    machines.write_text(machines.read_text() + "- host: linear\n")
+
+    db = HostDb.from_yaml(config, cache_dir=cache_dir)
+    assert list(db.hostnames) == ["friend", "lagoon", "latin", "linear"]
+
+
+@pytest.mark.parametrize("parallel", [False, True])
+def test_edit_while_loading(
+    config: pathlib.Path, cache_dir: pathlib.Path, parallel: bool
+) -> None:
+    """Test that an include edited while the manifest is loaded is not cached."""
+    machines = config.parent / "machines.yaml"
+
+    # Edit after every file was read but before the manifest is cached. Stages
+    # of the parent process are used since parallel loads read the files in
+    # worker processes, which don't share the hooks unless they are forked.
+    def edit(event: StageEvent) -> None:
+        if event.name == "decode" and event.file == str(config):
+            machines.write_text(machines.read_text() + "- host: linear\n")
+
+    remove = HostDb.add_hook(edit)
+    try:
+        db = HostDb.from_yaml(config, cache_dir=cache_dir, parallel=parallel)
+    finally:
+        remove()
+    assert list(db.hostnames) == ["friend", "lagoon", "latin"]
+    assert [fp.path for fp in db.fingerprints] == [str(path) for path in db.files]
+    assert not all(fp.is_current() for fp in db.fingerprints)
+
+    db = HostDb.from_yaml(config, cache_dir=cache_dir)
+    assert list(db.hostnames) == ["friend", "lagoon", "latin", "linear"]
+
+
+def test_include_removed(config: pathlib.Path, cache_dir: pathlib.Path) -> None:
+    """Test that a missing include is reported rather than served from cache."""
+    HostDb.from_yaml(config, cache_dir=cache_dir)
+
+    (config.parent / "network.yaml").unlink()
+
+    with pytest.raises(hostdb.HostDbException, match=r"does not exist"):
+        HostDb.from_yaml(config, cache_dir=cache_dir)
+
+
+def test_fingerprint_touched(tmp_path: pathlib.Path) -> None:
+    """Test that a file with a new mtime but the same content is current."""
+    path = tmp_path / "file.yaml"
+    path.write_text("---\n- a\n")
+    fp = FileFingerprint.from_path(path)
+    assert fp.is_current()
+
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert fp.is_current()
+
+    path.write_text("---\n- b\n")
+    assert not fp.is_current()
+
+
+def test_corrupt_cache_entry(config: pathlib.Path, cache_dir: pathlib.Path) -> None:
+    """Test that an unreadable cache entry is ignored."""
+    cache = ManifestCache(cache_dir)
+    cache.store(config, Manifest(), [])
+    for entry in cache_dir.iterdir():
+        entry.write_bytes(b"not a pickle")
+    assert cache.load(config) is None
+
+    db = HostDb.from_yaml(config, cache_dir=cache_dir)
+    assert list(db.hostnames) == ["friend", "lagoon", "latin"]
+
+
+def test_foreign_cache_entry(
+    config: pathlib.Path, cache_dir: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that entries owned by another user are not unpickled."""
+    cache = ManifestCache(cache_dir)
+    cache.store(config, Manifest(), [])
+    assert (cache_dir.stat().st_mode & 0o777) == 0o700
+
+    monkeypatch.setattr(os, "getuid", lambda: os.stat(cache_dir).st_uid + 1)
+    assert cache.load(config) is None
+
+
+def test_validation_state(config: pathlib.Path, cache_dir: pathlib.Path) -> None:
+    """Test persisting the incremental validation state."""
+    cache = ManifestCache(cache_dir)
+    assert cache.load_validation_state(config) is None
+
+    db = HostDb.from_yaml(config, cache_dir=cache_dir)
+    (report, state) = check_incremental(db.manifest, None)
+    assert report.valid
+    cache.store_validation_state(config, state)
+
+    loaded = cache.load_validation_state(config)
+    assert loaded is not None
+    assert loaded.machines == state.machines
+    (report, _) = check_incremental(db.manifest, loaded)
+    assert report.valid
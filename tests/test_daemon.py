@@ -0,0 +1,203 @@
+"""Tests for the hostdb daemon."""
+
+import asyncio
+import pathlib
+import shutil
+import socket
+
+import pytest
+
+from hostdb.client import request
+from hostdb.daemon import ManifestServer
+from hostdb.exceptions import HostDbDaemonUnavailable, HostDbException
+
+EXAMPLES = pathlib.Path.cwd() / pathlib.Path("examples")
+EXAMPLE_CONFIG = EXAMPLES / "manifest.yaml"
+
+NEW_MACHINE = """- host: tango
+  ip: 192.168.1.20
+"""
+
+
+async def _wait_for_socket(socket_path: pathlib.Path) -> None:
+    """Wait for the server to start listening."""
+    async with asyncio.timeout(10):
+        while not socket_path.exists():
+            await asyncio.sleep(0.01)
+
+
+def test_no_daemon(tmp_path: pathlib.Path) -> None:
+    """Test that a missing daemon is reported as unavailable."""
+    with pytest.raises(HostDbDaemonUnavailable, match="Unable to connect"):
+        request(tmp_path / "missing.sock", EXAMPLE_CONFIG, "status")
+
+
+def test_serve(tmp_path: pathlib.Path) -> None:
+    """Test answering requests over the socket."""
+    socket_path = tmp_path / "hostdb.sock"
+
+    async def run() -> None:
+        server = ManifestServer(EXAMPLE_CONFIG, cache_dir=None)
+        task = asyncio.create_task(server.serve(socket_path))
+        await _wait_for_socket(socket_path)
+
+        hosts = await asyncio.to_thread(request, socket_path, EXAMPLE_CONFIG, "hosts")
+        assert list(hosts) == ["friend", "lagoon", "latin"]
+        assert hosts["friend"]["ip"] == "192.168.1.1"
+
+        result = await asyncio.to_thread(
+            request, socket_path, EXAMPLE_CONFIG, "hostnames"
+        )
+        assert result == ["friend", "lagoon", "latin"]
+
+        result = await asyncio.to_thread(
+            request, socket_path, EXAMPLE_CONFIG, "query", service_type="sto"
+        )
+        assert result == ["lagoon"]
+
+        result = await asyncio.to_thread(
+            request, socket_path, EXAMPLE_CONFIG, "validate"
+        )
+        assert result == {"valid": True, "issues": []}
+
+        with pytest.raises(HostDbException, match="No host with IP"):
+            await asyncio.to_thread(
+                request, socket_path, EXAMPLE_CONFIG, "query", ip="10.0.0.1"
+            )
+
+        with pytest.raises(HostDbDaemonUnavailable, match="Daemon serves"):
+            await asyncio.to_thread(
+                request, socket_path, tmp_path / "other.yaml", "hosts"
+            )
+
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert not socket_path.exists()
+
+    asyncio.run(run())
+
+
+def test_reload(tmp_path: pathlib.Path) -> None:
+    """Test that the daemon picks up changes to the manifest."""
+    config = tmp_path / "manifest.yaml"
+    shutil.copy(EXAMPLE_CONFIG, config)
+    socket_path = tmp_path / "hostdb.sock"
+
+    async def run() -> None:
+        server = ManifestServer(config, cache_dir=None, interval=0.01)
+        task = asyncio.create_task(server.serve(socket_path))
+        await _wait_for_socket(socket_path)
+
+        hosts = await asyncio.to_thread(request, socket_path, config, "hosts")
+        assert "tango" not in hosts
+
+        text = config.read_text()
+        config.write_text(text.replace("# Retired machines\n", NEW_MACHINE))
+
+        async with asyncio.timeout(10):
+            while "tango" not in hosts:
+                await asyncio.sleep(0.01)
+                hosts = await asyncio.to_thread(request, socket_path, config, "hosts")
+
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+
+
+def test_reload_invalid(tmp_path: pathlib.Path) -> None:
+    """Test that validating reports a manifest that no longer loads."""
+    config = tmp_path / "manifest.yaml"
+    shutil.copy(EXAMPLE_CONFIG, config)
+    socket_path = tmp_path / "hostdb.sock"
+
+    async def run() -> None:
+        server = ManifestServer(config, cache_dir=None, interval=0.01)
+        task = asyncio.create_task(server.serve(socket_path))
+        await _wait_for_socket(socket_path)
+
+        result = await asyncio.to_thread(request, socket_path, config, "validate")
+        assert result["valid"]
+
+        config.write_text(config.read_text() + "machines: [\n")
+
+        async with asyncio.timeout(10):
+            while result["valid"]:
+                await asyncio.sleep(0.01)
+                result = await asyncio.to_thread(
+                    request, socket_path, config, "validate"
+                )
+        assert len(result["issues"]) == 1
+
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+
+
+def test_stale_socket(tmp_path: pathlib.Path) -> None:
+    """Test that a stale socket is replaced but a live one is not."""
+    socket_path = tmp_path / "hostdb.sock"
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.bind(str(socket_path))
+
+    async def run() -> None:
+        server = ManifestServer(EXAMPLE_CONFIG, cache_dir=None)
+        task = asyncio.create_task(server.serve(socket_path))
+        async with asyncio.timeout(10):
+            while True:
+                try:
+                    await asyncio.to_thread(
+                        request, socket_path, EXAMPLE_CONFIG, "status"
+                    )
+                    break
+                except HostDbDaemonUnavailable:
+                    await asyncio.sleep(0.01)
+
+        other = ManifestServer(EXAMPLE_CONFIG, cache_dir=None)
+        with pytest.raises(HostDbException, match="already serving"):
+            await other.serve(socket_path)
+
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+
+    (tmp_path / "file").write_text("")
+    with pytest.raises(HostDbException, match="is not a socket"):
+        asyncio.run(ManifestServer(EXAMPLE_CONFIG).serve(tmp_path / "file"))
+
+
+def test_request_after_edit(tmp_path: pathlib.Path) -> None:
+    """Test that a request right after an edit sees the new contents."""
+    config = tmp_path / "manifest.yaml"
+    shutil.copy(EXAMPLE_CONFIG, config)
+    socket_path = tmp_path / "hostdb.sock"
+
+    async def run() -> None:
+        # Poll rarely so that only the request can pick up the edit
+        server = ManifestServer(config, cache_dir=None, interval=3600)
+        task = asyncio.create_task(server.serve(socket_path))
+        await _wait_for_socket(socket_path)
+
+        result = await asyncio.to_thread(request, socket_path, config, "validate")
+        assert result["valid"]
+
+        text = config.read_text()
+        config.write_text(text.replace("# Retired machines\n", NEW_MACHINE))
+        hosts = await asyncio.to_thread(request, socket_path, config, "hostnames")
+        assert "tango" in hosts
+
+        config.write_text(text + "machines: [\n")
+        result = await asyncio.to_thread(request, socket_path, config, "validate")
+        assert not result["valid"]
+
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
@@ -0,0 +1,108 @@
+"""Tests for comparing manifests."""
+
+import dataclasses
+import json
+
+from hostdb.diff import MachineDiff, Reassignment, diff_machines
+from hostdb.hostdb import HostDb
+from hostdb.manifest import Machine, Manifest
+
+
+def test_diff_machines() -> None:
+    """Test finding added, removed and changed machines."""
+    friend = Machine(host="friend", ip="192.168.1.1")
+    lagoon = Machine(host="lagoon", ip="192.168.1.10")
+    latin = Machine(host="latin")
+    moved = Machine(host="lagoon", ip="192.168.1.11")
+    tango = Machine(host="tango")
+
+    diff = diff_machines(
+        {"friend": friend, "lagoon": lagoon, "latin": latin},
+        {"friend": friend, "lagoon": moved, "tango": tango},
+    )
+    assert diff == MachineDiff(
+        added=[tango], removed=[latin], changed=[(lagoon, moved)]
+    )
+    assert diff
+
+
+def test_no_changes() -> None:
+    """Test comparing identical machines."""
+    friend = Machine(host="friend", ip="192.168.1.1")
+    diff = diff_machines({"friend": friend}, {"friend": dataclasses.replace(friend)})
+    assert diff == MachineDiff()
+    assert not diff
+
+
+def test_hostdb_diff() -> None:
+    """Test service moves and address reassignments between two HostDbs."""
+    old = HostDb(
+        Manifest(
+            machines=[
+                Machine(
+                    host="friend",
+                    ip="192.168.1.1",
+                    mac="00:11:22:33:44:55",
+                    services=["rtr01", "dns01"],
+                ),
+                Machine(host="lagoon", ip="192.168.1.10", services=["sto01"]),
+                Machine(host="latin", services=["old01"]),
+            ]
+        )
+    )
+    new = HostDb(
+        Manifest(
+            machines=[
+                Machine(host="friend", ip="192.168.1.1", services=["rtr01"]),
+                Machine(
+                    host="tango",
+                    ip="192.168.1.10",
+                    mac="00-11-22-33-44-55",
+                    services=["dns01", "sto01"],
+                ),
+                Machine(host="latin", services=["old01"]),
+            ]
+        )
+    )
+    diff = old.diff(new)
+    assert [machine.host for machine in diff.machines.added] == ["tango"]
+    assert [machine.host for machine in diff.machines.removed] == ["lagoon"]
+    assert [new.host for _, new in diff.machines.changed] == ["friend"]
+    assert diff.service_moves == [
+        Reassignment("dns01", "friend", "tango"),
+        Reassignment("sto01", "lagoon", "tango"),
+    ]
+    assert diff.ip_reassignments == [Reassignment("192.168.1.10", "lagoon", "tango")]
+    assert diff.mac_reassignments == [
+        Reassignment("00:11:22:33:44:55", "friend", "tango")
+    ]
+    assert diff
+
+    data = json.loads(json.dumps(diff.as_dict()))
+    assert data["changed"][0]["host"] == "friend"
+    assert data["changed"][0]["fields"] == ["mac", "services"]
+    assert data["added"][0]["services"] == ["dns01", "sto01"]
+    assert data["service_moves"][0] == {
+        "value": "dns01",
+        "old_host": "friend",
+        "new_host": "tango",
+    }
+
+    assert not old.diff(old)
+    assert old.diff(old).as_dict()["changed"] == []
+
+
+def test_hostdb_diff_large() -> None:
+    """Test comparing two HostDbs with 100k machines."""
+    machines = [
+        Machine(host=f"host{i}", ip=f"10.{i >> 16}.{i >> 8 & 255}.{i & 255}")
+        for i in range(100_000)
+    ]
+    old = HostDb(Manifest(machines=machines))
+    changed = [dataclasses.replace(machine) for machine in machines]
+    changed[0] = dataclasses.replace(changed[0], ip="10.255.0.1")
+    new = HostDb(Manifest(machines=changed))
+    diff = old.diff(new)
+    assert diff.machines.changed == [(machines[0], changed[0])]
+    assert not diff.machines.added
+    assert not diff.machines.removed
@@ -0,0 +1,127 @@
+"""Tests for exporting DNS, DHCP and hosts files."""
+
+import os
+import pathlib
+
+import pytest
+
+from hostdb.exceptions import HostDbException
+from hostdb.export import export, write_if_changed
+from hostdb.hostdb import HostDb
+from hostdb.manifest import Machine, Manifest, Site
+
+MACHINES = [
+    Machine(
+        host="friend", ip="192.168.1.1", mac="00-11-22-33-44-55", services=["rtr01"]
+    ),
+    Machine(host="lagoon", ip="2001:db8::10", services=["sto01", "kapi01"]),
+    Machine(host="latin", services=["old01"]),
+]
+
+
+@pytest.fixture(name="db")
+def db_fixture() -> HostDb:
+    """Fixture of a HostDb with a site domain."""
+    return HostDb(
+        Manifest(site=Site(domain="lax.example.com"), machines=list(MACHINES))
+    )
+
+
+def test_bind(db: HostDb, tmp_path: pathlib.Path) -> None:
+    """Test the A, AAAA and CNAME records of a zone."""
+    zone = tmp_path / "zone"
+    assert export(db, "bind", zone)
+    assert zone.read_text().splitlines() == [
+        "; Generated by hostdb, do not edit",
+        "$ORIGIN lax.example.com.",
+        "friend\tIN\tA\t192.168.1.1",
+        "rtr01\tIN\tCNAME\tfriend",
+        "lagoon\tIN\tAAAA\t2001:db8::10",
+        "sto01\tIN\tCNAME\tlagoon",
+        "kapi01\tIN\tCNAME\tlagoon",
+    ]
+    with pytest.raises(HostDbException, match="A domain is required"):
+        export(HostDb(Manifest(machines=list(MACHINES))), "bind", zone)
+
+
+def test_dhcp(db: HostDb, tmp_path: pathlib.Path) -> None:
+    """Test DHCP reservations for machines with a MAC and IP address."""
+    assert export(db, "dnsmasq", tmp_path / "dnsmasq.conf")
+    assert (tmp_path / "dnsmasq.conf").read_text().splitlines()[1:] == [
+        "dhcp-host=00:11:22:33:44:55,192.168.1.1,friend"
+    ]
+    assert export(db, "dhcpd", tmp_path / "dhcpd.conf")
+    assert (tmp_path / "dhcpd.conf").read_text().splitlines()[1:] == [
+        "host friend {",
+        "  hardware ethernet 00:11:22:33:44:55;",
+        "  fixed-address 192.168.1.1;",
+        "}",
+    ]
+
+
+def test_hosts(db: HostDb, tmp_path: pathlib.Path) -> None:
+    """Test the hosts file with and without a domain."""
+    hosts = tmp_path / "hosts"
+    assert export(db, "hosts", hosts, domain="example.org.")
+    assert hosts.read_text().splitlines()[1] == (
+        "192.168.1.1\tfriend.example.org friend rtr01.example.org rtr01"
+    )
+    assert export(HostDb(Manifest(machines=list(MACHINES))), "hosts", hosts)
+    assert hosts.read_text().splitlines()[1] == "192.168.1.1\tfriend rtr01"
+    with pytest.raises(HostDbException, match="Unknown export format"):
+        export(db, "unknown", hosts)
+
+
+def test_unchanged_not_rewritten(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that a file with the same contents is left alone."""
+    synced = []
+    fsync = os.fsync
+    monkeypatch.setattr(os, "fsync", lambda fd: synced.append(fd) or fsync(fd))
+    path = tmp_path / "out" / "hosts"
+    assert write_if_changed(path, ["a\n", "b\n"])
+    assert len(synced) == 1
+    assert (path.stat().st_mode & 0o777) == 0o644
+    path.chmod(0o600)
+    inode = path.stat().st_ino
+    assert not write_if_changed(path, iter(["a\n", "b\n"]))
+    assert path.stat().st_ino == inode
+    assert len(synced) == 1
+    assert write_if_changed(path, ["a\n"])
+    assert path.read_text() == "a\n"
+    assert (path.stat().st_mode & 0o777) == 0o600
+    assert os.listdir(path.parent) == ["hosts"]
+
+
+def test_failed_write(tmp_path: pathlib.Path) -> None:
+    """Test that an error while writing leaves the existing file in place."""
+    path = tmp_path / "hosts"
+    path.write_text("old\n")
+
+    def lines():
+        yield "new\n"
+        raise HostDbException("failed")
+
+    with pytest.raises(HostDbException, match="failed"):
+        write_if_changed(path, lines())
+    assert path.read_text() == "old\n"
+    assert os.listdir(tmp_path) == ["hosts"]
+
+
+def test_export_large(tmp_path: pathlib.Path) -> None:
+    """Test exporting every format for 100k machines."""
+    machines = [
+        Machine(
+            host=f"host{i}",
+            ip=f"10.{i >> 16}.{i >> 8 & 255}.{i & 255}",
+            mac=f"02:00:00:{i >> 16:02x}:{i >> 8 & 255:02x}:{i & 255:02x}",
+            services=[f"svc{i:06d}"],
+        )
+        for i in range(100_000)
+    ]
+    db = HostDb(Manifest(site=Site(domain="example.com"), machines=machines))
+    for file_format in ("bind", "dnsmasq", "dhcpd", "hosts"):
+        export(db, file_format, tmp_path / file_format)
+    assert len((tmp_path / "bind").read_text().splitlines()) == 200_002
+    assert len((tmp_path / "hosts").read_text().splitlines()) == 100_001
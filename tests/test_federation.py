@@ -0,0 +1,152 @@
+"""Tests for loading the manifests of several sites together."""
+
+import pathlib
+
+import pytest
+import yaml
+
+from hostdb import federation
+from hostdb.exceptions import HostDbConfigError, HostDbException
+from hostdb.federation import HostDbSet, SiteMachine
+from hostdb.validation import IssueType
+
+
+def _write_site(
+    directory: pathlib.Path, name: str, env: str, machines: list[dict]
+) -> pathlib.Path:
+    """Write a manifest for a site and return its path."""
+    path = directory / f"{name}.yaml"
+    path.write_text(
+        yaml.dump(
+            {
+                "site": {"domain": f"{name}.example.com", "env": env},
+                "service_types": ["rtr", "sto"],
+                "machines": machines,
+            }
+        )
+    )
+    return path
+
+
+@pytest.fixture(name="sites")
+def sites_fixture(tmp_path: pathlib.Path) -> pathlib.Path:
+    """Fixture that returns a directory with manifests for two sites."""
+    _write_site(
+        tmp_path,
+        "east",
+        "prod",
+        [
+            {"host": "friend", "ip": "10.0.0.1", "services": ["rtr01"]},
+            {"host": "lagoon", "mac": "02:00:00:00:00:01", "services": ["sto01"]},
+        ],
+    )
+    _write_site(
+        tmp_path,
+        "west",
+        "dev",
+        [
+            {"host": "friend", "ip": "10.1.0.1", "services": ["rtr01"]},
+            {"host": "latin", "mac": "02:00:00:00:00:02", "services": ["sto01"]},
+        ],
+    )
+    (tmp_path / "hosts").mkdir()
+    (tmp_path / "notes.txt").write_text("not a manifest")
+    return tmp_path
+
+
+def test_from_directory(sites: pathlib.Path) -> None:
+    """Test loading every manifest in a directory keyed by site."""
+    dbs = HostDbSet.from_directory(sites, max_workers=2)
+    assert list(dbs) == ["east.example.com", "west.example.com"]
+    assert dbs["west.example.com"].hosts["friend"].ip == "10.1.0.1"
+    assert dbs.files == [sites / "east.yaml", sites / "west.yaml"]
+
+    assert [entry.site for entry in dbs.machines_by_ip("10.0.0.1")] == [
+        "east.example.com"
+    ]
+    (entry,) = dbs.machines_by_mac("02-00-00-00-00-02")
+    assert entry == SiteMachine(
+        "west.example.com", dbs["west.example.com"].hosts["latin"]
+    )
+    assert len(dbs.machines_by_alias("rtr01.prod")) == 1
+    assert dbs.machines_by_alias("rtr01") == []
+
+    assert dbs.check().valid
+    dbs.validate()
+
+
+def test_cross_site_duplicates(sites: pathlib.Path) -> None:
+    """Test that addresses and aliases reused by another site are reported."""
+    _write_site(
+        sites,
+        "north",
+        "prod",
+        [
+            {
+                "host": "tango",
+                "ip": "10.0.0.1",
+                "mac": "02:00:00:00:00:02",
+                "services": ["sto01", "sto01"],
+            },
+        ],
+    )
+    dbs = HostDbSet.from_directory(sites, max_workers=1)
+    report = dbs.check()
+    assert [issue.issue_type for issue in report.issues] == [
+        IssueType.DUPLICATE_SERVICE,
+        IssueType.DUPLICATE_IP,
+        IssueType.DUPLICATE_MAC,
+        IssueType.DUPLICATE_SERVICE,
+    ]
+    assert report.issues[0].message.startswith("north.example.com: Duplicate service")
+    assert str(report.issues[1]) == (
+        "Duplicate IP across sites 'east.example.com/friend', "
+        "'north.example.com/tango': 10.0.0.1"
+    )
+    with pytest.raises(HostDbConfigError, match="4 validation issues"):
+        dbs.validate()
+
+
+def test_duplicate_site(sites: pathlib.Path) -> None:
+    """Test that two manifests for the same site are rejected."""
+    (sites / "copy.yaml").write_text((sites / "east.yaml").read_text())
+    with pytest.raises(HostDbConfigError, match="Duplicate site 'east.example.com'"):
+        HostDbSet.from_directory(sites)
+
+
+def test_load_error(sites: pathlib.Path) -> None:
+    """Test that a manifest that fails to load in a worker raises."""
+    (sites / "broken.yaml").write_text("machines: [")
+    with pytest.raises(HostDbException, match="broken.yaml"):
+        HostDbSet.from_directory(sites, max_workers=2)
+
+
+def test_empty_directory(tmp_path: pathlib.Path) -> None:
+    """Test loading a directory without manifests."""
+    with pytest.raises(HostDbException, match="No manifests found"):
+        HostDbSet.from_directory(tmp_path)
+    with pytest.raises(HostDbException, match="does not exist"):
+        HostDbSet.from_directory(tmp_path / "missing")
+
+
+def test_cached_sites_not_parsed(
+    sites: pathlib.Path, tmp_path_factory: pytest.TempPathFactory, monkeypatch
+) -> None:
+    """Test that only manifests changed since they were cached are parsed."""
+    cache_dir = tmp_path_factory.mktemp("sites-cache")
+    HostDbSet.from_directory(sites, cache_dir=cache_dir, max_workers=2)
+
+    loaded = []
+    load = federation._load
+
+    def tracking_load(path: pathlib.Path, cache_dir: pathlib.Path | None):
+        loaded.append(path.name)
+        return load(path, cache_dir)
+
+    monkeypatch.setattr(federation, "_load", tracking_load)
+    west = sites / "west.yaml"
+    west.write_text(west.read_text().replace("10.1.0.1", "10.1.0.2"))
+    dbs = HostDbSet.from_directory(sites, cache_dir=cache_dir, max_workers=2)
+    assert loaded == ["west.yaml"]
+    assert list(dbs) == ["east.example.com", "west.example.com"]
+    assert dbs["west.example.com"].hosts["friend"].ip == "10.1.0.2"
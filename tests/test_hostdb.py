@@ -1,11 +1,14 @@
 """Tests for hostdb."""
 
+import asyncio
 import pathlib
+import shutil
 
 import pytest
 
+from hostdb import hostdb as hostdb_module
 from hostdb.exceptions import HostDbException
-from hostdb.hostdb import HostDb
+from hostdb.hostdb import HostDb, iter_machines, machine_locations
 from hostdb.manifest import Machine, Manifest
 
 EXAMPLES = pathlib.Path.cwd() / pathlib.Path("examples")
@@ -106,3 +109,203 @@ def test_include_invalid_file(fixed_seed) -> None:
         HostDbException, match=r"includes_invalid/missing.yaml' does not exist"
     ):
         HostDb.from_yaml(INCLUDES_INVALID_CONFIG)
+
+
+def test_includes_config_parallel() -> None:
+    """Exercises reading included files concurrently."""
+
+    db = HostDb.from_yaml(INCLUDES_CONFIG, parallel=True)
+    assert list(db.hostnames) == ["friend", "lagoon", "latin"]
+    assert db.services == {"rtr01": "friend", "sto01": "lagoon"}
+    assert db.manifest.hardware_labels == ["nvidia_gpu", "intel_gpu", "edgeos"]
+
+
+def test_include_invalid_file_parallel() -> None:
+    """Exercises reading a missing included file concurrently."""
+    with pytest.raises(
+        HostDbException, match=r"includes_invalid/missing.yaml' does not exist"
+    ):
+        HostDb.from_yaml(INCLUDES_INVALID_CONFIG, parallel=True)
+
+
+@pytest.mark.parametrize(
+    ("config"),
+    [EXAMPLE_CONFIG, INCLUDES_CONFIG],
+)
+def test_iter_machines(config: pathlib.Path) -> None:
+    """Exercises streaming machines from a manifest."""
+    machines = list(iter_machines(config))
+    assert machines == HostDb.from_yaml(config).manifest.machines
+    assert [machine.host for machine in machines] == ["friend", "lagoon", "latin"]
+    assert machines[0].services == ["rtr01"]
+
+
+def test_iter_machines_empty(tmp_path: pathlib.Path) -> None:
+    """Exercises streaming machines from a manifest without any machines."""
+    config = tmp_path / "manifest.yaml"
+    config.write_text("site:\n  domain: example.com\nmachines:\n")
+    assert list(iter_machines(config)) == []
+
+
+def test_iter_machines_invalid() -> None:
+    """Exercises streaming machines from a manifest with a missing include."""
+    with pytest.raises(HostDbException, match=r"does not exist"):
+        list(iter_machines(INCLUDES_INVALID_CONFIG))
+
+
+def test_machine_locations() -> None:
+    """Exercises finding the source line of each machine."""
+    locations = machine_locations(INCLUDES_CONFIG)
+    assert [location.line for location in locations] == [2, 8, 15]
+    assert all(location.file.endswith("machines.yaml") for location in locations)
+
+
+def test_locations_recorded(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Exercises recording the machine locations while parsing the manifest."""
+    expected = machine_locations(INCLUDES_CONFIG)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Locations should be recorded while parsing")
+
+    monkeypatch.setattr(hostdb_module, "machine_locations", fail)
+    db = HostDb.from_yaml(INCLUDES_CONFIG, locations=True)
+    assert db.locations == expected
+
+
+def test_indexed_queries() -> None:
+    """Exercises the secondary indexes for looking up machines."""
+    manifest = Manifest(
+        machines=[
+            Machine(
+                host="friend",
+                ip="10.0.1.1",
+                mac="00:11:22:33:44:55",
+                services=["rtr01", "kapi01"],
+                hardware_labels=["edgeos"],
+            ),
+            Machine(
+                host="lagoon",
+                ip="10.0.0.10",
+                mac="00-11-22-33-44-AA",
+                services=["kapi02"],
+                hardware_labels=["nvidia_gpu", "edgeos"],
+            ),
+            Machine(host="latin", ip="fd00::0001"),
+            Machine(host="linear", ip="10.0.0.200", services=["kapi03"]),
+            Machine(host="retired"),
+        ],
+        service_types=["rtr", "kapi"],
+    )
+    db = HostDb(manifest)
+
+    assert db.machine_by_ip("10.0.1.1").host == "friend"
+    assert db.machine_by_ip("fd00::1").host == "latin"
+    assert db.machine_by_ip("10.0.0.1") is None
+    assert db.machine_by_mac("00:11:22:33:44:aa").host == "lagoon"
+    assert db.machine_by_mac("0011.2233.4455").host == "friend"
+    assert db.machine_by_mac("00:00:00:00:00:00") is None
+
+    assert db.hosts_with_label("edgeos") == ["friend", "lagoon"]
+    assert db.hosts_with_label("intel_gpu") == []
+    assert db.hosts_with_service_type("kapi") == ["friend", "lagoon", "linear"]
+    assert db.hosts_with_service_type("sto") == []
+
+    # Results are copies that callers may modify
+    db.hosts_with_label("edgeos").append("other")
+    db.hosts_with_service_type("kapi").clear()
+    assert db.hosts_with_label("edgeos") == ["friend", "lagoon"]
+    assert db.hosts_with_service_type("kapi") == ["friend", "lagoon", "linear"]
+
+    assert [m.host for m in db.machines_in_network("10.0.0.0/24")] == [
+        "lagoon",
+        "linear",
+    ]
+    assert [m.host for m in db.machines_in_network("10.0.0.0/16")] == [
+        "lagoon",
+        "linear",
+        "friend",
+    ]
+    assert [m.host for m in db.machines_in_network("fd00::/64")] == ["latin"]
+    assert [m.host for m in db.machines_in_range("10.0.0.10", "10.0.1.1")] == [
+        "lagoon",
+        "linear",
+        "friend",
+    ]
+    with pytest.raises(HostDbException, match=r"Invalid network"):
+        db.machines_in_network("not-a-network")
+
+
+def test_allocate_services() -> None:
+    """Test allocating service names of the manifest service types."""
+    db = HostDb(
+        Manifest(
+            service_types=["sto", "kapi"],
+            machines=[
+                Machine(host="friend", services=["sto01", "sto04"]),
+                Machine(host="lagoon", services=["sto02"]),
+            ],
+        )
+    )
+    assert db.allocate_services("sto") == ["sto05"]
+    assert db.allocate_services("sto", 3, fill_gaps=True) == [
+        "sto03",
+        "sto05",
+        "sto06",
+    ]
+    assert db.allocate_services("kapi", 2) == ["kapi01", "kapi02"]
+    with pytest.raises(HostDbException, match="not defined in service_types"):
+        db.allocate_services("rtr")
+    with pytest.raises(HostDbException, match="must be at least 1: 0"):
+        db.allocate_services("sto", 0)
+
+
+def test_watch(tmp_path: pathlib.Path) -> None:
+    """Test publishing a new snapshot when an included file changes."""
+    shutil.copytree(INCLUDES_CONFIG.parent, tmp_path, dirs_exist_ok=True)
+    config = tmp_path / "manifest.yaml"
+    machines = tmp_path / "machines.yaml"
+
+    async def run() -> None:
+        updates = HostDb.watch(config, interval=0.01, debounce=0.01)
+        async with asyncio.timeout(10):
+            update = await anext(updates)
+            assert list(update.db.hostnames) == ["friend", "lagoon", "latin"]
+            assert [m.host for m in update.diff.added] == ["friend", "lagoon", "latin"]
+            first = update.db
+
+            text = machines.read_text()
+            machines.write_text(
+                text.replace("---\n", "---\n- host: tango\n").replace("sto01", "sto02")
+            )
+            update = await anext(updates)
+
+            # Broken edits are skipped until the file is fixed
+            machines.write_text("- host: [")
+            await asyncio.sleep(0.05)
+            machines.write_text("---\n- host: tango\n")
+            final = await anext(updates)
+        await updates.aclose()
+
+        assert list(update.db.hostnames) == ["tango", "friend", "lagoon", "latin"]
+        assert [m.host for m in update.diff.added] == ["tango"]
+        assert update.diff.removed == []
+        assert [(old.services, new.services) for old, new in update.diff.changed] == [
+            (["sto01"], ["sto02"])
+        ]
+        assert list(first.hostnames) == ["friend", "lagoon", "latin"]
+
+        assert list(final.db.hostnames) == ["tango"]
+        assert [m.host for m in final.diff.removed] == ["friend", "lagoon", "latin"]
+
+    asyncio.run(run())
+
+
+def test_watch_invalid() -> None:
+    """Test that the first load of a watched manifest raises errors."""
+
+    async def run() -> None:
+        async for _ in HostDb.watch(INVALID_CONFIG):
+            pass
+
+    with pytest.raises(HostDbException, match="Could not"):
+        asyncio.run(run())
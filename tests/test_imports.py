@@ -0,0 +1,59 @@
+"""Tests for the start up cost of the hostdb command."""
+
+import pathlib
+import subprocess
+import sys
+
+EXAMPLE_CONFIG = pathlib.Path.cwd() / pathlib.Path("examples/manifest.yaml")
+
+# Packages that are slow to import and only needed by some commands
+LAZY_PACKAGES = {"yaml", "mashumaro", "asyncio", "ansible"}
+
+# Budget for the cumulative import time of the command line tool, which is
+# several times what it takes today to avoid flaky failures on slow machines.
+IMPORT_BUDGET_US = 100_000
+
+
+def _import_times(statement: str) -> dict[str, int]:
+    """Return the cumulative import time in microseconds of each module imported."""
+    # Run once first so that compiling bytecode is not measured
+    subprocess.run([sys.executable, "-c", statement], check=True)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    times: dict[str, int] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        (_, cumulative, module) = line.removeprefix("import time:").split("|")
+        times[module.strip()] = int(cumulative)
+    return times
+
+
+def test_cli_import_time() -> None:
+    """Test that importing the command line tool does not load heavy packages."""
+    times = _import_times("import hostdb.tool.main")
+    loaded = {module.split(".")[0] for module in times}
+    assert not loaded & LAZY_PACKAGES
+    assert times["hostdb.tool.main"] < IMPORT_BUDGET_US, sorted(
+        times.items(), key=lambda item: -item[1]
+    )[:10]
+
+
+def test_cache_hit_skips_parser(tmp_path: pathlib.Path) -> None:
+    """Test that loading a cached manifest does not import the YAML parser."""
+    statement = (
+        "import pathlib, sys\n"
+        "from hostdb.hostdb import HostDb\n"
+        f"db = HostDb.from_yaml(pathlib.Path({str(EXAMPLE_CONFIG)!r}),"
+        f" cache_dir=pathlib.Path({str(tmp_path)!r}))\n"
+        "print(sorted({m.split('.')[0] for m in sys.modules} & {'yaml', 'mashumaro'}))"
+    )
+    subprocess.run([sys.executable, "-c", statement], check=True)
+    result = subprocess.run(
+        [sys.executable, "-c", statement], check=True, capture_output=True, text=True
+    )
+    assert result.stdout.strip() == "[]"
@@ -0,0 +1,250 @@
+"""Tests for the ansible inventory plugin."""
+
+import pathlib
+import shutil
+
+import pytest
+import yaml
+from ansible.errors import AnsibleParserError
+from ansible.inventory.data import InventoryData
+from ansible.parsing.dataloader import DataLoader
+from ansible.plugins.loader import init_plugin_loader, inventory_loader
+from ansible.utils.collection_loader import AnsibleCollectionConfig
+
+from hostdb import inventory as inventory_module
+from hostdb.inventory import InventoryModule
+
+TESTDATA = pathlib.Path.cwd() / pathlib.Path("tests/testdata")
+INCLUDES_DIR = TESTDATA / "includes"
+PLUGIN_DIR = pathlib.Path.cwd() / "examples/ansible/inventory_plugins"
+
+
+@pytest.fixture(autouse=True, scope="module")
+def plugin_loader() -> None:
+    """Fixture to make the plugin and builtin collections discoverable."""
+    if AnsibleCollectionConfig.collection_finder is None:
+        init_plugin_loader()
+    inventory_loader.add_directory(str(PLUGIN_DIR))
+
+
+@pytest.fixture(name="manifest")
+def manifest_fixture(tmp_path: pathlib.Path) -> pathlib.Path:
+    """Fixture that returns a writable copy of a manifest with includes."""
+    shutil.copytree(INCLUDES_DIR, tmp_path / "includes")
+    return tmp_path / "includes" / "manifest.yaml"
+
+
+@pytest.fixture(name="inventory_file")
+def inventory_file_fixture(tmp_path: pathlib.Path, manifest: pathlib.Path) -> str:
+    """Fixture that returns an inventory source using a json file cache."""
+    inventory_file = tmp_path / "inventory.yaml"
+    inventory_file.write_text(
+        "\n".join(
+            [
+                "---",
+                "plugin: hostdb",
+                f"manifest: {manifest}",
+                "cache: true",
+                "cache_plugin: ansible.builtin.jsonfile",
+                f"cache_connection: {tmp_path / 'inventory-cache'}",
+                "",
+            ]
+        )
+    )
+    return str(inventory_file)
+
+
+def _parse(inventory_file: str, cache: bool = True) -> InventoryData:
+    """Parse the inventory source with a new plugin instance."""
+    plugin = inventory_loader.get("hostdb")
+    inventory = InventoryData()
+    plugin.parse(inventory, DataLoader(), inventory_file, cache=cache)
+    plugin.update_cache_if_changed()
+    return inventory
+
+
+def test_parse(inventory_file: str) -> None:
+    """Test the groups and host variables in the inventory."""
+    inventory = _parse(inventory_file, cache=False)
+    assert set(inventory.groups) == {"all", "ungrouped", "rtr", "sto"}
+    assert [host.name for host in inventory.groups["rtr"].get_hosts()] == ["rtr01.prod"]
+    host_vars = inventory.hosts["sto01.prod"].vars
+    assert host_vars["manifest_host"] == "lagoon"
+    assert host_vars["ip"] == "192.168.1.10"
+    assert host_vars["services"] == ["sto01"]
+
+
+def test_cache(
+    inventory_file: str, manifest: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test the inventory is served from the cache until the manifest changes."""
+    _parse(inventory_file)
+
+    build_inventory = InventoryModule._build_inventory
+    calls = []
+
+    def tracking_build(self):
+        calls.append(self)
+        return build_inventory(self)
+
+    monkeypatch.setattr(InventoryModule, "_build_inventory", tracking_build)
+
+    inventory = _parse(inventory_file)
+    assert not calls
+    assert inventory.hosts["rtr01.prod"].vars["manifest_host"] == "friend"
+
+    machines = manifest.parent / "machines.yaml"
+    machines.write_text(machines.read_text().replace("rtr01", "rtr02"))
+    inventory = _parse(inventory_file)
+    assert len(calls) == 1
+    assert "rtr02.prod" in inventory.hosts
+    assert "rtr01.prod" not in inventory.hosts
+
+    inventory = _parse(inventory_file)
+    assert len(calls) == 1
+    assert "rtr02.prod" in inventory.hosts
+
+
+def test_manifest_cache_disabled(
+    inventory_file: str, monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path
+) -> None:
+    """Test that the manifest cache can be turned off."""
+    cache_dir = tmp_path / "manifest-cache"
+    monkeypatch.setenv("HOSTDB_CACHE_DIR", str(cache_dir))
+    _parse(inventory_file, cache=False)
+    assert any(cache_dir.iterdir())
+
+    shutil.rmtree(cache_dir)
+    with open(inventory_file, "a") as fd:
+        fd.write("manifest_cache: false\n")
+    inventory = _parse(inventory_file, cache=False)
+    assert "rtr01.prod" in inventory.hosts
+    assert not cache_dir.exists()
+
+
+def test_manifest_directory(tmp_path: pathlib.Path, manifest: pathlib.Path) -> None:
+    """Test an inventory built from a directory with a manifest for each site."""
+    sites = tmp_path / "sites"
+    sites.mkdir()
+    (sites / "lax.yaml").write_text(
+        manifest.read_text().replace("!include ", f"!include {manifest.parent}/")
+    )
+    (sites / "sfo.yaml").write_text(
+        yaml.dump(
+            {
+                "site": {"domain": "sfo.example.com", "env": "dev"},
+                "service_types": ["rtr"],
+                "machines": [
+                    {"host": "friend", "ip": "10.0.0.1", "services": ["rtr01"]}
+                ],
+            }
+        )
+    )
+    inventory_file = tmp_path / "sites.yaml"
+    inventory_file.write_text(f"---\nplugin: hostdb\nmanifest: {sites}\n")
+
+    inventory = _parse(str(inventory_file), cache=False)
+    assert sorted(host.name for host in inventory.groups["rtr"].get_hosts()) == [
+        "rtr01.dev",
+        "rtr01.prod",
+    ]
+    assert inventory.hosts["rtr01.dev"].vars["ip"] == "10.0.0.1"
+    assert inventory.hosts["rtr01.prod"].vars["ip"] == "192.168.1.1"
+
+    # The same environment in both sites reuses the service alias
+    (sites / "sfo.yaml").write_text(
+        (sites / "sfo.yaml").read_text().replace("env: dev", "env: prod")
+    )
+    with pytest.raises(AnsibleParserError, match="Duplicate service alias"):
+        _parse(str(inventory_file), cache=False)
+
+
+def test_manifest_glob(
+    tmp_path: pathlib.Path, manifest: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test a glob of manifests where only changed sites are rebuilt."""
+    sites = tmp_path / "sites"
+    for env in ("dev", "prod", "test"):
+        (sites / env).mkdir(parents=True)
+        (sites / env / "manifest.yaml").write_text(
+            yaml.dump(
+                {
+                    "site": {"domain": f"{env}.example.com", "env": env},
+                    "service_types": ["rtr"],
+                    "machines": [{"host": "friend", "services": ["rtr01"]}],
+                }
+            )
+        )
+    inventory_file = tmp_path / "sites.yaml"
+    inventory_file.write_text(
+        "\n".join(
+            [
+                "---",
+                "plugin: hostdb",
+                f"manifest: {sites}/*/manifest.yaml",
+                "cache: true",
+                "cache_plugin: ansible.builtin.jsonfile",
+                f"cache_connection: {tmp_path / 'inventory-cache'}",
+                "",
+            ]
+        )
+    )
+    inventory = _parse(str(inventory_file))
+    assert [host.name for host in inventory.groups["rtr"].get_hosts()] == [
+        "rtr01.dev",
+        "rtr01.prod",
+        "rtr01.test",
+    ]
+
+    site_inventory = inventory_module._site_inventory
+    rebuilt = []
+
+    def tracking_site_inventory(db):
+        rebuilt.append(db.manifest.site.env)
+        return site_inventory(db)
+
+    monkeypatch.setattr(inventory_module, "_site_inventory", tracking_site_inventory)
+    prod = sites / "prod" / "manifest.yaml"
+    prod.write_text(prod.read_text().replace("host: friend", "host: lagoon"))
+    inventory = _parse(str(inventory_file))
+    assert rebuilt == ["prod"]
+    assert inventory.hosts["rtr01.prod"].vars["manifest_host"] == "lagoon"
+    assert inventory.hosts["rtr01.dev"].vars["manifest_host"] == "friend"
+
+    inventory = _parse(str(inventory_file))
+    assert rebuilt == ["prod"]
+    assert len(inventory.groups["rtr"].hosts) == 3
+
+
+def test_benchmark_service_aliases(tmp_path: pathlib.Path) -> None:
+    """Benchmark building an inventory with 50k service aliases."""
+    service_types = [f"svc{chr(ord('a') + i)}" for i in range(10)]
+    machines = [
+        {
+            "host": f"host{i}",
+            "ip": f"10.0.{i >> 8}.{i & 255}",
+            "services": [f"{service_type}{i:05d}" for service_type in service_types],
+        }
+        for i in range(5_000)
+    ]
+    manifest = tmp_path / "manifest.yaml"
+    manifest.write_text(
+        yaml.dump(
+            {"service_types": service_types, "machines": machines},
+            Dumper=yaml.CSafeDumper,
+        )
+    )
+    inventory_file = tmp_path / "inventory.yaml"
+    inventory_file.write_text(f"---\nplugin: hostdb\nmanifest: {manifest}\n")
+
+    inventory = _parse(str(inventory_file), cache=False)
+
+    assert len(inventory.hosts) == 50_000
+    assert len(inventory.groups["svca"].hosts) == 5_000
+    host_vars = inventory.hosts["svcj04999"].vars
+    assert host_vars["manifest_host"] == "host4999"
+    assert host_vars["ip"] == "10.0.19.135"
+    assert host_vars["services"] == [f"{svc}04999" for svc in service_types]
+    assert inventory.hosts["svca04999"].vars["services"] == host_vars["services"]
+    # Aliases of a machine do not share lists with each other
+    assert host_vars["services"] is not inventory.hosts["svca04999"].vars["services"]
@@ -0,0 +1,133 @@
+"""Tests for allocating IP addresses."""
+
+import ipaddress
+
+import pytest
+
+from hostdb.exceptions import HostDbException
+from hostdb.hostdb import HostDb
+from hostdb.ipam import SubnetPool, allocate_ips, subnet_pool
+from hostdb.manifest import Machine, Manifest, Network
+
+
+def _db(machines: list[Machine], networks: list[Network]) -> HostDb:
+    """Return a HostDb with the machines and networks."""
+    return HostDb(Manifest(machines=machines, network=networks))
+
+
+NETWORK = Network(
+    subnet="192.168.1.0/24",
+    gateway="192.168.1.1",
+    nameserver=["192.168.1.2", "8.8.8.8"],
+)
+
+
+def test_allocate_ips() -> None:
+    """Test allocating the lowest addresses not used by machines or the network."""
+    db = _db(
+        [
+            Machine(host="friend", ip="192.168.1.3"),
+            Machine(host="lagoon", ip="192.168.1.5"),
+            Machine(host="latin"),
+            Machine(host="outside", ip="10.0.0.4"),
+        ],
+        [NETWORK],
+    )
+    assert allocate_ips(db, 3) == ["192.168.1.4", "192.168.1.6", "192.168.1.7"]
+    assert allocate_ips(db, 2, contiguous=True) == ["192.168.1.6", "192.168.1.7"]
+
+    pool = subnet_pool(db)
+    # Everything but the network, broadcast, gateway, nameserver and two machines
+    assert pool.free == 256 - 6
+    pool.reserve(int(ipaddress.ip_address("192.168.1.4")))
+    assert pool.allocate(1) == ["192.168.1.6"]
+    assert pool.free == 256 - 8
+    assert pool.allocate(248)[-1] == "192.168.1.254"
+    with pytest.raises(HostDbException, match="only 0 addresses are free"):
+        pool.allocate(1)
+
+
+def test_contiguous_block() -> None:
+    """Test that a block is taken from the first gap large enough."""
+    used = [int(ipaddress.ip_address(f"10.0.0.{i}")) for i in (0, 3, 6, 7, 255)]
+    pool = SubnetPool(ipaddress.ip_network("10.0.0.0/24"), used)
+    assert pool.allocate(3, contiguous=True) == ["10.0.0.8", "10.0.0.9", "10.0.0.10"]
+    assert pool.allocate(2, contiguous=True) == ["10.0.0.1", "10.0.0.2"]
+    with pytest.raises(HostDbException, match="300 contiguous addresses"):
+        pool.allocate(300, contiguous=True)
+    for count in (0, -1):
+        with pytest.raises(HostDbException, match="must be at least 1"):
+            pool.allocate(count)
+        with pytest.raises(HostDbException, match="must be at least 1"):
+            pool.allocate(count, contiguous=True)
+
+
+def test_fragmented_pool() -> None:
+    """Test allocating and reserving across many single address intervals."""
+    used = [
+        int(ipaddress.ip_address(f"10.0.{i >> 8}.{i & 255}")) for i in range(0, 4096, 2)
+    ]
+    pool = SubnetPool(ipaddress.ip_network("10.0.0.0/20"), used)
+    assert pool.free == 2048
+    assert pool.allocate(3) == ["10.0.0.1", "10.0.0.3", "10.0.0.5"]
+    assert [pool.allocate(1)[0] for _ in range(1000)][-1] == "10.0.7.213"
+    pool.reserve(int(ipaddress.ip_address("10.0.7.215")))
+    pool.reserve(int(ipaddress.ip_address("10.0.7.215")))
+    pool.reserve(int(ipaddress.ip_address("10.0.0.1")))
+    assert pool.free == 2048 - 1003 - 1
+    assert pool.allocate(1) == ["10.0.7.217"]
+    with pytest.raises(HostDbException, match="2 contiguous addresses"):
+        pool.allocate(2, contiguous=True)
+    addresses = pool.allocate(pool.free)
+    assert addresses[0] == "10.0.7.219"
+    assert addresses[-1] == "10.0.15.255"
+    assert pool.free == 0
+
+
+def test_reserve_within_interval() -> None:
+    """Test reserving the ends and the middle of a free interval."""
+    pool = SubnetPool(ipaddress.ip_network("10.0.0.0/29"))
+    for address in (0, 7, 3):
+        pool.reserve(int(ipaddress.ip_address(f"10.0.0.{address}")))
+    assert pool.free == 5
+    assert pool.allocate(3, contiguous=True) == ["10.0.0.4", "10.0.0.5", "10.0.0.6"]
+    assert pool.allocate(2) == ["10.0.0.1", "10.0.0.2"]
+
+
+def test_subnet_required() -> None:
+    """Test choosing between several networks."""
+    db = _db(
+        [Machine(host="friend", ip="10.0.0.1")],
+        [NETWORK, Network(subnet="10.0.0.0/31", gateway="10.0.0.0")],
+    )
+    with pytest.raises(HostDbException, match="A subnet is required"):
+        allocate_ips(db, 1)
+    with pytest.raises(HostDbException, match="only 0 addresses are free"):
+        allocate_ips(db, 1, subnet="10.0.0.0/31")
+    assert allocate_ips(db, 1, subnet="10.0.1.0/24") == ["10.0.1.1"]
+    with pytest.raises(HostDbException, match="Invalid network"):
+        allocate_ips(db, 1, subnet="10.0.1.0/33")
+
+
+def test_ipv6() -> None:
+    """Test allocating from an IPv6 network."""
+    db = _db(
+        [Machine(host="friend", ip="2001:db8::1")],
+        [Network(subnet="2001:db8::/64", gateway="2001:db8::2")],
+    )
+    assert allocate_ips(db, 2) == ["2001:db8::3", "2001:db8::4"]
+
+
+def test_large_subnet() -> None:
+    """Test allocating from a /16 with 60k machines and the last gap free."""
+    machines = [
+        Machine(host=f"host{i}", ip=f"10.0.{i >> 8}.{i & 255}")
+        for i in range(1, 60_000)
+    ]
+    db = _db(machines, [Network(subnet="10.0.0.0/16", gateway="10.0.0.1")])
+    pool = subnet_pool(db)
+    addresses = [pool.allocate(1)[0] for _ in range(1000)]
+    assert addresses[0] == "10.0.234.96"
+    assert addresses[-1] == "10.0.238.71"
+    assert len(set(addresses)) == 1000
+    assert pool.free == 65536 - 60_000 - 1 - 1000
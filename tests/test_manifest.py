@@ -0,0 +1,127 @@
+"""Tests for the manifest definitions and service index."""
+
+import gc
+
+import pytest
+
+from hostdb import manifest as manifest_module
+from hostdb.hostdb import HostDb
+from hostdb.manifest import (
+    Machine,
+    Manifest,
+    ServiceIndex,
+    ServiceName,
+    parse_service,
+)
+
+
+def test_parse_service() -> None:
+    """Test splitting service names into a type and serial."""
+    assert parse_service("sto01") == ServiceName("sto", 1, 2)
+    assert parse_service("kube-api0010") == ServiceName("kube-api", 10, 4)
+    assert parse_service("www") is None
+    assert parse_service("01") is None
+
+
+def test_service_index() -> None:
+    """Test the services and groups of the machines."""
+    index = ServiceIndex(
+        [
+            Machine(host="friend", services=["rtr01", "www"]),
+            Machine(host="lagoon", services=["sto02", "sto01"]),
+            Machine(host="latin", services=["rtr01"]),
+        ]
+    )
+    assert index.hosts == {
+        "rtr01": "latin",
+        "www": "friend",
+        "sto02": "lagoon",
+        "sto01": "lagoon",
+    }
+    assert index.groups == {
+        "rtr": {"rtr01": "latin"},
+        "sto": {"sto02": "lagoon", "sto01": "lagoon"},
+    }
+    assert index.names["www"] is None
+    assert index.parse("sto02") == ServiceName("sto", 2, 2)
+    assert index.parse("kapi007") == ServiceName("kapi", 7, 3)
+    assert index.serials("sto") == [1, 2]
+    assert index.serials("kapi") == []
+
+
+def test_mutated_manifest() -> None:
+    """Test that the shared index follows changes to the machines."""
+    manifest = Manifest(
+        service_types=["kapi"],
+        machines=[Machine(host="friend", services=["kapi01"])],
+    )
+    assert HostDb(manifest).services == {"kapi01": "friend"}
+
+    manifest.machines.append(Machine(host="lagoon", services=["kapi02"]))
+    db = HostDb(manifest)
+    assert db.services == {"kapi01": "friend", "kapi02": "lagoon"}
+    assert db.service_groups == {"kapi": {"kapi01": "friend", "kapi02": "lagoon"}}
+    assert db.allocate_services("kapi") == ["kapi03"]
+
+    manifest.machines[0].services = ["kapi07"]
+    assert HostDb(manifest).allocate_services("kapi") == ["kapi08"]
+
+
+def test_shared_per_manifest() -> None:
+    """Test that HostDb and validation share the index of a manifest."""
+    manifest = Manifest(
+        service_types=["sto"], machines=[Machine(host="lagoon", services=["sto01"])]
+    )
+    index = ServiceIndex.for_manifest(manifest)
+    assert HostDb(manifest).service_index is index
+    assert ServiceIndex.for_manifest(Manifest(machines=manifest.machines)) is not index
+
+    key = id(manifest)
+    assert key in manifest_module._MANIFEST_SERVICES
+    del manifest
+    gc.collect()
+    assert key not in manifest_module._MANIFEST_SERVICES
+
+
+def test_next_serials() -> None:
+    """Test appending after the highest serial and filling gaps."""
+    index = ServiceIndex(
+        [Machine(host="a", services=["sto02", "sto03", "sto05", "sto09", "sto00"])]
+    )
+    assert index.next_serials("sto") == [10]
+    assert index.next_serials("sto", 3) == [10, 11, 12]
+    assert index.next_serials("sto", 4, fill_gaps=True) == [1, 4, 6, 7]
+    assert index.next_serials("sto", 1, fill_gaps=True, start=2) == [4]
+    assert index.next_serials("sto", 2, fill_gaps=True, start=20) == [20, 21]
+    assert index.next_serials("sto", 2, start=20) == [20, 21]
+    assert index.next_serials("kapi", 2) == [1, 2]
+    assert index.next_serials("kapi", 2, fill_gaps=True) == [1, 2]
+    for count in (0, -1):
+        with pytest.raises(ValueError, match="must be at least 1"):
+            index.next_serials("sto", count)
+        with pytest.raises(ValueError, match="must be at least 1"):
+            index.next_serials("sto", count, fill_gaps=True)
+
+
+def test_next_serial_large() -> None:
+    """Test finding the first gap among 100k serials."""
+    services = [f"kapi{i:06d}" for i in range(1, 100_001) if i != 99_999]
+    index = ServiceIndex([Machine(host="a", services=services)])
+    for _ in range(2):
+        assert index.next_serials("kapi", fill_gaps=True) == [99_999]
+    assert index.next_serials("kapi", 2, fill_gaps=True) == [99_999, 100_001]
+    assert index.next_serials("kapi") == [100_001]
+
+
+def test_next_services() -> None:
+    """Test that new service names keep the zero padding of the type."""
+    index = ServiceIndex(
+        [Machine(host="a", services=["sto01", "sto03", "kapi0009", "kapi010"])]
+    )
+    assert index.serial_width("sto") == 2
+    assert index.serial_width("kapi") == 4
+    assert index.serial_width("rtr") == 2
+    assert index.next_services("sto", 2) == ["sto04", "sto05"]
+    assert index.next_services("sto", 2, fill_gaps=True) == ["sto02", "sto04"]
+    assert index.next_services("kapi") == ["kapi0011"]
+    assert index.next_services("rtr", 2) == ["rtr01", "rtr02"]
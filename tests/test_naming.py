@@ -1,23 +1,135 @@
 """Tests for the hostname allocation logic."""
 
+import pathlib
 import random
 
 import pytest
 
-from hostdb.naming import allocate_hostnames
+from hostdb.exceptions import HostDbException
+from hostdb.naming import (
+    Chain,
+    Combination,
+    NameSpace,
+    ReservationLedger,
+    WordList,
+    _wordlist,
+    allocate_hostnames,
+    allocate_names,
+)
 
 
 @pytest.mark.parametrize(
     ("allocated", "expected"),
     [
-        ({}, ["exile", "friend", "falcon", "lagoon", "earth"]),
-        ({"linear"}, ["exile", "friend", "falcon", "lagoon", "earth"]),
-        ({"lagoon", "friend"}, ["exile", "frozen", "falcon", "laser", "earth"]),
+        ({}, ["agent", "prepare", "tape", "eagle", "finance"]),
+        ({"linear"}, ["agent", "prepare", "tape", "eagle", "finance"]),
+        ({"agent", "tape"}, ["prepare", "eagle", "finance", "roger", "water"]),
+        (["agent", "tape"], ["prepare", "eagle", "finance", "roger", "water"]),
     ],
 )
-def test_allocate_hostnames(
-    fixed_seed: None, allocated: set[str], expected: list[str]
-) -> None:
+def test_allocate_hostnames(allocated: set[str], expected: list[str]) -> None:
     """Exercising allocating hostnames."""
     hostnames = allocate_hostnames(allocated, 5, rand=random.Random(1))
     assert hostnames == expected
+
+
+def test_allocate_hostnames_honors_rand() -> None:
+    """Test that the random number generator passed in is used."""
+    first = allocate_hostnames({}, 5, rand=random.Random(2))
+    assert first == allocate_hostnames({}, 5, rand=random.Random(2))
+    assert first != allocate_hostnames({}, 5, rand=random.Random(3))
+
+
+def test_allocate_hostnames_nearly_exhausted() -> None:
+    """Test allocating when only a few names remain free."""
+    words = _wordlist()
+    allocated = set(words[3:])
+    hostnames = allocate_hostnames(allocated, 5, rand=random.Random(1))
+    assert sorted(hostnames) == sorted(words[:3])
+
+
+def test_name_spaces() -> None:
+    """Test addressing names in generated name spaces."""
+    adjectives = WordList(["brave", "quiet"])
+    nouns = WordList(["falcon", "lagoon", "river"])
+    combined = Combination(adjectives, nouns)
+    assert len(combined) == 6
+    assert list(combined) == [
+        "brave-falcon",
+        "brave-lagoon",
+        "brave-river",
+        "quiet-falcon",
+        "quiet-lagoon",
+        "quiet-river",
+    ]
+    assert combined[-1] == "quiet-river"
+
+    chain = Chain([adjectives, nouns, combined])
+    assert len(chain) == 11
+    assert chain[1] == "quiet"
+    assert chain[2] == "falcon"
+    assert chain[5] == "brave-falcon"
+    with pytest.raises(IndexError):
+        chain[11]
+
+    class Partial(NameSpace):
+        def __getitem__(self, index):  # type: ignore[override]
+            return "name"
+
+    with pytest.raises(TypeError):
+        Partial()  # type: ignore[abstract]
+
+
+def test_allocate_names_bulk() -> None:
+    """Test allocating many names from a combined space in one pass."""
+    words = WordList.default()
+    space = Combination(words, words)
+    names = allocate_names(space, {}, 500, rand=random.Random(1))
+    assert len(set(names)) == 500
+    assert all("-" in name for name in names)
+
+
+def test_allocate_names_nearly_exhausted() -> None:
+    """Test that a nearly exhausted space is not listed to find free names."""
+    lookups = 0
+
+    class Numbers(NameSpace):
+        def __getitem__(self, index):  # type: ignore[override]
+            nonlocal lookups
+            lookups += 1
+            return f"n{index}"
+
+        def __len__(self) -> int:
+            return 100_000
+
+    allocated = {f"n{index}" for index in range(100_000) if index % 1000}
+    names = allocate_names(Numbers(), allocated, 50, rand=random.Random(1))
+    assert len(set(names)) == 50
+    assert not set(names) & allocated
+    assert lookups < 100_000
+
+
+def test_allocate_names_exhausted() -> None:
+    """Test that an error is raised when not enough names are free."""
+    space = WordList(["alpha", "beta", "gamma"])
+    assert sorted(allocate_names(space, ["beta"], 2)) == ["alpha", "gamma"]
+    with pytest.raises(HostDbException, match=r"only 2 names are free"):
+        allocate_names(space, ["beta"], 3)
+    for count in (0, -1):
+        with pytest.raises(HostDbException, match="must be at least 1"):
+            allocate_names(space, ["beta"], count)
+        with pytest.raises(HostDbException, match="must be at least 1"):
+            allocate_hostnames([], count)
+
+
+def test_reservation_ledger(tmp_path: pathlib.Path) -> None:
+    """Test that reserved names are not handed out again."""
+    space = WordList(["alpha", "beta", "gamma", "delta"])
+    ledger = ReservationLedger(tmp_path / "ledger")
+    first = ledger.allocate(space, ["alpha"], 2)
+    assert ledger.reserved() == set(first)
+    second = ReservationLedger(tmp_path / "ledger").allocate(space, ["alpha"], 1)
+    assert set(first) | set(second) == {"beta", "gamma", "delta"}
+    with pytest.raises(HostDbException, match=r"only 0 names are free"):
+        ledger.allocate(space, ["alpha"], 1)
+    assert len(ledger.reserved()) == 3
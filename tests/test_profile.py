@@ -0,0 +1,105 @@
+"""Tests for the load and validate stage instrumentation."""
+
+import json
+import os
+import pathlib
+import sys
+
+import pytest
+
+from hostdb.hostdb import HostDb, validate
+from hostdb.profile import Profiler, StageEvent, stage
+
+TESTDATA = pathlib.Path("tests/testdata")
+INCLUDES_CONFIG = TESTDATA / "includes/manifest.yaml"
+
+
+def test_profile_stages() -> None:
+    """Test that each stage and included file is recorded."""
+    profiler = Profiler()
+    with profiler.activate():
+        db = HostDb.from_yaml(INCLUDES_CONFIG)
+        validate(db)
+
+    names = [event.name for event in profiler.events]
+    assert names.count("load") == 1
+    assert names.count("index") == 1
+    assert names.count("validate") == 1
+    assert names.count("decode") == 1
+    includes = {
+        pathlib.Path(event.file).name
+        for event in profiler.events
+        if event.name == "include" and event.file is not None
+    }
+    assert includes == {
+        "hardware_labels.yaml",
+        "machines.yaml",
+        "network.yaml",
+        "service_types.yaml",
+    }
+    parsed = {event.file for event in profiler.events if event.name == "parse"}
+    assert len(parsed) == 5
+    load = next(event for event in profiler.events if event.name == "load")
+    assert load.duration > 0
+    assert load.peak_rss > 0
+
+    summary = profiler.summary()
+    assert summary.splitlines()[0].startswith("stage")
+    assert "machines.yaml" in summary
+
+    trace = json.loads(json.dumps(profiler.chrome_trace()))
+    events = trace["traceEvents"]
+    assert len(events) == len(profiler.events)
+    assert {event["ph"] for event in events} == {"X"}
+    # Nested stages lie within the load stage
+    (outer,) = (event for event in events if event["name"] == "load")
+    for event in events:
+        if event["name"] not in ("load", "validate"):
+            assert outer["ts"] <= event["ts"]
+            assert event["ts"] + event["dur"] <= outer["ts"] + outer["dur"]
+
+
+def test_cache_stages(tmp_path: pathlib.Path) -> None:
+    """Test that a cache hit records no parsing."""
+    HostDb.from_yaml(INCLUDES_CONFIG, cache_dir=tmp_path)
+    profiler = Profiler()
+    with profiler.activate():
+        HostDb.from_yaml(INCLUDES_CONFIG, cache_dir=tmp_path)
+    assert [event.name for event in profiler.events] == ["cache_load", "index", "load"]
+
+
+def test_add_hook() -> None:
+    """Test that hooks are called until removed."""
+    events: list[StageEvent] = []
+    remove = HostDb.add_hook(events.append)
+    with stage("example", "file.yaml"):
+        pass
+    remove()
+    with stage("example"):
+        pass
+    assert [(event.name, event.file) for event in events] == [("example", "file.yaml")]
+
+
+def test_no_resource_module(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that stages are still recorded where peak RSS is not available."""
+    monkeypatch.setitem(sys.modules, "resource", None)
+    profiler = Profiler()
+    with profiler.activate(), stage("decode"):
+        pass
+    assert [event.peak_rss for event in profiler.events] == [0]
+
+
+def test_parallel_stages() -> None:
+    """Test that stages run in worker processes are recorded by the parent."""
+    profiler = Profiler()
+    with profiler.activate():
+        HostDb.from_yaml(INCLUDES_CONFIG, parallel=True)
+
+    parsed = [event for event in profiler.events if event.name == "parse"]
+    assert len({event.file for event in parsed}) == 5
+    assert os.getpid() not in {event.process_id for event in parsed}
+    load = next(event for event in profiler.events if event.name == "load")
+    assert load.process_id == os.getpid()
+
+    trace = profiler.chrome_trace()
+    assert len({event["pid"] for event in trace["traceEvents"]}) > 1
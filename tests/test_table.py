@@ -0,0 +1,125 @@
+"""Tests for the compact machine table."""
+
+import copy
+import pathlib
+import pickle
+import tracemalloc
+
+from hostdb.hostdb import HostDb, compact_manifest
+from hostdb.manifest import Machine, Manifest
+from hostdb.table import MachineTable
+
+EXAMPLE_CONFIG = pathlib.Path.cwd() / pathlib.Path("examples/manifest.yaml")
+
+MACHINES = [
+    Machine(
+        host="friend",
+        desc="Router",
+        ip="192.168.1.1",
+        mac="00:11:22:33:44:55",
+        services=["rtr01"],
+        hardware_labels=["edgeos"],
+    ),
+    Machine(host="lagoon", ip="fd00::10", services=["sto01"], hardware_labels=None),
+    Machine(host="latin", ip="10.0.0.01", mac="00-11-22-33-44-57"),
+    Machine(host="linear", services=None, hardware_labels=["nvidia_gpu", "intel_gpu"]),
+    Machine(host="lopez", hardware_labels=["intel_gpu", "nvidia_gpu", "new"]),
+]
+
+
+def test_round_trip() -> None:
+    """Test that the table returns machines equal to the ones added."""
+    table = MachineTable(MACHINES, ["nvidia_gpu", "intel_gpu", "edgeos"])
+    assert len(table) == len(MACHINES)
+    assert list(table) == MACHINES
+    assert table == MACHINES
+    assert table[0] == MACHINES[0]
+    assert table[-1] == MACHINES[-1]
+    assert table[1:3] == MACHINES[1:3]
+    assert pickle.loads(pickle.dumps(table)) == MACHINES
+
+
+def test_read_only() -> None:
+    """Test that changes to machines are not stored in the table."""
+    machines = copy.deepcopy(MACHINES[:2])
+    table = MachineTable(machines)
+    machines[1].services.append("sto02")
+    for machine in table:
+        machine.desc = "Changed"
+        machine.services.append("new01")
+    assert table == MACHINES[:2]
+
+
+def test_hostdb_on_table() -> None:
+    """Test that a HostDb built on a table answers the same as one on a list."""
+    manifest = Manifest(
+        service_types=["rtr", "sto"],
+        hardware_labels=["nvidia_gpu", "intel_gpu", "edgeos"],
+        machines=[
+            m
+            for m in MACHINES
+            if m.services is not None and m.hardware_labels is not None
+        ],
+    )
+    db = HostDb(manifest)
+    compact = HostDb(compact_manifest(manifest))
+    assert isinstance(compact.manifest.machines, MachineTable)
+    assert compact.hosts == db.hosts
+    assert list(compact.hostnames) == list(db.hostnames)
+    assert compact.hosts["latin"] == MACHINES[2]
+    assert "missing" not in compact.hosts
+    assert compact.service_groups == db.service_groups
+    assert compact.machine_by_mac("00:11:22:33:44:55") == MACHINES[0]
+    assert compact.machine_by_ip("10.0.0.01") == MACHINES[2]
+    assert compact.hosts_with_label("intel_gpu") == ["lopez"]
+    assert compact.machines_in_network("192.168.1.0/24") == [MACHINES[0]]
+
+
+def test_from_yaml_compact() -> None:
+    """Test loading a manifest into a table."""
+    db = HostDb.from_yaml(EXAMPLE_CONFIG)
+    compact = HostDb.from_yaml(EXAMPLE_CONFIG, compact=True)
+    assert isinstance(compact.manifest.machines, MachineTable)
+    assert compact.hosts == db.hosts
+
+
+def test_memory() -> None:
+    """Test that the table uses much less memory than a list of machines."""
+
+    def machines() -> list[Machine]:
+        return [
+            Machine(
+                host=f"host{i}",
+                desc="Kubernetes worker",
+                ip=f"10.0.{i >> 8 & 255}.{i & 255}",
+                mac="02:00:00:00:%02x:%02x" % (i >> 8 & 255, i & 255),
+                services=[f"kube{i:02d}"],
+                hardware_labels=["nvidia_gpu"],
+            )
+            for i in range(10_000)
+        ]
+
+    def allocated(build) -> int:
+        tracemalloc.start()
+        try:
+            value = build()
+            (size, _) = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        del value
+        return size
+
+    def indexed(compact: bool) -> HostDb:
+        manifest = Manifest(machines=machines())
+        db = HostDb(compact_manifest(manifest) if compact else manifest)
+        db.machine_by_ip("10.0.0.1")
+        db.machine_by_mac("02:00:00:00:00:01")
+        db.machines_in_network("10.0.0.0/24")
+        return db
+
+    full = allocated(machines)
+    compact = allocated(lambda: MachineTable(machines(), ["nvidia_gpu"]))
+    assert compact < full * 0.6
+    # The lookup indexes refer to machines by host or row, so they don't hold
+    # a Machine for every row of the table
+    assert allocated(lambda: indexed(True)) < allocated(lambda: indexed(False)) * 0.85
@@ -1,10 +1,19 @@
 """Test for the hostname validation logic."""
 
+import copy
+import dataclasses
+
 import pytest
 
 from hostdb.exceptions import HostDbConfigError
-from hostdb.manifest import Machine, Manifest
-from hostdb.validation import validate_manifest
+from hostdb.manifest import Machine, Manifest, ServiceIndex
+from hostdb.validation import (
+    IssueType,
+    SourceLocation,
+    check_incremental,
+    check_manifest,
+    validate_manifest,
+)
 
 
 def test_success() -> None:
@@ -147,3 +156,160 @@ def test_no_service() -> None:
     )
     with pytest.raises(HostDbConfigError, match="not defined in service_types"):
         validate_manifest(manifest)
+
+
+def test_collect_all_issues() -> None:
+    """Test that every problem is reported in a single pass."""
+    manifest = Manifest(
+        machines=[
+            Machine(
+                host="host1",
+                ip="127.0.0.1",
+                mac="00:aa:bb:cc:dd:ee",
+                services=["web01"],
+                hardware_labels=["gpu"],
+            ),
+            Machine(
+                host="host2",
+                ip="127.0.0.1",
+                mac="00:aa:bb:cc:dd:ee",
+                services=["web01", "db01"],
+            ),
+            Machine(host="host2"),
+        ],
+        service_types=["web"],
+    )
+    locations = [SourceLocation("manifest.yaml", line) for line in (2, 8, 14)]
+    report = check_manifest(manifest, locations=locations)
+    assert not report.valid
+    assert [(issue.issue_type, issue.host) for issue in report.issues] == [
+        (IssueType.UNDEFINED_HARDWARE_LABEL, "host1"),
+        (IssueType.DUPLICATE_IP, "host2"),
+        (IssueType.DUPLICATE_MAC, "host2"),
+        (IssueType.DUPLICATE_SERVICE, "host2"),
+        (IssueType.UNDEFINED_SERVICE_TYPE, "host2"),
+        (IssueType.DUPLICATE_HOST, "host2"),
+    ]
+    assert str(report.issues[0]).startswith("manifest.yaml:2: Hardware label 'gpu'")
+    assert report.issues[-1].location == SourceLocation("manifest.yaml", 14)
+    assert report.issues[-1].message.startswith(
+        "Duplicate host 'host2' for 'Machine(host='host2', desc=None, ip='127.0.0.1'"
+    )
+    assert report.issues[-1].message.count("host='host2'") == 2
+
+    report = check_manifest(manifest, fail_fast=True)
+    assert len(report.issues) == 1
+    assert report.issues[0].location is None
+
+    with pytest.raises(HostDbConfigError, match=r"6 validation issues"):
+        check_manifest(manifest).raise_for_issues()
+
+
+def test_duplicate_service_types() -> None:
+    """Test validation of duplicate entries in service_types."""
+    manifest = Manifest(service_types=["web", "web"])
+    with pytest.raises(HostDbConfigError, match=r"Duplicate service types"):
+        validate_manifest(manifest)
+
+
+def _synthetic_manifest(count: int) -> Manifest:
+    """Return a valid manifest with the specified number of machines."""
+    return Manifest(
+        machines=[
+            Machine(
+                host=f"host{i}",
+                ip=f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}",
+                mac=f"00:00:00:{i >> 16 & 255:02x}:{i >> 8 & 255:02x}:{i & 255:02x}",
+                services=[f"web{i:06d}", f"sto{i:06d}"],
+                hardware_labels=["gpu"],
+            )
+            for i in range(count)
+        ],
+        service_types=["web", "sto"],
+        hardware_labels=["gpu"],
+    )
+
+
+def test_single_pass(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that every service is checked exactly once."""
+    manifest = _synthetic_manifest(10_000)
+    parsed = []
+    parse = ServiceIndex.parse
+
+    def counting_parse(self, service):
+        parsed.append(service)
+        return parse(self, service)
+
+    monkeypatch.setattr(ServiceIndex, "parse", counting_parse)
+    assert check_manifest(manifest).valid
+    assert len(parsed) == 20_000
+    assert len(set(parsed)) == 20_000
+
+
+def test_incremental() -> None:
+    """Test that incremental validation only rechecks changed machines."""
+    manifest = _synthetic_manifest(100)
+    (report, state) = check_incremental(manifest, None)
+    assert report.valid
+    assert report.checked == 100
+    assert state is not None
+
+    # Unchanged manifest does not check any machines
+    (report, state) = check_incremental(manifest, state)
+    assert report.valid
+    assert report.checked == 0
+
+    # Moving an IP from one machine to a new machine is allowed
+    manifest.machines[5].ip = None
+    manifest.machines.append(Machine(host="new", ip="10.0.0.5"))
+    (report, state) = check_incremental(manifest, state)
+    assert report.valid
+    assert report.checked == 2
+    assert state is not None
+
+    # A conflict with an unchanged machine is detected
+    manifest.machines.append(Machine(host="other", services=["web000001"]))
+    (report, new_state) = check_incremental(manifest, state)
+    assert report.checked == 1
+    assert [issue.issue_type for issue in report.issues] == [
+        IssueType.DUPLICATE_SERVICE
+    ]
+    assert new_state is None
+
+    # The previous state is unchanged by a failed check and can be reused
+    manifest.machines[-1].services = ["web999999"]
+    (report, new_state) = check_incremental(manifest, state)
+    assert report.valid
+    assert report.checked == 1
+    manifest.machines.pop()
+    (report, _) = check_incremental(manifest, state)
+    assert report.valid
+    assert report.checked == 0
+
+
+def test_incremental_definitions_changed() -> None:
+    """Test that changing the service types revalidates every machine."""
+    manifest = _synthetic_manifest(10)
+    (report, state) = check_incremental(manifest, None)
+    assert report.valid
+
+    manifest.service_types = ["web"]
+    (report, state) = check_incremental(manifest, state)
+    assert len(report.issues) == 10
+    assert {issue.issue_type for issue in report.issues} == {
+        IssueType.UNDEFINED_SERVICE_TYPE
+    }
+    assert state is None
+
+
+def test_incremental_key_fields() -> None:
+    """Test that incremental validation notices changes to any machine field."""
+    manifest = _synthetic_manifest(3)
+    (_, state) = check_incremental(manifest, None)
+    for machine_field in dataclasses.fields(Machine):
+        edited = copy.deepcopy(manifest)
+        value = getattr(edited.machines[1], machine_field.name)
+        changed = [*value, "other"] if isinstance(value, list) else f"{value}-other"
+        setattr(edited.machines[1], machine_field.name, changed)
+        (report, _) = check_incremental(edited, state)
+        assert report.checked == 1, machine_field.name
@@ -0,0 +1,136 @@
+"""Tests for writing manifests back to YAML."""
+
+import pathlib
+import shutil
+
+import pytest
+
+from hostdb.exceptions import HostDbConfigError, HostDbException
+from hostdb.hostdb import HostDb
+from hostdb.manifest import Machine, MachineEdits, Manifest
+from hostdb.writer import ManifestWriter, apply_edits
+
+TESTDATA = pathlib.Path("tests/testdata/includes")
+
+
+@pytest.fixture(name="config")
+def config_fixture(tmp_path: pathlib.Path) -> pathlib.Path:
+    """Fixture of a copy of a manifest split across included files."""
+    shutil.copytree(TESTDATA, tmp_path, dirs_exist_ok=True)
+    return tmp_path / "manifest.yaml"
+
+
+def test_format_round_trip(config: pathlib.Path) -> None:
+    """Test that formatting keeps the include layout and the manifest."""
+    expected = HostDb.from_yaml(config, cache_dir=None).manifest
+    writer = ManifestWriter(config)
+    assert writer.manifest == expected
+    # Included files are written before the files that include them
+    assert writer.write(writer.manifest) == [
+        config.parent / "machines.yaml",
+        config.parent / "manifest.yaml",
+    ]
+    assert config.read_text() == (
+        "---\n"
+        "site:\n"
+        "  domain: lax.example.com\n"
+        "  env: prod\n"
+        "  name: Los Angeles\n"
+        "service_types: !include service_types.yaml\n"
+        "hardware_labels: !include hardware_labels.yaml\n"
+        "machines: !include machines.yaml\n"
+        "network: !include network.yaml\n"
+    )
+    assert HostDb.from_yaml(config, cache_dir=None).manifest == expected
+    assert ManifestWriter(config).write(expected) == []
+
+
+def test_apply_edits(config: pathlib.Path) -> None:
+    """Test that a batch of edits only rewrites the machines file."""
+    writer = ManifestWriter(config)
+    writer.write(writer.manifest)
+    changed = writer.apply(
+        MachineEdits(
+            add=[Machine(host="newbie", ip="192.168.1.20", services=["sto02"])],
+            remove=["latin"],
+            update=[Machine(host="friend", desc="Main router")],
+        )
+    )
+    assert changed == [config.parent / "machines.yaml"]
+    manifest = HostDb.from_yaml(config, cache_dir=None).manifest
+    assert [machine.host for machine in manifest.machines] == [
+        "friend",
+        "lagoon",
+        "newbie",
+    ]
+    assert manifest.machines[0] == Machine(host="friend", desc="Main router")
+    assert writer.manifest == manifest
+
+    with pytest.raises(HostDbConfigError, match="192.168.1.20"):
+        writer.apply(MachineEdits(add=[Machine(host="dup", ip="192.168.1.20")]))
+    assert HostDb.from_yaml(config, cache_dir=None).manifest == manifest
+
+    edited = writer.edited(MachineEdits(remove=["lagoon"]))
+    assert [machine.host for machine in edited.machines] == ["friend", "newbie"]
+    assert writer.manifest == manifest
+    assert HostDb.from_yaml(config, cache_dir=None).manifest == manifest
+
+
+def test_apply_edits_hosts() -> None:
+    """Test edits of hosts that are missing or already in the manifest."""
+    manifest = Manifest(machines=[Machine(host="friend"), Machine(host="lagoon")])
+    with pytest.raises(HostDbException, match=r"not found in manifest: \['latin'\]"):
+        apply_edits(manifest, MachineEdits(remove=["latin"]))
+    with pytest.raises(HostDbException, match=r"already in manifest: \['friend'\]"):
+        apply_edits(manifest, MachineEdits(add=[Machine(host="friend")]))
+    edited = apply_edits(
+        manifest,
+        MachineEdits(add=[Machine(host="friend", ip="10.0.0.1")], remove=["friend"]),
+    )
+    assert edited.machines == [
+        Machine(host="lagoon"),
+        Machine(host="friend", ip="10.0.0.1"),
+    ]
+    assert len(manifest.machines) == 2
+
+
+def test_machine_includes(tmp_path: pathlib.Path) -> None:
+    """Test that machines included one per file stay in their file."""
+    config = tmp_path / "manifest.yaml"
+    config.write_text(
+        "---\nmachines:\n- !include friend.yaml\n- host: lagoon\n  extra: kept\n"
+    )
+    (tmp_path / "friend.yaml").write_text("---\nhost: friend\nip: 10.0.0.1\n")
+    writer = ManifestWriter(config)
+    manifest = writer.manifest
+    manifest.machines.reverse()
+    manifest.machines[1].ip = "10.0.0.2"
+    assert writer.write(manifest) == [tmp_path / "friend.yaml", config]
+    assert config.read_text() == (
+        "---\nmachines:\n- host: lagoon\n  extra: kept\n- !include friend.yaml\n"
+    )
+    assert (tmp_path / "friend.yaml").read_text() == "---\nhost: friend\nip: 10.0.0.2\n"
+
+    writer.apply(MachineEdits(remove=["friend"]))
+    assert writer.files == [config]
+    assert (tmp_path / "friend.yaml").exists()
+
+
+def test_write_large(tmp_path: pathlib.Path) -> None:
+    """Test formatting and editing a manifest of 50k machines."""
+    config = tmp_path / "manifest.yaml"
+    config.write_text("---\nservice_types: [svc]\nmachines: !include machines.yaml\n")
+    machines = "".join(
+        f"- host: host{i}\n  ip: 10.{i >> 16}.{i >> 8 & 255}.{i & 255}\n"
+        f"  services:\n  - svc{i:06d}\n"
+        for i in range(50_000)
+    )
+    (tmp_path / "machines.yaml").write_text(f"---\n{machines}")
+    writer = ManifestWriter(config)
+    writer.write(writer.manifest)
+    assert writer.apply(
+        MachineEdits(add=[Machine(host="newbie")], remove=["host0", "host1"])
+    ) == [tmp_path / "machines.yaml"]
+    assert len(writer.manifest.machines) == 49_999
+    assert [m.host for m in writer.manifest.machines[:2]] == ["host2", "host3"]
+    assert writer.manifest.machines[-1] == Machine(host="newbie")
@@ -0,0 +1,264 @@
+"""Tests for the yaml loaders."""
+
+import gc
+import pathlib
+import shutil
+
+import pytest
+import yaml
+from mashumaro.codecs.yaml import YAMLDecoder
+
+import hostdb.yaml_loaders
+from hostdb.manifest import Machine, Manifest
+from hostdb.yaml_loaders import (
+    FragmentSet,
+    _gc_paused,
+    decode_value,
+    yaml_decode_file,
+    yaml_load,
+    yaml_load_parallel,
+    yaml_stream_sequence,
+)
+
+TESTDATA = pathlib.Path.cwd() / pathlib.Path("tests/testdata")
+INCLUDES_CONFIG = TESTDATA / "includes/manifest.yaml"
+INCLUDES_INVALID_CONFIG = TESTDATA / "includes_invalid/manifest.yaml"
+EXAMPLE_CONFIG = pathlib.Path.cwd() / pathlib.Path("examples/manifest.yaml")
+
+
+def _load(path: pathlib.Path) -> tuple:
+    """Load a file with the serial loader."""
+    with path.open() as stream:
+        return yaml_load(stream)
+
+
+def test_parallel_matches_serial() -> None:
+    """Test that the parallel loader returns the same data as the serial one."""
+    (data, includes) = _load(INCLUDES_CONFIG)
+    (parallel_data, parallel_includes) = yaml_load_parallel(INCLUDES_CONFIG)
+    assert parallel_data == data
+    assert sorted(parallel_includes) == sorted(includes)
+    assert sorted(p.name for p in includes) == [
+        "hardware_labels.yaml",
+        "machines.yaml",
+        "network.yaml",
+        "service_types.yaml",
+    ]
+
+
+def test_nested_includes(tmp_path: pathlib.Path) -> None:
+    """Test includes of files that include other files."""
+    (tmp_path / "rack1.yaml").write_text("- host: friend\n- host: lagoon\n")
+    (tmp_path / "rack2.yaml").write_text("- host: latin\n")
+    (tmp_path / "machines.yaml").write_text(
+        "rack1: !include rack1.yaml\nrack2: !include rack2.yaml\n"
+    )
+    config = tmp_path / "manifest.yaml"
+    config.write_text("machines: !include machines.yaml\nother: !include rack2.yaml\n")
+
+    expected = {
+        "machines": {
+            "rack1": [{"host": "friend"}, {"host": "lagoon"}],
+            "rack2": [{"host": "latin"}],
+        },
+        "other": [{"host": "latin"}],
+    }
+    (data, includes) = _load(config)
+    assert data == expected
+    assert len(set(includes)) == 3
+    (data, includes) = yaml_load_parallel(config, max_workers=2)
+    assert data == expected
+    assert len(includes) == 3
+
+
+def test_missing_include() -> None:
+    """Test the error message for a missing include is the same in both modes."""
+    with pytest.raises(FileNotFoundError, match=r"missing.yaml' does not exist"):
+        _load(INCLUDES_INVALID_CONFIG)
+    with pytest.raises(
+        FileNotFoundError, match=r"missing.yaml' does not exist\s+in .*line 2"
+    ):
+        yaml_load_parallel(INCLUDES_INVALID_CONFIG)
+
+
+@pytest.mark.parametrize(
+    ("load_func"),
+    [_load, yaml_load_parallel],
+)
+def test_include_cycle(tmp_path: pathlib.Path, load_func) -> None:
+    """Test that include cycles are detected."""
+    (tmp_path / "a.yaml").write_text("b: !include b.yaml\n")
+    (tmp_path / "b.yaml").write_text("a: !include a.yaml\n")
+    config = tmp_path / "manifest.yaml"
+    config.write_text("a: !include a.yaml\n")
+
+    with pytest.raises(ValueError, match=r"a.yaml' includes itself"):
+        load_func(config)
+
+
+def test_stream_sequence(tmp_path: pathlib.Path) -> None:
+    """Test streaming items from a sequence while skipping other keys."""
+    config = tmp_path / "manifest.yaml"
+    config.write_text(
+        "before:\n  nested: [1, 2, {a: b}]\n"
+        "items:\n- name: a\n  values: [1, 2]\n- name: b\n"
+        "after: 1\n"
+    )
+    items = list(yaml_stream_sequence(config, "items"))
+    assert [item for item, _ in items] == [
+        {"name": "a", "values": [1, 2]},
+        {"name": "b"},
+    ]
+    assert [mark.line for _, mark in items] == [3, 5]
+
+
+def test_stream_sequence_anchors(tmp_path: pathlib.Path) -> None:
+    """Test aliases to anchors outside of and within the streamed items."""
+    config = tmp_path / "manifest.yaml"
+    config.write_text(
+        "defaults:\n  base: &base {desc: default}\n  skipped: [1, 2]\n"
+        "items:\n- name: a\n  <<: *base\n  values: &values [1, 2]\n  copy: *values\n"
+        "- name: b\n  values: &values [3]\n  <<: *base\n"
+    )
+    items = [item for item, _ in yaml_stream_sequence(config, "items")]
+    assert items == [
+        {"name": "a", "desc": "default", "values": [1, 2], "copy": [1, 2]},
+        {"name": "b", "values": [3], "desc": "default"},
+    ]
+
+    config.write_text("items:\n- name: a\n  values: &values [1]\n- name: *values\n")
+    with pytest.raises(yaml.YAMLError, match="can't refer to anchors in other items"):
+        list(yaml_stream_sequence(config, "items"))
+
+
+def test_stream_sequence_include() -> None:
+    """Test streaming a sequence pulled in with an include."""
+    items = list(yaml_stream_sequence(INCLUDES_CONFIG, "machines"))
+    assert [item["host"] for item, _ in items] == ["friend", "lagoon", "latin"]
+    assert all(mark.name.endswith("machines.yaml") for _, mark in items)
+
+
+def test_fragment_set_reload(tmp_path: pathlib.Path, monkeypatch) -> None:
+    """Test that reloading a fragment set only parses the changed files."""
+    shutil.copytree(INCLUDES_CONFIG.parent, tmp_path, dirs_exist_ok=True)
+    config = tmp_path / "manifest.yaml"
+    fragments = FragmentSet(config)
+    (data, includes) = fragments.load()
+    (expected, expected_includes) = _load(config)
+    assert data == expected
+    assert sorted(includes) == sorted(expected_includes)
+
+    parsed: list[str] = []
+    load_fragment = hostdb.yaml_loaders._load_fragment
+
+    def _record(path: pathlib.Path) -> tuple:
+        parsed.append(path.name)
+        return load_fragment(path)
+
+    monkeypatch.setattr(hostdb.yaml_loaders, "_load_fragment", _record)
+
+    machines = tmp_path / "machines.yaml"
+    machines.write_text("---\n- host: tango\n")
+    (data, _) = fragments.load([machines])
+    assert parsed == ["machines.yaml"]
+    assert data["machines"] == [{"host": "tango"}]
+    assert data["service_types"] == ["rtr", "sto", "wifi", "kapi", "kube"]
+
+    parsed.clear()
+    config.write_text(config.read_text().replace("network: !include network.yaml", ""))
+    (data, includes) = fragments.load([config])
+    assert parsed == ["manifest.yaml"]
+    assert "network" not in data
+    assert "network.yaml" not in [p.name for p in includes]
+    assert "network.yaml" not in [p.name for p in fragments.files]
+
+
+def _generic_decode(path: pathlib.Path) -> tuple[Manifest, list[pathlib.Path]]:
+    """Decode a manifest by loading python objects then decoding with mashumaro."""
+    (data, includes) = _load(path)
+    return (decode_value(data, Manifest), includes)
+
+
+@pytest.mark.parametrize("config", [EXAMPLE_CONFIG, INCLUDES_CONFIG])
+def test_decode_file_matches_generic(config: pathlib.Path) -> None:
+    """Test that decoding from nodes matches the mashumaro decoder."""
+    assert yaml_decode_file(config, Manifest) == _generic_decode(config)
+
+
+@pytest.mark.parametrize(
+    ("content", "expected"),
+    [
+        ("host: 5", Machine(host="5")),
+        ("host: a\nservices: ab", Machine(host="a", services=["a", "b"])),
+        ("host: a\nservices:", Machine(host="a", services=None)),
+        ("<<: {host: a}\ndesc: b", Machine(host="a", desc="b")),
+    ],
+)
+def test_decode_file_fallback(
+    tmp_path: pathlib.Path, content: str, expected: Machine
+) -> None:
+    """Test values that need conversion are decoded the same as mashumaro."""
+    path = tmp_path / "machine.yaml"
+    path.write_text(content)
+    assert yaml_decode_file(path, Machine) == (expected, [])
+
+
+def test_decode_file_errors(tmp_path: pathlib.Path) -> None:
+    """Test that errors match the mashumaro decoder."""
+    path = tmp_path / "manifest.yaml"
+    path.write_text("machines:\n- desc: no host\n")
+    with pytest.raises(
+        Exception,
+        match=r'Field "machines" of type list\[Machine\] in Manifest has invalid value',
+    ):
+        yaml_decode_file(path, Manifest)
+
+    with pytest.raises(FileNotFoundError, match="does not exist"):
+        yaml_decode_file(INCLUDES_INVALID_CONFIG, Manifest)
+
+
+def test_decode_file_large(tmp_path: pathlib.Path) -> None:
+    """Test decoding a large manifest from nodes matches the other decoders."""
+    machines = [
+        {
+            "host": f"host{i}",
+            "desc": "Synthetic machine",
+            "ip": f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}",
+            "mac": "02:00:00:%02x:%02x:%02x" % (i >> 16 & 255, i >> 8 & 255, i & 255),
+            "services": [f"kapi{i}"],
+            "hardware_labels": ["nvidia_gpu"],
+        }
+        for i in range(10_000)
+    ]
+    path = tmp_path / "manifest.yaml"
+    path.write_text(
+        yaml.dump(
+            {
+                "service_types": ["kapi"],
+                "hardware_labels": ["nvidia_gpu"],
+                "machines": machines,
+            },
+            Dumper=yaml.SafeDumper,
+        )
+    )
+    decoder = YAMLDecoder(
+        Manifest, pre_decoder_func=lambda s: yaml.load(s, Loader=yaml.SafeLoader)
+    )
+
+    (manifest, _) = yaml_decode_file(path, Manifest)
+    assert len(manifest.machines) == 10_000
+    assert manifest == _generic_decode(path)[0]
+    assert manifest == decoder.decode(path.read_text())
+
+
+def test_gc_paused_overlapping() -> None:
+    """Test that overlapping pauses restore the collector when the last one ends."""
+    assert gc.isenabled()
+    first = _gc_paused()
+    second = _gc_paused()
+    first.__enter__()
+    second.__enter__()
+    first.__exit__(None, None, None)
+    assert not gc.isenabled()
+    second.__exit__(None, None, None)
+    assert gc.isenabled()